@@ -1,194 +1,189 @@
-import re
-from nltk.corpus import wordnet
-import speech_recognition as sr
-import pyttsx3
 import webbrowser
 from flask import Flask, render_template
-from pymongo import MongoClient
+from knowledge_base import load_knowledge_base
+from interview_planner import InterviewPlanner
+from speech_output import SpeechOutput
+from speech_input import create_speech_recognizer
+from assessment import build_patient_document, build_symptom_pattern, follow_ups_confirm, is_affirmative, is_clear_yes_or_no, is_negative
+from assessment import evaluate_diseases as evaluate_disease_patterns
+from intake_session import evaluation_lines
+from patient_store import ensure_patient_indexes
+from patient_log import PatientLog
+from database import PATIENTS_DB, get_client
+from metrics import count, end_trace, instrument_flask, span, start_trace
+from symptom_matcher import reported_symptoms
 
 # Initialize the Flask app for scheduling Google Meet
 app = Flask(__name__)
+instrument_flask(app)
 
-# Initialize the text-to-speech engine
-engine = pyttsx3.init()
+# Start the text-to-speech worker (speech is queued and played in the background)
+speech_output = SpeechOutput()
 
 # MongoDB client setup (assuming MongoDB is running locally)
-client = MongoClient("mongodb://localhost:27017/")  # Connect to the MongoDB server
-db = client["patient_database"]  # Create or use an existing database
+client = get_client()  # Shared, pooled connection to the MongoDB server
+db = client[PATIENTS_DB]  # Create or use an existing database
 patients_collection = db["patients"]  # Create or use an existing collection
 
+# Assessments are appended to the local patient log and uploaded from there to MongoDB
+patient_log = PatientLog()
 
-# Function to speak a message
+
+# Function to speak a message without waiting for playback to finish
 def speak(message):
-    engine.say(message)
-    engine.runAndWait()
+    speech_output.say(message)
 
 # Function to print and speak a message
 def print_and_speak(message):
     print(message)
     speak(message)
 
-# Function to get synonyms from WordNet
-def get_synonyms(word):
-    synonyms = set()
-    for syn in wordnet.synsets(word):
-        for lemma in syn.lemmas():
-            synonyms.add(lemma.name().replace('_', ' '))
-    return synonyms
-
-# Generate and expand symptom synonyms
-def generate_synonyms_for_symptoms(symptoms_dict):
-    for symptom, descriptions in symptoms_dict.items():
-        synonyms = get_synonyms(symptom)
-        symptoms_dict[symptom].extend(synonyms)
-
-# Define symptoms for multiple diseases
-disease_symptoms = {
-    "fungal_infection": {
-        "itching": ["itchy", "scratchy", "pruritus"],
-        "skin rash": ["rash", "red spots", "lesions", "irritation"],
-        "nodal skin eruptions": ["bumps", "lumps", "raised skin", "eruptions"],
-        "dischromic patches": ["discolored skin", "light patches", "dark patches", "pigment changes"]
-    },
-    "allergy": {
-        "sneezing": ["sneeze", "sneezes", "nasal irritation"],
-        "runny nose": ["nasal discharge", "rhinorrhea", "dripping nose"],
-        "itchy eyes": ["irritated eyes", "red eyes", "eye irritation"],
-        "cough": ["coughing", "dry cough", "persistent cough"]
-    }
-}
-
-# Symptom matrix for each disease
-disease_matrix = {
-    "fungal_infection": [
-        [1, 1, 1, 1],
-        [1, 1, 1, 0],
-        [1, 1, 0, 0],
-        [0, 0, 1, 0],
-    ],
-    "allergy": [
-        [1, 1, 1, 1],
-        [1, 1, 0, 0],
-        [0, 0, 0, 0],
-    ]
-}
-
-for disease in disease_symptoms:
-    generate_synonyms_for_symptoms(disease_symptoms[disease])
+# Load the compiled symptom knowledge base (WordNet is only loaded if it must be rebuilt)
+knowledge_base = load_knowledge_base()
+disease_symptoms = knowledge_base["disease_symptoms"]
+disease_matrix = knowledge_base["disease_matrix"]
+follow_up_questions = knowledge_base["follow_up_questions"]
+symptom_matcher = knowledge_base["symptom_matcher"]
+diagnosis_engine = knowledge_base["diagnosis_engine"]
+
+# Function to list the fixed prompts worth keeping as pre-rendered audio
+def fixed_prompts():
+    symptoms = set(diagnosis_engine.symptoms)
+    for symptoms_of_disease in disease_symptoms.values():
+        symptoms.update(symptoms_of_disease)
+    prompts = [f"Do you have {symptom}? (yes/no)" for symptom in sorted(symptoms)]
+    for questions in follow_up_questions.values():
+        for follow_ups in questions.values():
+            prompts.extend(follow_ups)
+    prompts.extend([
+        "Welcome to the health assessment program.",
+        "What is your name?",
+        "How old are you?",
+        "What is your Gender? (male/female)",
+        "Please describe your symptoms.",
+        "I did not catch that. Can you please repeat?",
+        "I didn't catch that. Can you please say yes or no?",
+    ])
+    return prompts
+
+# Render the fixed prompts in the background so repeated questions play from the cache
+speech_output.prerender(fixed_prompts())
+
+# Number of times a question is asked before falling back to typed input
+MAX_ATTEMPTS = 3
+
+# Recognizer backend, created once so an offline model stays loaded between answers
+speech_recognizer = create_speech_recognizer()
 
 # Function to recognize speech input
-def recognize_speech():
-    recognizer = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("Listening...")
-        audio = recognizer.listen(source)
-    try:
-        speech = recognizer.recognize_google(audio)
+def recognize_speech(accept_partial=None):
+    # The microphone opens while the prompt is still playing; listen only once it is done
+    speech = speech_recognizer.listen(accept_partial, before_listen=speech_output.wait)
+    if speech:
         print(f"Recognized: {speech}")
-        return speech.lower()
-    except sr.UnknownValueError:
-        print("Could not understand audio, please try again.")
-        return ""
-    except sr.RequestError:
-        print("Could not request results from Google Speech Recognition service.")
-        return ""
-
-# Function to confirm or correct recognized speech
-def confirm_or_correct(prompt):
+    return speech
+
+# Function to confirm or correct recognized speech, asking at most MAX_ATTEMPTS times
+def confirm_or_correct(prompt, accept_partial=None):
     print_and_speak(prompt)
-    recognized_text = recognize_speech()
-    
-    if not recognized_text:
-        print_and_speak("I did not catch that. Can you please repeat?")
-        return confirm_or_correct(prompt)
+    for attempt in range(MAX_ATTEMPTS):
+        recognized_text = recognize_speech(accept_partial)
+        if recognized_text:
+            return recognized_text
+        count("speech_retries")
+        if attempt < MAX_ATTEMPTS - 1:
+            print_and_speak("I did not catch that. Can you please repeat?")
 
-    return recognized_text
+    count("typed_answers")
+    print_and_speak("Please type your answer.")
+    speech_output.wait()
+    return input("Enter answer manually: ").lower()
 
-# Function to check if the response is affirmative
-def is_affirmative(response):
-    yes_synonyms = ["yes", "yeah", "yup", "sure", "absolutely", "affirmative", "certainly", "correct", "positive"]
-    return any(phrase in response for phrase in yes_synonyms)
+# Function to extract symptoms from user input for multiple diseases, with the confidence
+# of each match ({disease: {symptom: confidence}}; misheard words match with less than 1)
+def extract_symptoms(user_input):
+    with span("symptom_extraction"):
+        return symptom_matcher.match_scored(user_input)
 
-# Function to check if the response is negative
-def is_negative(response):
-    no_synonyms = ["no", "nah", "nope", "not at all", "never", "negative"]
-    return any(phrase in response for phrase in no_synonyms)
+# Function to find the follow-up questions for a symptom in any disease that has it
+def follow_ups_for(symptom):
+    for questions in follow_up_questions.values():
+        if symptom in questions:
+            return questions[symptom]
+    return []
 
-# Function to extract symptoms from user input for multiple diseases
-def extract_symptoms(user_input):
-    detected_symptoms = {}
-    for disease, symptoms in disease_symptoms.items():
-        detected_symptoms[disease] = []
-        for symptom, synonyms in symptoms.items():
-            pattern = re.compile(r'\b(' + '|'.join(synonyms) + r')\b')
-            if pattern.search(user_input):
-                detected_symptoms[disease].append(symptom)
-    return {disease: sym for disease, sym in detected_symptoms.items() if sym}
-
-# Function to ask follow-up questions for all symptoms of a disease
-def ask_follow_up(disease):
-    follow_up_questions = {
-        "fungal_infection": {
-            "itching": ["Is the itching localized to one area? (yes/no)", "Does the itching worsen at night? (yes/no)"],
-            "skin rash": ["Does the rash appear red and irritated? (yes/no)", "Is the rash spreading? (yes/no)"],
-            "nodal skin eruptions": ["Are the eruptions painful? (yes/no)", "Are the bumps filled with fluid? (yes/no)"],
-            "dischromic patches": ["Are the patches lighter or darker than your skin? (yes/no)", "Are the patches well-defined or blurred? (yes/no)"]
-        },
-        "allergy": {
-            "sneezing": ["Is the sneezing frequent? (yes/no)", "Is it worse in the morning? (yes/no)"],
-            "runny nose": ["Is your nose constantly runny? (yes/no)", "Is nasal discharge clear? (yes/no)"],
-            "itchy eyes": ["Are your eyes red and itchy? (yes/no)", "Do your eyes water frequently? (yes/no)"],
-            "cough": ["Is the cough dry? (yes/no)", "Does the cough worsen at night? (yes/no)"]
-        }
-    }
-    
-    confirmed_symptoms = []
-    symptom_names = []
+# Function to ask whether the patient has a symptom, confirming a "yes" with its follow-ups
+def ask_symptom(symptom):
+    for _ in range(MAX_ATTEMPTS):
+        response = confirm_or_correct(f"Do you have {symptom}? (yes/no)", is_clear_yes_or_no)
+        print(f"User response for {symptom}: {response}")
+        if is_affirmative(response):
+            follow_ups = follow_ups_for(symptom)
+            follow_up_answers = []
+            for question in follow_ups:
+                print_and_speak(question)
+                answer = confirm_or_correct("", is_clear_yes_or_no)
+                print(f"User answer for '{question}': {answer}")
+                follow_up_answers.append(answer)
+            return follow_ups_confirm(follow_up_answers)
+        elif is_negative(response):
+            return False
+        else:
+            print_and_speak("I didn't catch that. Can you please say yes or no?")
+
+    print_and_speak(f"I will note that you do not have {symptom}.")
+    return False
+
+# Function to ask follow-up questions for all symptoms of a disease.
+# Symptoms already in `answers` (shared with other diseases or the adaptive interview) are not asked again.
+def ask_follow_up(disease, answers):
     for symptom in disease_symptoms[disease].keys():
-        confirmed = False
-        while not confirmed:
-            response = confirm_or_correct(f"Do you have {symptom}? (yes/no)")
-            print(f"User response for {symptom}: {response}")
-            if is_affirmative(response):
-                confirmed = True
-                follow_ups = follow_up_questions.get(disease, {}).get(symptom, [])
-                yes_count = 0
-                for question in follow_ups:
-                    print_and_speak(question)
-                    answer = confirm_or_correct("")
-                    print(f"User answer for '{question}': {answer}")
-                    if is_affirmative(answer):
-                        yes_count += 1
-                if yes_count > len(follow_ups) / 2:
-                    confirmed_symptoms.append(1)
-                    symptom_names.append(f"+{symptom}")
-                else:
-                    confirmed_symptoms.append(0)
-                    symptom_names.append(f"-{symptom}")
-                break
-            elif is_negative(response):
-                confirmed_symptoms.append(0)
-                symptom_names.append(f"-{symptom}")
-                confirmed = True
-            else:
-                print_and_speak("I didn't catch that. Can you please say yes or no?")
-    return confirmed_symptoms, symptom_names
+        if symptom not in answers:
+            answers[symptom] = ask_symptom(symptom)
+    return build_symptom_pattern(disease_symptoms[disease], answers)
 
-# Function to evaluate all diseases based on symptom patterns
-def evaluate_diseases(symptom_patterns):
-    confirmed_prognoses = []
-    not_confirmed_prognoses = []
+# Function to run the adaptive interview: always ask the most informative symptom next
+# and stop once one prognosis is confident enough. Answers are recorded in `answers`.
+# Returns the ranked prognoses and whether the top one reached the confidence threshold.
+def run_adaptive_interview(detected_symptoms, answers):
+    planner = InterviewPlanner(diagnosis_engine)
+    # Symptoms matched with low confidence are asked about rather than assumed
+    for symptom in reported_symptoms(detected_symptoms):
+        planner.record(symptom, True)
 
-    for disease, (symptom_pattern, symptom_names) in symptom_patterns.items():
-        pattern = ''.join(map(str, symptom_pattern))
-        if list(map(int, pattern)) in disease_matrix[disease]:
-            confirmed_prognoses.append((disease, symptom_names))
-        else:
-            not_confirmed_prognoses.append((disease, symptom_names))
+    with span("question_planning"):
+        symptom = planner.next_symptom()
+    while symptom is not None:
+        if symptom not in answers:
+            answers[symptom] = ask_symptom(symptom)
+        with span("question_planning"):
+            planner.record(symptom, answers[symptom])
+            symptom = planner.next_symptom()
+    return planner.rank(), planner.confident()
 
-    return confirmed_prognoses, not_confirmed_prognoses
+# Function to run the whole interview: the adaptive questions first; only when they end
+# without a confident prognosis are the remaining symptoms of the relevant diseases asked
+# too. Symptoms the patient described count as present unless denied. Returns the symptom
+# patterns of the relevant diseases and the ranked prognoses.
+def run_interview(relevant_diseases, detected_symptoms):
+    answers = {}
+    ranked_prognoses, confident = run_adaptive_interview(detected_symptoms, answers)
+    if not confident:
+        for disease in relevant_diseases:
+            ask_follow_up(disease, answers)
+    known = dict.fromkeys(reported_symptoms(detected_symptoms), True)
+    known.update(answers)
+    symptom_patterns = {
+        disease: build_symptom_pattern(disease_symptoms[disease], known) for disease in relevant_diseases
+    }
+    return symptom_patterns, ranked_prognoses
+
+# Function to evaluate all diseases based on symptom patterns
+def evaluate_diseases(symptom_patterns):
+    with span("evaluation"):
+        return evaluate_disease_patterns(symptom_patterns, disease_matrix)
 
-# Function to ask for patient details and store in patient_info.txt
+# Function to ask for patient details
 def get_patient_details():
     patient_info = {}
     name_confirmed = False
@@ -197,7 +192,7 @@ def get_patient_details():
         recognized_name = confirm_or_correct("What is your name?")
         print_and_speak(f"You said your name is {recognized_name}. Is that correct? (yes/no)")
         
-        confirmation = confirm_or_correct("")
+        confirmation = confirm_or_correct("", is_clear_yes_or_no)
         if is_affirmative(confirmation):
             patient_info['name'] = recognized_name
             name_confirmed = True
@@ -243,78 +238,30 @@ def get_patient_details():
 
     return patient_info
 
-# Function to write patient details and evaluation to a file with spacing between entries
-def write_patient_info_to_file(patient_info, confirmed_prognoses, not_confirmed_prognoses):
-    with open("./patient_info.txt", "a") as file:
-        # Add a newline between entries if the file isn't empty
-        file.write("\n" + "="*30 + "\n")  # Add a separator for clarity between entries
-        file.write(f"Name: {patient_info['name']}\n")
-        file.write(f"Age: {patient_info['age']}\n")
-        file.write(f"Sex: {patient_info['sex']}\n")
-        file.write(f"Symptom Description: {patient_symptoms}\n")
-        file.write("Symptoms and Final Evaluation:\n")
-        
-        if confirmed_prognoses:
-            file.write("\nConfirmed Diagnoses:\n")
-            for disease, symptoms in confirmed_prognoses:
-                file.write(f"- {disease} with symptom evaluation as: {', '.join(symptoms)}\n")
-        else:
-            file.write("\nNo confirmed diseases based on symptoms.\n")
-        
-        if not_confirmed_prognoses:
-            file.write("\nUnconfirmed Diagnoses:\n")
-            for disease, symptoms in not_confirmed_prognoses:
-                file.write(f"- {disease} with symptom evaluation as: {', '.join(symptoms)}\n")
-        else:
-            file.write("\nAll potential diagnoses were considered based on symptoms.\n")
-            
-# Function to store patient info in MongoDB
-def store_patient_info_in_mongo(patient_info, confirmed_prognoses, not_confirmed_prognoses):
-    patient_data = {
-        "name": patient_info['name'],
-        "age": patient_info['age'],
-        "sex": patient_info['sex'],
-        "confirmed_diagnoses": [{
-            "disease": disease,
-            "symptom_evaluation": symptoms
-        } for disease, symptoms in confirmed_prognoses],
-        "unconfirmed_diagnoses": [{
-            "disease": disease,
-            "symptom_evaluation": symptoms
-        } for disease, symptoms in not_confirmed_prognoses]
-    }
-    # Insert the patient info into MongoDB
-    patients_collection.insert_one(patient_data)
+# Function to store an assessment: first in the local patient log (on disk before this
+# returns), then in MongoDB. Returns the assessment ID and whether MongoDB has it; if the
+# database is down the record stays in the log and is uploaded by the next sync.
+def store_patient_info(patient_info, confirmed_prognoses, not_confirmed_prognoses, ranked_prognoses=(), symptom_description=""):
+    patient_data = build_patient_document(patient_info, confirmed_prognoses, not_confirmed_prognoses, ranked_prognoses)
+    patient_data["symptom_description"] = symptom_description
+    patient_log.append(patient_data)
+    try:
+        patient_log.sync(patients_collection)
+    except Exception as e:
+        print(f"MongoDB is unavailable, the assessment was kept in the patient log: {e}")
+        return patient_data["_id"], False
+    return patient_data["_id"], True
             
 # Function to extract relevant diseases based on detected symptoms
 def extract_relevant_diseases(user_input):
-    detected_symptoms = {}
-    relevant_diseases = set()
-    
-    # Detect symptoms for each disease and determine relevance
-    for disease, symptoms in disease_symptoms.items():
-        detected_symptoms[disease] = []
-        for symptom, synonyms in symptoms.items():
-            pattern = re.compile(r'\b(' + '|'.join(synonyms) + r')\b')
-            if pattern.search(user_input):
-                detected_symptoms[disease].append(symptom)
-                relevant_diseases.add(disease)  # Add disease to relevant list if any symptom matches
-    
-    return relevant_diseases, {disease: sym for disease, sym in detected_symptoms.items() if sym}
+    # A disease is relevant if any of its symptoms were detected
+    detected_symptoms = extract_symptoms(user_input)
+    return set(detected_symptoms), detected_symptoms
 
 # Function to print and voice out the final evaluation
-def display_final_evaluation(confirmed, not_confirmed):
-    if confirmed:
-        print_and_speak("Based on your responses, the following conditions may be present:")
-        for disease in confirmed:
-            print_and_speak(f"- {disease}")
-    else:
-        print_and_speak("No specific conditions were confirmed based on the symptoms provided.")
-    
-    if not_confirmed:
-        print_and_speak("The following conditions were considered but not confirmed:")
-        for disease in not_confirmed:
-            print_and_speak(f"- {disease}")
+def display_final_evaluation(confirmed, not_confirmed, ranked=()):
+    for line in evaluation_lines(confirmed, not_confirmed, ranked):
+        print_and_speak(line)
             
 # Function to run Flask app for scheduling Google Meet
 @app.route('/')
@@ -330,40 +277,57 @@ def start_flask_app():
 
 # Main code execution update
 if __name__ == "__main__":
+    try:
+        ensure_patient_indexes(patients_collection)
+        # Upload assessments logged while MongoDB was unavailable
+        uploaded = patient_log.sync(patients_collection)
+        if uploaded:
+            print(f"Uploaded {uploaded} assessments from the patient log.")
+    except Exception as e:
+        print(f"Could not prepare the patients collection: {e}")
+
+    # Trace of this session: every span (speech, matching, MongoDB, ...) as one JSON line
+    trace = start_trace(process_wide=True)
+    if trace:
+        print(f"Tracing this session to {trace.path}")
+
     print_and_speak("Welcome to the health assessment program.")
     
     # Step 1: Collect patient details
-    patient_info = get_patient_details()
+    with span("step", step="patient_details"):
+        patient_info = get_patient_details()
     
     # Step 2: Ask for an initial symptom description
-    patient_symptoms = confirm_or_correct("Please describe your symptoms.")
+    with span("step", step="symptom_description"):
+        patient_symptoms = confirm_or_correct("Please describe your symptoms.")
     
-    # Step 3: Extract relevant diseases and symptom patterns
-    relevant_diseases, symptom_patterns = extract_relevant_diseases(patient_symptoms)
+    # Step 3: Extract relevant diseases and the symptoms detected in the description
+    relevant_diseases, detected_symptoms = extract_relevant_diseases(patient_symptoms)
     print(f"Relevant diseases based on initial input: {relevant_diseases}")
     
-    # Step 4: For each relevant disease, ask follow-up questions and store the confirmed symptoms
-    for disease in relevant_diseases:
-        confirmed_symptoms, symptom_names = ask_follow_up(disease)
-        symptom_patterns[disease] = (confirmed_symptoms, symptom_names)
+    # Step 4: Ask the most informative questions first, stopping once a prognosis is
+    # confident enough; each symptom is asked at most once
+    with span("step", step="interview"):
+        symptom_patterns, ranked_prognoses = run_interview(relevant_diseases, detected_symptoms)
     
     # Step 5: Evaluate based on confirmed symptom patterns
     confirmed_prognoses, not_confirmed_prognoses = evaluate_diseases(symptom_patterns)
     
     # Step 6: Display the final evaluation to the user
-    display_final_evaluation([d[0] for d in confirmed_prognoses], [d[0] for d in not_confirmed_prognoses])
+    display_final_evaluation([d[0] for d in confirmed_prognoses], [d[0] for d in not_confirmed_prognoses], ranked_prognoses)
     
-    # Step 7: Save in MongoDB
+    # Step 7: Save in the patient log and MongoDB
+    assessment_id = None
     try:
-        store_patient_info_in_mongo(patient_info, confirmed_prognoses, not_confirmed_prognoses)
-        print_and_speak("Patient information stored successfully in the database.")
-    except Exception as e:
-        print(f"Error while saving patient information: {e}")
-        print_and_speak("An error occurred while saving your information.")
-    
-    # Step 8: Write the patient information and evaluation to a file
-    try:
-        write_patient_info_to_file(patient_info, confirmed_prognoses, not_confirmed_prognoses)
+        with span("step", step="storage"):
+            assessment_id, in_database = store_patient_info(
+                patient_info, confirmed_prognoses, not_confirmed_prognoses, ranked_prognoses, patient_symptoms
+            )
+        if in_database:
+            print_and_speak("Patient information stored successfully in the database.")
+        else:
+            print_and_speak("Patient information was saved and will be added to the database later.")
+        print(f"Your assessment ID: {assessment_id}")
         print_and_speak("Thank you for using the health assessment program.")
     except Exception as e:
         print(f"Error while saving patient information: {e}")
@@ -373,5 +337,7 @@ if __name__ == "__main__":
     print_and_speak("Redirecting to the scheduling system...")
     start_flask_app()
 
-    # Automatically open the browser to localhost:5000
-    webbrowser.open("http://localhost:5000")
\ No newline at end of file
+    # Automatically open the browser to localhost:5000 (booking for this assessment)
+    webbrowser.open(f"http://localhost:5000/?assessment_id={assessment_id}" if assessment_id else "http://localhost:5000")
+    speech_output.wait()
+    end_trace()
\ No newline at end of file
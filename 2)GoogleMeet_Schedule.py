@@ -1,196 +1,242 @@
-import os.path
+import os
+import uuid
 import datetime as dt
 from flask import Flask, render_template, request, jsonify
-from pymongo import MongoClient
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import pytz
+from slot_booking import claim_slot, release_slot, slot_exists
+from slot_store import SlotStore, as_utc, local_day_and_time, slot_to_json
+from availability import Availability, requested_window
+from read_cache import DOCTORS_TAG, ReadCache, cached_json_response, connect_redis, watch_changes
+from patient_store import build_patient_info, find_assessment
+from database import APPOINTMENTS_DB, PATIENTS_DB, ensure_indexes, get_client
+from job_queue import JobQueue
+from calendar_service import CalendarServiceManager, meet_event_body, meet_links
+from mailer import Mailer, render
+from metrics import instrument_flask
+from pymongo.errors import PyMongoError
 
 app = Flask(__name__)
 
+# Request timings and the Prometheus /metrics endpoint
+instrument_flask(app)
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 # MongoDB connection setup
-client = MongoClient("mongodb://localhost:27017/")
-db = client["doctor_appointments"]
+client = get_client()
+db = client[APPOINTMENTS_DB]
 collection = db["appointments"]
+bookings_collection = db["bookings"]
+patient_collection = client[PATIENTS_DB]["patients"]
 
-# SCOPES for Google Calendar API
-SCOPES = ["https://www.googleapis.com/auth/calendar"]
+# Time-indexed slots (one document per concrete slot, see slot_store.py)
+slot_store = SlotStore(db["slots"], db["slots_archive"])
 
-# Function to send email
-def send_email(to_email, subject, body):
-    from_email = "fromemail"
-    msg = MIMEMultipart()
-    msg["From"] = from_email
-    msg["To"] = to_email
-    msg["Subject"] = subject
-    msg.attach(MIMEText(body, "plain"))
+# Recurring availability rules; free slots are generated from them on demand
+availability = Availability(db["availability_rules"], slot_store)
 
-    try:
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(from_email, "password")  # App-specific password
-        server.sendmail(from_email, to_email, msg.as_string())
-        server.quit()
-        print(f"Email sent to {to_email}")
-    except Exception as e:
-        print(f"Failed to send email: {e}e")
+# Create the indexes of every collection the app uses
+ensure_indexes(client)
+
+# Read-through cache for the doctor listing and slot lookups (optionally shared through a
+# Redis-compatible server), invalidated by change streams when MongoDB offers them
+read_cache = ReadCache(redis_client=connect_redis(os.environ.get("READ_CACHE_REDIS_URL")))
+watch_changes(read_cache, [collection, db["slots"], db["availability_rules"]])
+
+# Shared Google Calendar credentials and service (loaded once, refreshed before expiry)
+calendar_manager = CalendarServiceManager()
+
+# Confirmation and reminder emails, sent by send_email jobs over pooled SMTP connections
+# (configured with the SMTP_* environment variables, see mailer.py); the keys of sent emails
+# are logged so a job that runs again does not repeat its email
+mailer = Mailer(dead_letters=db["email_dead_letters"], sent_log=db["sent_emails"])
         
 @app.route('/get_doctors', methods=['GET'])
 def get_doctors():
+    return cached_json_response(read_cache, ("doctors",), load_doctors)
+
+# Function to load the doctor listing for the cache
+def load_doctors():
     doctors = list(collection.find({}, {"_id": 0, "doctor_name": 1, "qualification": 1, "specialization": 1}))
-    return jsonify(doctors)
+    return doctors, 200, [DOCTORS_TAG]
 
 # Function to schedule Google Meet
-
-# Function to fetch the latest patient information
-def get_latest_patient_info():
-    patient_db = client["patient_database"]
-    patient_collection = patient_db["patients"]
-
-    # Fetch the latest document based on `_id` timestamp
-    latest_patient = patient_collection.find_one(sort=[("_id", -1)])
-    return latest_patient
-
-# Function to build diagnosis details with symptom evaluation
-def build_diagnosis_details(diagnoses):
-    details = []
-    for diag in diagnoses:
-        disease = diag.get("disease", "N/A")
-        symptoms = "\n  ".join(diag.get("symptom_evaluation", [])) or "None"
-        details.append(f"- {disease}\n  Symptom Evaluation:\n  {symptoms}")
-    return "\n".join(details)
-
-def schedule_google_meet(doctor_email, patient_email, time_slot, day):
-    today = dt.datetime.now(pytz.timezone("Asia/Kolkata"))
-    weekday_map = {"Monday": 0, "Tuesday": 1, "Wednesday": 2, "Thursday": 3, "Friday": 4, "Saturday": 5, "Sunday": 6}
+def schedule_google_meet(doctor_email, patient_email, time_slot, day, event_id=None, slot=None,
+                         patient_info="No patient information available."):
+    if slot:
+        # Slots from the slot store carry their real start and end times
+        start_datetime_utc, end_datetime_utc = as_utc(slot["start_utc"]), as_utc(slot["end_utc"])
+    else:
+        today = dt.datetime.now(pytz.timezone("Asia/Kolkata"))
+        weekday_map = {"Monday": 0, "Tuesday": 1, "Wednesday": 2, "Thursday": 3, "Friday": 4, "Saturday": 5, "Sunday": 6}
     
-    if day not in weekday_map:
-        return None, "Invalid day provided."
+        if day not in weekday_map:
+            return None, "Invalid day provided."
     
-    day_index = weekday_map[day]
-    days_ahead = (day_index - today.weekday() + 7) % 7
+        day_index = weekday_map[day]
+        days_ahead = (day_index - today.weekday() + 7) % 7
     
-    # Ensure that the day is in the 7-day window and shift to the next week if today has passed
-    if days_ahead == 0 and today.time() > dt.datetime.strptime(time_slot.split(" - ")[0], "%I:%M %p").time():
-        days_ahead = 7
+        # Ensure that the day is in the 7-day window and shift to the next week if today has passed
+        if days_ahead == 0 and today.time() > dt.datetime.strptime(time_slot.split(" - ")[0], "%I:%M %p").time():
+            days_ahead = 7
     
-    appointment_date = today + dt.timedelta(days=days_ahead)
+        appointment_date = today + dt.timedelta(days=days_ahead)
     
-    if days_ahead > 7:
-        return None, "Appointments can only be scheduled within the next 7 days."
+        if days_ahead > 7:
+            return None, "Appointments can only be scheduled within the next 7 days."
     
-    # Parse the time slot in local time (Asia/Kolkata)
-    start_time = dt.datetime.strptime(time_slot.split(" - ")[0], "%I:%M %p").time()
-    start_datetime = dt.datetime.combine(appointment_date.date(), start_time)
-    local_start = pytz.timezone("Asia/Kolkata").localize(start_datetime)
-
-    # Convert to UTC for Google Calendar
-    start_datetime_utc = local_start.astimezone(pytz.utc)
-    end_datetime_utc = start_datetime_utc + dt.timedelta(hours=1)
-
-    # Fetch the latest patient info
-    latest_patient = get_latest_patient_info()
-    if latest_patient:
-        # Build diagnosis details
-        confirmed_diagnoses_details = build_diagnosis_details(latest_patient.get("confirmed_diagnoses", [])) or "None"
-        unconfirmed_diagnoses_details = build_diagnosis_details(latest_patient.get("unconfirmed_diagnoses", [])) or "None"
-
-        patient_info = (
-            f"Patient Name: {latest_patient.get('name', 'N/A')}\n"
-            f"Age: {latest_patient.get('age', 'N/A')}\n"
-            f"Sex: {latest_patient.get('sex', 'N/A')}\n\n"
-            f"Confirmed Diagnoses:\n{confirmed_diagnoses_details}\n\n"
-            f"Unconfirmed Diagnoses:\n{unconfirmed_diagnoses_details}"
-        )
-    else:
-        patient_info = "No patient information available."
+        # Parse the time slot in local time (Asia/Kolkata)
+        start_time = dt.datetime.strptime(time_slot.split(" - ")[0], "%I:%M %p").time()
+        start_datetime = dt.datetime.combine(appointment_date.date(), start_time)
+        local_start = pytz.timezone("Asia/Kolkata").localize(start_datetime)
 
-    # Google Calendar API logic
-    creds = None
-    if os.path.exists("./Key/token.json"):
-        creds = Credentials.from_authorized_user_file("./Key/token.json", SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file("./Key/Credentials.json", SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open("./Key/token.json", "w") as token:
-            token.write(creds.to_json())
+        # Convert to UTC for Google Calendar
+        start_datetime_utc = local_start.astimezone(pytz.utc)
+        end_datetime_utc = start_datetime_utc + dt.timedelta(hours=1)
 
+    # Google Calendar API logic
     try:
-        service = build("calendar", "v3", credentials=creds)
-        event = {
-            "summary": "Doctor Appointment",
-            "location": "Online (Google Meet)",
-            "description": f"Doctor appointment scheduled.\n\n{patient_info}",
-            "start": {
-                "dateTime": start_datetime_utc.isoformat(),
-                "timeZone": "UTC",
-            },
-            "end": {
-                "dateTime": end_datetime_utc.isoformat(),
-                "timeZone": "UTC",
-            },
-            "attendees": [
-                {"email": patient_email},
-                {"email": doctor_email},
-            ],
-            "conferenceData": {
-                "createRequest": {
-                    "requestId": f"meet-{start_datetime_utc.isoformat()}",
-                    "conferenceSolutionKey": {"type": "hangoutsMeet"},
-                },
-            },
-        }
-
-        event = service.events().insert(
-            calendarId="primary", body=event, conferenceDataVersion=1, sendUpdates="all"
-        ).execute()
-
-        meet_link = event.get("htmlLink")
-        google_meet_link = (
-            event.get("conferenceData", {})
-            .get("entryPoints", [{}])[0]
-            .get("uri", "Google Meet link not available")
+        events = calendar_manager.events()
+        # With a fixed event ID a retried insert cannot create a second event
+        event = meet_event_body(
+            doctor_email, patient_email, start_datetime_utc, end_datetime_utc, patient_info, event_id
         )
+        try:
+            event = events.insert(
+                calendarId="primary", body=event, conferenceDataVersion=1, sendUpdates="all"
+            ).execute()
+        except HttpError as error:
+            if not event_id or error.resp.status != 409:
+                raise
+            event = events.get(calendarId="primary", eventId=event_id).execute()
+
+        meet_link, google_meet_link = meet_links(event)
 
         return meet_link, google_meet_link
     except HttpError as error:
         print(f"An error occurred: {error}")
         return None, None
 
+# Job: create the Calendar event of a booking, then queue a job for each confirmation email
+def create_calendar_event_job(payload):
+    booking = bookings_collection.find_one({"_id": payload["booking_id"]})
+    slot = slot_store.get(booking['slot_id']) if booking.get('slot_id') else None
+    meet_link, google_meet_link = schedule_google_meet(
+        booking['doctor_email'], booking['patient_email'], booking['time_slot'], booking['day'],
+        event_id=booking['_id'], slot=slot, patient_info=booking['patient_info']
+    )
+    if not meet_link:
+        raise RuntimeError(google_meet_link or "The Calendar event could not be created.")
+    bookings_collection.update_one(
+        {"_id": booking["_id"]},
+        {"$set": {"status": "scheduled", "meet_link": google_meet_link}}
+    )
+
+    context = {
+        "doctor_name": booking['doctor_name'],
+        "patient_name": booking['patient_name'],
+        "patient_info": booking['patient_info'],
+        "time_slot": booking['time_slot'],
+        "meet_link": google_meet_link,
+    }
+    for recipient in ("doctor", "patient"):
+        key = f"{booking['_id']}-{recipient}-email"
+        job_queue.enqueue("send_email", {
+            "to_email": booking[f"{recipient}_email"],
+            "template": f"{recipient}_confirmation",
+            "context": context,
+            "key": key,
+        }, key)
+    return {"meet_link": google_meet_link}
+
+# Job: send one email over the mailer's pooled connections; the job is done only once the
+# SMTP server accepted it or refused it for good (the mailer dead-letters it then), transient
+# failures are retried by the job queue, and an email whose key was sent before is not sent again. A reminder then marks its booking as reminded. Older
+# jobs carry a rendered subject and body.
+def send_email_job(payload):
+    if "template" in payload:
+        subject, body = render(payload["template"], payload["context"])
+    else:
+        subject, body = payload["subject"], payload["body"]
+    sent = mailer.deliver(payload["to_email"], subject, body, payload.get("key"))
+    if payload.get("reminder_for"):
+        bookings_collection.update_one(
+            {"_id": payload["reminder_for"]}, {"$set": {"reminder_sent_at": dt.datetime.now(dt.timezone.utc)}}
+        )
+    return {"sent": sent}
+
+# Background workers for the slow part of a booking (Calendar event and emails)
+job_queue = JobQueue(db["jobs"], {
+    "create_calendar_event": create_calendar_event_job,
+    "send_email": send_email_job,
+})
+job_queue.start()
+
 # Fetch available slots for a specific doctor on a given day
-@app.route("/get_slots", methods=["POST"])
+# (GET with query parameters lets browsers revalidate the answer with If-None-Match)
+@app.route("/get_slots", methods=["GET", "POST"])
 def get_slots():
-    doctor_name = request.json.get("doctor_name")
-    day = request.json.get("day")
+    params = request.get_json(silent=True) or request.args
+    key = ("slots", params.get("doctor_name"), params.get("day"), params.get("start"), params.get("end"))
+    return cached_json_response(read_cache, key, lambda: load_slots(*key[1:]))
+
+# Function to load the free slots of a doctor for the cache
+def load_slots(doctor_name, day, start_date=None, end_date=None):
     doctor_info = collection.find_one({"doctor_name": doctor_name})
 
+    if doctor_info and availability.get_rule(doctor_info["_id"]):
+        # Doctors with availability rules: computed for the next `day`, or for any date
+        # range given as {"start": "2026-10-20", "end": "2026-10-27"}
+        start, end = requested_window(day, start_date, end_date)
+        slots = availability.free_slots(start, end, doctor_id=doctor_info["_id"])
+        return {"available_slots": [slot_to_json(slot) for slot in slots]}, 200, [str(doctor_info["_id"])]
     if doctor_info:
         slots = doctor_info["available_slots"].get(day, [])
         available_slots = [slot for slot in slots if slot["available"]]
-        return jsonify({"available_slots": available_slots})
+        return {"available_slots": available_slots}, 200, [str(doctor_info["_id"])]
     else:
-        return jsonify({"message": "Doctor not found or no available slots for the selected day."}), 400
+        return {"message": "Doctor not found or no available slots for the selected day."}, 400, []
+
+# Free slots starting in the next `hours` hours, by doctor and/or specialization, e.g.
+# /free_slots?specialization=Cardiologist&hours=48 (stored slots come from the slot store's
+# indexes, rule-based ones are generated in memory)
+@app.route("/free_slots", methods=["GET"])
+def free_slots():
+    start = dt.datetime.now(dt.timezone.utc)
+    end = start + dt.timedelta(hours=request.args.get("hours", 48, type=int))
+    doctor_id = None
+    doctor_name = request.args.get("doctor_name")
+    if doctor_name:
+        doctor_info = collection.find_one({"doctor_name": doctor_name}, {"_id": 1})
+        if not doctor_info:
+            return jsonify({"message": "Doctor not found."}), 400
+        doctor_id = doctor_info["_id"]
+    slots = availability.free_slots(
+        start, end, doctor_id=doctor_id, specialization=request.args.get("specialization"),
+        limit=request.args.get("limit", 200, type=int),
+    )
+    return jsonify({"free_slots": [slot_to_json(slot) for slot in slots]})
 
 # Book an appointment
 @app.route('/book_appointment', methods=['POST'])
 def book_appointment():
     data = request.json
-    doctor_name = data['doctor_name']
-    day = data['day']
-    time_slot = data['time_slot']
+    slot_id = data.get('slot_id')
+    if slot_id:
+        # Booking a slot by its ID: stored in the slot store, or generated from a rule
+        stored_slot = slot_store.get(slot_id)
+        slot = stored_slot or availability.resolve(slot_id)
+        if not slot:
+            return jsonify({'message': 'The selected time slot does not exist.'}), 400
+        doctor_name = slot['doctor_name']
+        day, time_slot = local_day_and_time(slot)
+    else:
+        doctor_name = data['doctor_name']
+        day = data['day']
+        time_slot = data['time_slot']
     patient_email = data['patient_email']
     patient_name = data['patient_name']
 
@@ -200,60 +246,79 @@ def book_appointment():
     if not doctor_info:
         return jsonify({'message': 'Doctor not found.'}), 400
 
-    # Search for the patient by exact name
-    patient_db = client["patient_database"]
-    patient_collection = patient_db["patients"]
+    # The assessment given by ID (the kiosk passes it on), else the latest one under this name
+    assessment_id = data.get('assessment_id')
+    latest_patient = find_assessment(patient_collection, assessment_id=assessment_id, name=patient_name)
 
-    patient_records = list(patient_collection.find({'name': {'$regex': f'^{patient_name}$', '$options': 'i'}}))
-
-    if not patient_records:
+    if not latest_patient:
+        if assessment_id:
+            return jsonify({'message': f"No assessment found with the ID '{assessment_id}'."}), 400
         return jsonify({'message': f"No patient found with the name '{patient_name}'. Please ensure the name matches exactly."}), 400
 
-    if len(patient_records) > 1:
-        # Fetch the latest record if multiple records exist
-        latest_patient = sorted(patient_records, key=lambda x: x["_id"], reverse=True)[0]
+    # Claim the slot with one conditional update; if it fails, another request won the slot.
+    # Hex UUIDs are also valid Calendar event IDs, which makes the event insert idempotent.
+    booking_id = uuid.uuid4().hex
+    if slot_id:
+        if stored_slot:
+            claimed = slot_store.claim(slot_id, booking_id) is not None
+        else:
+            claimed = slot_store.claim_new(slot, booking_id) is not None
     else:
-        latest_patient = patient_records[0]
-
-    # Check the slot availability
-    slots = doctor_info['available_slots'].get(day, [])
-    slot = next((slot for slot in slots if slot['time'] == time_slot), None)
-
-    if not slot or not slot['available']:
-        return jsonify({'message': 'The selected time slot is already booked.'}), 400
-
-    # Update the slot to mark it as unavailable
-    collection.update_one(
-        {'doctor_name': doctor_name, f'available_slots.{day}.time': time_slot},
-        {'$set': {'available_slots.' + day + '.$.available': False}}
-    )
+        claimed = claim_slot(collection, doctor_name, day, time_slot)
+    if not claimed:
+        if not slot_id and not slot_exists(collection, doctor_name, day, time_slot):
+            return jsonify({'message': 'The selected time slot does not exist.'}), 400
+        return jsonify({'message': 'The selected time slot is already booked.', 'booked': False}), 409
+    read_cache.note_write(str(doctor_info['_id']))
 
     # Build patient information string for description
-    confirmed_diagnoses_details = build_diagnosis_details(latest_patient.get("confirmed_diagnoses", [])) or "None"
-    unconfirmed_diagnoses_details = build_diagnosis_details(latest_patient.get("unconfirmed_diagnoses", [])) or "None"
-    patient_info = (
-        f"Patient Name: {latest_patient.get('name', 'N/A')}\n"
-        f"Age: {latest_patient.get('age', 'N/A')}\n"
-        f"Sex: {latest_patient.get('sex', 'N/A')}\n\n"
-        f"Confirmed Diagnoses:\n{confirmed_diagnoses_details}\n\n"
-        f"Unconfirmed Diagnoses:\n{unconfirmed_diagnoses_details}"
-    )
-
-    # Schedule Google Meet and get the link
-    meet_link, google_meet_link = schedule_google_meet(
-        doctor_info['doctor_email'], patient_email, time_slot, day
-    )
+    patient_info = build_patient_info(latest_patient)
 
-    # Send confirmation emails
-    doctor_subject = f"New Appointment Scheduled with {latest_patient.get('name', 'N/A')}"
-    doctor_body = f"Dear {doctor_name},\n\nYou have a new appointment.\n\n{patient_info}\n\nTime: {time_slot}\nMeet Link: {google_meet_link}\n\nRegards,\nAppointment System"
-    send_email(doctor_info['doctor_email'], doctor_subject, doctor_body)
-
-    patient_subject = f"Appointment Confirmation with {doctor_name}"
-    patient_body = f"Dear {latest_patient.get('name', 'N/A')},\n\nYour appointment with {doctor_name} is confirmed.\nTime: {time_slot}\nMeet Link: {google_meet_link}\n\nRegards,\nAppointment System"
-    send_email(patient_email, patient_subject, patient_body)
-
-    return jsonify({'message': 'Appointment successfully booked!', 'meet_link': google_meet_link})
+    # Record the booking and hand the Calendar event and emails to the background workers
+    try:
+        bookings_collection.insert_one({
+            "_id": booking_id,
+            "doctor_name": doctor_name,
+            "doctor_email": doctor_info['doctor_email'],
+            "day": day,
+            "time_slot": time_slot,
+            "slot_id": slot_id,
+            "patient_name": latest_patient.get('name', 'N/A'),
+            "assessment_id": latest_patient['_id'],
+            "patient_id": latest_patient.get('patient_id'),
+            "patient_email": patient_email,
+            "patient_info": patient_info,
+            "status": "pending",
+        })
+        job_queue.enqueue("create_calendar_event", {"booking_id": booking_id}, f"{booking_id}-calendar-event")
+    except PyMongoError as e:
+        print(f"Failed to record booking: {e}")
+        if slot_id:
+            slot_store.release(slot_id, booking_id)
+        else:
+            release_slot(collection, doctor_name, day, time_slot)
+        read_cache.note_write(str(doctor_info['_id']))
+        return jsonify({'message': 'The appointment could not be booked, please try again.'}), 500
+
+    return jsonify({
+        'message': 'Appointment successfully booked! The Meet link will be emailed to you shortly.',
+        'booking_id': booking_id,
+        'status_url': f"/booking_status/{booking_id}",
+    }), 202
+
+# Check the progress of a booking (the Meet link appears once the Calendar event exists)
+@app.route('/booking_status/<booking_id>', methods=['GET'])
+def booking_status(booking_id):
+    booking = bookings_collection.find_one({"_id": booking_id})
+    if not booking:
+        return jsonify({'message': 'Booking not found.'}), 404
+
+    status = booking['status']
+    if status == "pending":
+        job = job_queue.get(f"{booking_id}-calendar-event")
+        if job and job['status'] == "failed":
+            status = "failed"
+    return jsonify({'booking_id': booking_id, 'status': status, 'meet_link': booking.get('meet_link')})
 
 if __name__ == "__main__":
     app.run(debug=True, host="localhost", port=5000)
\ No newline at end of file
@@ -0,0 +1,239 @@
+import argparse
+import datetime as dt
+import itertools
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from knowledge_base import load_knowledge_base
+from database import PATIENTS_DB, BufferedWriter, get_client
+from patient_store import ensure_patient_indexes, new_id, normalize_name
+from symptom_matcher import reported_symptoms
+
+# Knowledge base of the current process (loaded lazily, once per pool worker)
+_knowledge_base = None
+
+
+# Function to return the knowledge base of this process
+def get_knowledge_base():
+    global _knowledge_base
+    if _knowledge_base is None:
+        _knowledge_base = load_knowledge_base()
+    return _knowledge_base
+
+
+# Function to check if the response is affirmative
+def is_affirmative(response):
+    yes_synonyms = ["yes", "yeah", "yup", "sure", "absolutely", "affirmative", "certainly", "correct", "positive"]
+    return any(phrase in response for phrase in yes_synonyms)
+
+
+# Function to check if the response is negative
+def is_negative(response):
+    no_synonyms = ["no", "nah", "nope", "not at all", "never", "negative"]
+    return any(phrase in response for phrase in no_synonyms)
+
+
+# A reply that is nothing but yes (or nothing but no) words, matched as whole words
+CLEAR_YES = re.compile(r"(?:\b(?:yes|yeah|yup|sure|absolutely|affirmative|certainly|correct|positive)\b[\s,.!]*)+")
+CLEAR_NO = re.compile(r"(?:\b(?:no|nah|nope|not at all|never|negative)\b[\s,.!]*)+")
+
+
+# Function to check if a partial hypothesis is already a clear yes or no, to stop listening
+# early. Unlike is_affirmative/is_negative (which judge the finished answer) it only accepts
+# a reply made of yes or no words alone, so "i know...", "right now..." or "my nose..." are
+# not taken for a "no" before the patient has finished.
+def is_clear_yes_or_no(response):
+    response = response.strip().lower()
+    return bool(CLEAR_YES.fullmatch(response) or CLEAR_NO.fullmatch(response))
+
+
+# Function to decide whether a confirmed symptom holds, from its follow-up answers
+def follow_ups_confirm(follow_up_answers):
+    if not follow_up_answers:
+        return True
+    yes_count = sum(1 for answer in follow_up_answers if is_affirmative(answer))
+    return yes_count > len(follow_up_answers) / 2
+
+
+# Function to resolve a recorded answer to True/False.
+# An answer is a bool, a spoken reply ("yes", "nope"), or
+# {"answer": "yes", "follow_ups": ["yes", "no"]} when follow-up questions were answered.
+def resolve_answer(answer):
+    if isinstance(answer, bool):
+        return answer
+    if isinstance(answer, dict):
+        return is_affirmative(answer.get("answer", "").lower()) and follow_ups_confirm(
+            [reply.lower() for reply in answer.get("follow_ups", [])]
+        )
+    return is_affirmative(str(answer).lower())
+
+
+# Function to build the 0/1 pattern and +/- names of a disease from resolved answers.
+# Symptoms without an answer count as not present.
+def build_symptom_pattern(symptoms, answers):
+    confirmed_symptoms = []
+    symptom_names = []
+    for symptom in symptoms:
+        present = answers.get(symptom, False)
+        confirmed_symptoms.append(1 if present else 0)
+        symptom_names.append(f"+{symptom}" if present else f"-{symptom}")
+    return confirmed_symptoms, symptom_names
+
+
+# Function to evaluate all diseases based on symptom patterns
+def evaluate_diseases(symptom_patterns, disease_matrix):
+    confirmed_prognoses = []
+    not_confirmed_prognoses = []
+
+    for disease, (symptom_pattern, symptom_names) in symptom_patterns.items():
+        if list(symptom_pattern) in disease_matrix[disease]:
+            confirmed_prognoses.append((disease, symptom_names))
+        else:
+            not_confirmed_prognoses.append((disease, symptom_names))
+
+    return confirmed_prognoses, not_confirmed_prognoses
+
+
+# Function to build the patient document stored in MongoDB
+# The document's _id is the assessment ID bookings refer to; patient_id stays the same for
+# every assessment of one patient (a new one is created when none is given)
+def build_patient_document(patient_info, confirmed_prognoses, not_confirmed_prognoses, ranked_prognoses=(), patient_id=None):
+    return {
+        "_id": new_id(),
+        "patient_id": patient_id or new_id(),
+        "assessed_at": dt.datetime.now(dt.timezone.utc),
+        "name": patient_info['name'],
+        "name_normalized": normalize_name(patient_info['name']),
+        "age": patient_info['age'],
+        "sex": patient_info['sex'],
+        "confirmed_diagnoses": [{
+            "disease": disease,
+            "symptom_evaluation": symptoms
+        } for disease, symptoms in confirmed_prognoses],
+        "unconfirmed_diagnoses": [{
+            "disease": disease,
+            "symptom_evaluation": symptoms
+        } for disease, symptoms in not_confirmed_prognoses],
+        "ranked_prognoses": [{
+            "prognosis": prognosis,
+            "probability": probability
+        } for prognosis, probability in ranked_prognoses]
+    }
+
+
+# Function to run one intake record through the diagnosis pipeline without any audio.
+# A record holds "name", "age", "sex", the free-text "symptoms" and "answers" keyed by symptom.
+def assess_record(record, knowledge_base=None):
+    knowledge_base = knowledge_base or get_knowledge_base()
+    disease_symptoms = knowledge_base["disease_symptoms"]
+    diagnosis_engine = knowledge_base["diagnosis_engine"]
+
+    description = record.get("symptoms", "")
+    detected_symptoms = knowledge_base["symptom_matcher"].match_scored(description)
+    answers = {symptom: resolve_answer(answer) for symptom, answer in record.get("answers", {}).items()}
+
+    # Mentioned symptoms count as present unless an answer says otherwise, as in the interview
+    # (matches of misheard words below REPORTED_CONFIDENCE do not count as mentioned)
+    mentioned = reported_symptoms(detected_symptoms)
+    known = dict.fromkeys(mentioned, True)
+    known.update(answers)
+    symptom_patterns = {
+        disease: build_symptom_pattern(disease_symptoms[disease], known)
+        for disease in detected_symptoms
+    }
+    confirmed_prognoses, not_confirmed_prognoses = evaluate_diseases(symptom_patterns, knowledge_base["disease_matrix"])
+
+    confirmed = [symptom for symptom in mentioned if answers.get(symptom, True)]
+    confirmed += [symptom for symptom, present in answers.items() if present and symptom not in mentioned]
+    denied = [symptom for symptom, present in answers.items() if not present]
+    ranked_prognoses = []
+    if confirmed or denied:
+        ranked_prognoses = diagnosis_engine.rank(diagnosis_engine.encode(confirmed, denied), top=3)
+
+    patient_info = {key: record.get(key, "N/A") for key in ("name", "age", "sex")}
+    document = build_patient_document(
+        patient_info, confirmed_prognoses, not_confirmed_prognoses, ranked_prognoses, record.get("patient_id")
+    )
+    document["symptom_description"] = description
+    if "record_id" in record:
+        document["record_id"] = record["record_id"]
+    return document
+
+
+# Function to assess a chunk of JSONL lines (runs inside a pool worker)
+def assess_lines(lines):
+    return [assess_record(json.loads(line)) for line in lines if line.strip()]
+
+
+# Function to stream assessments of JSONL lines, in input order, using a process pool
+def assess_stream(lines, workers=None, chunk_size=256):
+    chunks = iter(lambda: list(itertools.islice(lines, chunk_size)), [])
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in chunks:
+            yield from assess_lines(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Bound the number of chunks in flight so huge inputs are never loaded at once
+        pending = []
+        for chunk in chunks:
+            pending.append(executor.submit(assess_lines, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+
+# Function to write assessments as JSONL
+def write_jsonl(documents, output):
+    count = 0
+    for document in documents:
+        output.write(json.dumps(document, default=lambda value: value.isoformat()) + "\n")
+        count += 1
+    return count
+
+
+# Function to insert assessments into MongoDB in batches (written in the background while
+# the next assessments are computed)
+def write_mongo(documents, collection, batch_size=1000):
+    writer = BufferedWriter(collection, batch_size=batch_size)
+    for document in documents:
+        writer.write(document)
+    writer.close()
+    return writer.written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score intake transcripts (JSONL) without a microphone.")
+    parser.add_argument("input", help="JSONL file of intake records, or - for stdin")
+    parser.add_argument("--output", default="-", help="JSONL file for the results (default: stdout)")
+    parser.add_argument("--mongo", metavar="URI", help="insert results into MongoDB instead of writing JSONL")
+    parser.add_argument("--database", default=PATIENTS_DB)
+    parser.add_argument("--collection", default="assessments")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    # Compile (or validate) the knowledge base once before the workers load it
+    get_knowledge_base()
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    with source:
+        documents = assess_stream(source, args.workers, args.chunk_size)
+        if args.mongo:
+            collection = get_client(args.mongo)[args.database][args.collection]
+            ensure_patient_indexes(collection)
+            count = write_mongo(documents, collection)
+        elif args.output == "-":
+            count = write_jsonl(documents, sys.stdout)
+        else:
+            with open(args.output, "w") as output:
+                count = write_jsonl(documents, output)
+    print(f"Assessed {count} records.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import argparse
+import datetime as dt
+import functools
+
+import pytz
+from pymongo import ASCENDING, ReturnDocument
+
+from database import APPOINTMENTS_DB, get_client
+from slot_store import BOOKED, CLINIC_TIMEZONE, FREE, WEEKDAYS, SlotStore, as_utc, next_weekday
+
+# Example availability rule (one document per doctor, `_id` is the doctor's _id as a string):
+#
+#   {"_id": "...", "doctor_name": "Dr. A", "specialization": "Cardiologist",
+#    "timezone": "Asia/Kolkata", "slot_minutes": 60,
+#    "weekly": {"Monday": [["09:00", "17:00"]], "Wednesday": [["10:00", "13:00"]]},
+#    "breaks": [["13:00", "14:00"]],
+#    "holidays": ["2026-12-25"],
+#    "overrides": {"2026-10-21": [["15:00", "18:00"]], "2026-10-22": []},
+#    "version": 3}
+#
+# `overrides` replace the weekly hours of one date ([] closes the day) and `version` is
+# bumped on every change so cached slots of an older rule are never served.
+
+
+# Function to parse a "HH:MM" (24 h) time
+def parse_clock(value):
+    return dt.datetime.strptime(value, "%H:%M").time()
+
+
+# Function to generate the slots of one rule on one local date as (start_utc, end_utc) pairs
+def materialize_day(rule, date):
+    iso_date = date.isoformat()
+    if iso_date in rule.get("holidays", []):
+        return ()
+    hours = rule.get("overrides", {}).get(iso_date, rule.get("weekly", {}).get(WEEKDAYS[date.weekday()], []))
+    timezone = pytz.timezone(rule.get("timezone", CLINIC_TIMEZONE.zone))
+    length = dt.timedelta(minutes=rule.get("slot_minutes", 60))
+    breaks = [
+        (dt.datetime.combine(date, parse_clock(start)), dt.datetime.combine(date, parse_clock(end)))
+        for start, end in rule.get("breaks", [])
+    ]
+
+    slots = []
+    for opens, closes in hours:
+        start = dt.datetime.combine(date, parse_clock(opens))
+        closes = dt.datetime.combine(date, parse_clock(closes))
+        while start + length <= closes:
+            end = start + length
+            overlapping = [break_end for break_start, break_end in breaks if start < break_end and end > break_start]
+            if overlapping:
+                # Continue right after the break
+                start = max(overlapping)
+                continue
+            slots.append((
+                timezone.localize(start).astimezone(dt.timezone.utc),
+                timezone.localize(end).astimezone(dt.timezone.utc),
+            ))
+            start = end
+    return tuple(slots)
+
+
+# Function to turn the requested window of /get_slots into UTC instants: either an explicit
+# date range (local dates, end exclusive) or the next occurrence of a weekday
+def requested_window(day=None, start_date=None, end_date=None, now=None, timezone=CLINIC_TIMEZONE):
+    now = now or dt.datetime.now(dt.timezone.utc)
+    today = now.astimezone(timezone).date()
+    if start_date:
+        first = dt.date.fromisoformat(start_date)
+        last = dt.date.fromisoformat(end_date) if end_date else first + dt.timedelta(days=7)
+    else:
+        first = next_weekday(today, day) if day else today
+        last = first + dt.timedelta(days=1)
+    start = timezone.localize(dt.datetime.combine(first, dt.time())).astimezone(dt.timezone.utc)
+    end = timezone.localize(dt.datetime.combine(last, dt.time())).astimezone(dt.timezone.utc)
+    # Slots that already started are never offered
+    return max(start, now), end
+
+
+# Hashable stand-in for a rule in the slot cache: two rules are the same key when they
+# have the same _id and version (every change of a rule bumps its version)
+class RuleKey:
+    __slots__ = ("rule", "key")
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.key = (rule["_id"], rule.get("version", 0))
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, RuleKey) and self.key == other.key
+
+
+# Doctor availability computed from recurring rules.
+# Concrete slots are generated lazily for whatever window is asked for and cached per
+# (doctor, rule version, date) in one LRU cache of `cache_size` entries, which also holds
+# the rules it needs; only booked slots are stored (in the SlotStore), so free slots never
+# need to be created ahead of time or reset after a meeting.
+class Availability:
+    def __init__(self, rules_collection, slot_store, cache_size=4096):
+        self.rules_collection = rules_collection
+        self.slot_store = slot_store
+        self._day_slots = functools.lru_cache(maxsize=cache_size)(self._materialize)
+
+    # Function to create the index used to find the rules of a specialization
+    def ensure_indexes(self):
+        self.rules_collection.create_index([("specialization", ASCENDING)])
+
+    # Function to create or replace the rule of a doctor (as stored in the appointments collection)
+    def set_rule(self, doctor, rule):
+        fields = {key: value for key, value in rule.items() if key not in ("_id", "version")}
+        fields.update(doctor_name=doctor["doctor_name"], specialization=doctor.get("specialization"))
+        return self.rules_collection.find_one_and_update(
+            {"_id": str(doctor["_id"])},
+            {"$set": fields, "$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    # Function to return the rule of one doctor (or None if the doctor has no rule)
+    def get_rule(self, doctor_id):
+        return self.rules_collection.find_one({"_id": str(doctor_id)})
+
+    # Function to return the rules matching a doctor and/or specialization
+    def find_rules(self, doctor_id=None, specialization=None):
+        query = {}
+        if doctor_id is not None:
+            query["_id"] = str(doctor_id)
+        if specialization is not None:
+            query["specialization"] = specialization
+        return list(self.rules_collection.find(query))
+
+    def _materialize(self, rule_key, date):
+        return materialize_day(rule_key.rule, date)
+
+    # Function to return the (cached) slots of a rule on a local date
+    def day_slots(self, rule, date):
+        return self._day_slots(RuleKey(rule), date)
+
+    # Function to generate the slot documents of a rule that start in [start, end)
+    def rule_slots(self, rule, start, end):
+        timezone = pytz.timezone(rule.get("timezone", CLINIC_TIMEZONE.zone))
+        date = start.astimezone(timezone).date()
+        last = end.astimezone(timezone).date()
+        slots = []
+        while date <= last:
+            for slot_start, slot_end in self.day_slots(rule, date):
+                if start <= slot_start < end:
+                    slots.append(self.slot_store.make_slot(rule, slot_start, slot_end))
+            date += dt.timedelta(days=1)
+        return slots
+
+    # Function to list free slots starting in [start, end): generated slots of the matching
+    # rules minus the booked ones, plus free slots stored in the SlotStore (e.g. migrated ones)
+    def free_slots(self, start, end, doctor_id=None, specialization=None, limit=0):
+        booked = self.slot_store.find_slots(start, end, status=BOOKED, doctor_id=doctor_id, specialization=specialization)
+        stored = self.slot_store.find_slots(start, end, status=FREE, doctor_id=doctor_id, specialization=specialization)
+        generated = [
+            slot for rule in self.find_rules(doctor_id, specialization) for slot in self.rule_slots(rule, start, end)
+        ]
+        return combine_free_slots(stored, booked, generated, limit)
+
+    # Function to return the slot `slot_id` (starting at `start`) if the rule offers it
+    def rule_slot(self, rule, slot_id, start):
+        for slot in self.rule_slots(rule, start, start + dt.timedelta(minutes=1)):
+            if slot["_id"] == slot_id:
+                return slot
+        return None
+
+    # Function to turn the ID of a generated slot back into its slot document; returns None
+    # unless the doctor's rule really offers that slot and it has not started yet
+    def resolve(self, slot_id, now=None):
+        now = now or dt.datetime.now(dt.timezone.utc)
+        doctor_id, start = parse_slot_id(slot_id)
+        if start is None or start <= now:
+            return None
+        rule = self.get_rule(doctor_id)
+        return self.rule_slot(rule, slot_id, start) if rule else None
+
+
+# Function to split a slot ID into the doctor's _id and the UTC start ((None, None) if malformed)
+def parse_slot_id(slot_id):
+    doctor_id, _, start_text = slot_id.rpartition("-")
+    try:
+        return doctor_id, dt.datetime.strptime(start_text, "%Y%m%dT%H%MZ").replace(tzinfo=dt.timezone.utc)
+    except ValueError:
+        return None, None
+
+
+# Function to merge free slots: stored free ones plus generated ones that are not booked,
+# sorted by start time (then doctor)
+def combine_free_slots(stored_free, booked, generated, limit=0):
+    booked_ids = {slot["_id"] for slot in booked}
+    slots = {slot["_id"]: slot for slot in stored_free}
+    for slot in generated:
+        if slot["_id"] not in booked_ids:
+            slots.setdefault(slot["_id"], slot)
+    slots = sorted(slots.values(), key=lambda slot: (as_utc(slot["start_utc"]), slot["doctor_name"]))
+    return slots[:limit] if limit else slots
+
+
+# Function to derive a weekly rule from a doctor's weekday-keyed "10:00 AM - 11:00 AM" slots
+def rule_from_nested(doctor):
+    weekly = {}
+    lengths = set()
+    for day, day_slots in doctor.get("available_slots", {}).items():
+        hours = []
+        for slot in day_slots:
+            start_text, end_text = [part.strip() for part in slot["time"].split(" - ")]
+            start = dt.datetime.strptime(start_text, "%I:%M %p")
+            end = dt.datetime.strptime(end_text, "%I:%M %p")
+            lengths.add(int((end - start).total_seconds() // 60))
+            hours.append([f"{start:%H:%M}", f"{end:%H:%M}"])
+        weekly[day] = sorted(hours)
+    return {
+        "timezone": CLINIC_TIMEZONE.zone,
+        # Mixed slot lengths cannot be expressed by one rule; the shortest keeps every hour bookable
+        "slot_minutes": min(lengths) if lengths else 60,
+        "weekly": weekly,
+        "breaks": [],
+        "holidays": [],
+        "overrides": {},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the doctors' recurring availability rules.")
+    parser.add_argument("command", choices=["import"],
+                        help="import: create a rule for every doctor from the weekday-keyed slot arrays")
+    parser.add_argument("--mongo", metavar="URI", help="MongoDB URI (default: $MONGO_URI)")
+    parser.add_argument("--database", default=APPOINTMENTS_DB)
+    args = parser.parse_args(argv)
+
+    db = get_client(args.mongo)[args.database]
+    availability = Availability(db["availability_rules"], SlotStore(db["slots"], db["slots_archive"]))
+    availability.ensure_indexes()
+    count = 0
+    for doctor in db["appointments"].find({}, {"doctor_name": 1, "specialization": 1, "available_slots": 1}):
+        availability.set_rule(doctor, rule_from_nested(doctor))
+        count += 1
+    print(f"Imported availability rules for {count} doctors.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Benchmark: storing 20,000 assessment documents one insert_one at a time (as
+# store_patient_info_in_mongo used to) versus the BufferedWriter. Each MongoDB call pays a
+# simulated network round trip (mongomock answers instantly); --mongo uses a real server.
+# A second run with a tiny queue shows the producer being held back (backpressure).
+#
+#   python benchmarks/bench_buffered_writer.py [--documents 20000] [--batch-size 500] [--mongo mongodb://localhost:27017/]
+import argparse
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from assessment import build_patient_document  # noqa: E402
+from database import BufferedWriter, get_client  # noqa: E402
+
+# Simulated network round trip per MongoDB call (mongomock answers instantly)
+ROUND_TRIP_SECONDS = 0.0005
+
+
+# Collection wrapper that adds the round trip and counts calls
+class RoundTripCollection:
+    def __init__(self, collection, round_trip):
+        self.collection = collection
+        self.name = collection.name
+        self.round_trip = round_trip
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.round_trip)
+
+    def insert_one(self, document):
+        self._call()
+        return self.collection.insert_one(document)
+
+    def bulk_write(self, operations, ordered=True):
+        self._call()
+        return self.collection.bulk_write(operations, ordered=ordered)
+
+
+def make_documents(count):
+    return [
+        build_patient_document(
+            {"name": f"Patient {number}", "age": 20 + number % 60, "sex": "female" if number % 2 else "male"},
+            [("Common Cold", ["cough: yes", "fever: yes"])], [("Influenza", ["chills: no"])],
+            [("Common Cold", 0.61), ("Influenza", 0.22)],
+        )
+        for number in range(count)
+    ]
+
+
+def run(count, batch_size, uri):
+    round_trip = 0.0 if uri else ROUND_TRIP_SECONDS
+    database = get_client(uri or "mongomock://")["patient_database_bench"]
+    database["patients"].drop()
+    collection = RoundTripCollection(database["patients"], round_trip)
+    print(f"{count} assessment documents, {round_trip * 1000:.1f} ms simulated round trip")
+
+    documents = make_documents(count)
+    start = time.perf_counter()
+    for document in documents:
+        collection.insert_one(document)
+    one_by_one = time.perf_counter() - start
+    print(f"insert_one per document: {one_by_one:.2f} s, {collection.calls} calls")
+
+    database["patients"].drop()
+    collection.calls = 0
+    documents = make_documents(count)
+    writer = BufferedWriter(collection, batch_size=batch_size)
+    start = time.perf_counter()
+    for document in documents:
+        writer.write(document)
+    queued = time.perf_counter() - start
+    writer.close()
+    buffered = time.perf_counter() - start
+    print(f"BufferedWriter:          {buffered:.2f} s ({queued:.2f} s until all were queued), "
+          f"{collection.calls} calls, {writer.written} written")
+    print(f"Speed-up: {one_by_one / buffered:.1f}x")
+
+    # Backpressure: with at most 100 pending documents the producer waits for the database
+    database["patients"].drop()
+    collection.round_trip = max(round_trip, 0.01)
+    documents = make_documents(2000)
+    writer = BufferedWriter(collection, batch_size=100, max_pending=100)
+    start = time.perf_counter()
+    for document in documents:
+        writer.write(document)
+    queued = time.perf_counter() - start
+    writer.close()
+    print(f"Backpressure (max_pending=100, {collection.round_trip * 1000:.0f} ms per batch): "
+          f"producer held back {queued:.2f} s for 2000 documents")
+    database["patients"].drop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--mongo", metavar="URI", help="use a real mongod instead of mongomock")
+    args = parser.parse_args()
+    run(args.documents, args.batch_size, args.mongo)
@@ -0,0 +1,129 @@
+# Benchmark: 1,000 Calendar event inserts against a stubbed HTTP transport, comparing the
+# old per-booking block (read token.json, build() the service) with CalendarServiceManager.
+#
+#   python benchmarks/bench_calendar_service.py [--bookings 1000] [--threads 8]
+import argparse
+import datetime as dt
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpMock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from calendar_service import SCOPES, CalendarServiceManager  # noqa: E402
+
+EVENT_RESPONSE = json.dumps({
+    "id": "event123",
+    "htmlLink": "https://calendar.google.com/event?eid=event123",
+    "conferenceData": {"entryPoints": [{"uri": "https://meet.google.com/abc-defg-hij"}]},
+})
+
+
+# Stubbed transport: every request is answered locally with a canned event
+class FakeCalendarHttp(HttpMock):
+    def __init__(self):
+        super().__init__(headers={"status": "200"})
+        self.data = EVENT_RESPONSE
+
+
+# Function to write a token file whose access token is valid for `valid_for`
+def write_token(path, valid_for=dt.timedelta(hours=1)):
+    expiry = (dt.datetime.utcnow() + valid_for).strftime("%Y-%m-%dT%H:%M:%SZ")
+    with open(path, "w") as token:
+        json.dump({
+            "token": "fake-access-token",
+            "refresh_token": "fake-refresh-token",
+            "client_id": "fake-client",
+            "client_secret": "fake-secret",
+            "token_uri": "https://oauth2.googleapis.com/token",
+            "scopes": SCOPES,
+            "expiry": expiry,
+        }, token)
+
+
+def make_event(number):
+    start = dt.datetime(2030, 1, 1, tzinfo=dt.timezone.utc) + dt.timedelta(hours=number)
+    return {
+        "summary": "Doctor Appointment",
+        "start": {"dateTime": start.isoformat(), "timeZone": "UTC"},
+        "end": {"dateTime": (start + dt.timedelta(hours=1)).isoformat(), "timeZone": "UTC"},
+    }
+
+
+# The credential/service block schedule_google_meet used to run for every booking
+def legacy_insert(token_path, number):
+    creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+    service = build("calendar", "v3", credentials=creds)
+    return service.events().insert(calendarId="primary", body=make_event(number)).execute(http=FakeCalendarHttp())
+
+
+def managed_insert(manager, number):
+    return manager.events().insert(calendarId="primary", body=make_event(number)).execute()
+
+
+# Stubbed token endpoint: a slow refresh that hands out a token valid for an hour
+def fake_refresh(creds, request):
+    time.sleep(0.05)
+    creds.token = "refreshed-access-token"
+    creds.expiry = dt.datetime.utcnow() + dt.timedelta(hours=1)
+
+
+# Function to count refreshes when many threads find the token about to expire at once
+def concurrent_refreshes(token_path, threads):
+    write_token(token_path, valid_for=dt.timedelta(minutes=1))
+    manager = CalendarServiceManager(token_path=token_path, http_factory=FakeCalendarHttp)
+    original_refresh = Credentials.refresh
+    Credentials.refresh = fake_refresh
+    try:
+        barrier = threading.Barrier(threads)
+
+        def worker(_):
+            barrier.wait()
+            return manager.credentials().token
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            tokens = set(executor.map(worker, range(threads)))
+    finally:
+        Credentials.refresh = original_refresh
+    return manager.refresh_count, tokens
+
+
+def timed(function, bookings, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(function, range(bookings)))
+    return time.perf_counter() - start
+
+
+def run(bookings, threads):
+    with tempfile.TemporaryDirectory() as directory:
+        token_path = os.path.join(directory, "token.json")
+        write_token(token_path)
+
+        legacy_seconds = timed(lambda number: legacy_insert(token_path, number), bookings, threads)
+        manager = CalendarServiceManager(token_path=token_path, http_factory=FakeCalendarHttp)
+        managed_seconds = timed(lambda number: managed_insert(manager, number), bookings, threads)
+        refreshes, tokens = concurrent_refreshes(token_path, threads)
+
+    print(f"{bookings} bookings on {threads} threads")
+    print(f"Per-booking credentials + build(): {legacy_seconds:.2f} s ({legacy_seconds / bookings * 1000:.2f} ms/booking)")
+    print(f"CalendarServiceManager:            {managed_seconds:.2f} s ({managed_seconds / bookings * 1000:.2f} ms/booking)")
+    print(f"Speed-up: {legacy_seconds / managed_seconds:.1f}x")
+    print(f"{threads} threads hitting an expiring token: {refreshes} refresh(es), tokens handed out: {sorted(tokens)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bookings", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    run(args.bookings, args.threads)
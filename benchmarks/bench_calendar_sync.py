@@ -0,0 +1,147 @@
+# Benchmark: the slot reset job over 10,000 booked appointments, comparing the old loop
+# (one events().get and one update_one per appointment) with CalendarSync (stored end
+# times, one incremental events.list, one bulk_write). The Calendar is an in-process fake
+# that counts requests and can add a simulated network latency per request.
+#
+#   python benchmarks/bench_calendar_sync.py [--appointments 10000] [--doctors 100] [--latency-ms 0] [--mongo URI]
+import argparse
+import datetime as dt
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from calendar_sync import CalendarSync, parse_event_time  # noqa: E402
+from database import get_client  # noqa: E402
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+NOW = dt.datetime(2030, 1, 15, 12, 0, tzinfo=dt.timezone.utc)
+
+
+# Executable request returned by the fake resource
+class FakeRequest:
+    def __init__(self, calendar, response):
+        self.calendar = calendar
+        self.response = response
+
+    def execute(self):
+        self.calendar.requests += 1
+        if self.calendar.latency:
+            time.sleep(self.calendar.latency)
+        return self.response
+
+
+# Fake Calendar events() resource holding events in memory
+class FakeEvents:
+    def __init__(self, events, latency=0.0, page_size=2500):
+        self.events = {event["id"]: event for event in events}
+        self.latency = latency
+        self.page_size = page_size
+        self.requests = 0
+        self.changed = set()
+
+    def get(self, calendarId, eventId):
+        return FakeRequest(self, self.events[eventId])
+
+    def list(self, calendarId, pageToken=None, syncToken=None, **params):
+        # A sync token only returns what changed since it was issued
+        ids = sorted(self.changed) if syncToken else sorted(self.events)
+        offset = int(pageToken or 0)
+        page = ids[offset:offset + self.page_size]
+        response = {"items": [self.events[event_id] for event_id in page]}
+        if offset + self.page_size < len(ids):
+            response["nextPageToken"] = str(offset + self.page_size)
+        else:
+            response["nextSyncToken"] = "sync-token"
+            self.changed = set()
+        return FakeRequest(self, response)
+
+
+# Function to build doctors with booked appointments, a third of which have ended
+def make_data(appointment_count, doctor_count):
+    doctors = [{"doctor_name": f"Dr. {number}", "appointments": {}} for number in range(doctor_count)]
+    events = []
+    for number in range(appointment_count):
+        start = NOW + dt.timedelta(hours=number % 3 - 2)
+        end = start + dt.timedelta(hours=1)
+        event_id = f"event{number:06d}"
+        events.append({
+            "id": event_id,
+            "status": "confirmed",
+            "end": {"dateTime": end.isoformat(), "timeZone": "UTC"},
+        })
+        doctor = doctors[number % doctor_count]
+        doctor["appointments"].setdefault(DAYS[number % len(DAYS)], []).append({
+            "time_slot": f"slot {number}",
+            "event_id": event_id,
+            "start_utc": start,
+            "end_utc": end,
+            "available": False,
+        })
+    return doctors, events
+
+
+# The loop update_slots_after_meeting ran before CalendarSync, kept as the baseline
+# (positional `$` instead of array filters, which mongomock does not support)
+def legacy_update(collection, events, now):
+    released = 0
+    for doctor in collection.find({"appointments": {"$exists": True}}):
+        for day, appointments in doctor.get("appointments", {}).items():
+            for appointment in appointments:
+                if not appointment["available"] and appointment.get("event_id"):
+                    event = events.get(calendarId="primary", eventId=appointment["event_id"]).execute()
+                    if parse_event_time(event["end"]["dateTime"]) <= now:
+                        collection.update_one(
+                            {"doctor_name": doctor["doctor_name"], f"appointments.{day}.event_id": appointment["event_id"]},
+                            {"$set": {f"appointments.{day}.$.available": True}},
+                        )
+                        released += 1
+    return released
+
+
+def run(appointment_count, doctor_count, latency, mongo_uri="mongomock://"):
+    doctors, events = make_data(appointment_count, doctor_count)
+    database = get_client(mongo_uri)["doctor_appointments_bench"]
+    print(f"{appointment_count} booked appointments for {doctor_count} doctors, "
+          f"{latency * 1000:.1f} ms simulated Calendar latency")
+
+    results = {}
+    for name in ("legacy per-appointment get", "CalendarSync"):
+        database["appointments"].drop()
+        database["calendar_sync_state"].drop()
+        database["appointments"].insert_many([dict(doctor) for doctor in doctors])
+        calendar = FakeEvents(events, latency)
+
+        start = time.perf_counter()
+        if name == "CalendarSync":
+            released = CalendarSync(database["appointments"], database["calendar_sync_state"], calendar).run(NOW)
+        else:
+            released = legacy_update(database["appointments"], calendar, NOW)
+        seconds = time.perf_counter() - start
+        results[name] = seconds
+        print(f"{name:27s} released {released}, {calendar.requests} Calendar request(s), {seconds:.2f} s")
+
+    # A second run only asks the Calendar for changes since the stored sync token
+    calendar = FakeEvents(events, latency)
+    start = time.perf_counter()
+    CalendarSync(database["appointments"], database["calendar_sync_state"], calendar).run(NOW)
+    incremental = time.perf_counter() - start
+    print(f"{'CalendarSync (incremental)':27s} {calendar.requests} Calendar request(s), {incremental:.2f} s")
+    print(f"Speed-up: {results['legacy per-appointment get'] / results['CalendarSync']:.1f}x")
+    return {
+        "legacy_seconds": results["legacy per-appointment get"],
+        "sync_seconds": results["CalendarSync"],
+        "incremental_seconds": incremental,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--appointments", type=int, default=10000)
+    parser.add_argument("--doctors", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--mongo", metavar="URI", default="mongomock://", help="use a real mongod instead of mongomock")
+    args = parser.parse_args()
+    run(args.appointments, args.doctors, args.latency_ms / 1000, args.mongo)
@@ -0,0 +1,186 @@
+# Benchmark: the console health assessment of 1)main.py without a microphone or speakers.
+# A scripted recognizer answers every prompt for a synthetic patient made from a dataset
+# row, and a silent speech output stands in for pyttsx3, so what is measured is the work
+# between the audio: symptom extraction, question planning, evaluation and storage
+# (mongomock by default, or --mongo, and a patient log in a temporary directory). Also
+# times evaluate_diseases on its own.
+#
+#   python benchmarks/bench_console_interview.py [--patients 200] [--mongo URI]
+import argparse
+import contextlib
+import importlib.util
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import database  # noqa: E402
+import metrics  # noqa: E402
+import speech_input  # noqa: E402
+import speech_output  # noqa: E402
+from assessment import build_symptom_pattern, evaluate_diseases  # noqa: E402
+from diagnosis_engine import load_dataset  # noqa: E402
+from knowledge_base import DISEASE_MATRIX, DISEASE_SYMPTOMS  # noqa: E402
+
+# Spans of 1)main.py reported per interview
+SPANS = ("symptom_extraction", "question_planning", "evaluation", "storage", "mongo")
+
+
+# Speech output stand-in: remembers the last prompt instead of speaking it
+class SilentSpeechOutput:
+    def __init__(self, cache_dir=None):
+        self.last_prompt = ""
+        self.messages = 0
+
+    def say(self, message):
+        self.messages += 1
+        if message:
+            self.last_prompt = message
+
+    def prerender(self, messages):
+        pass
+
+    def wait(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# Recognizer stand-in for the console flow (which only listens): the current patient
+# answers the last prompt spoken
+class ScriptedRecognizer:
+    def __init__(self):
+        self.output = None
+        self.patient = None
+        self.turns = 0
+
+    def listen(self, accept_partial=None, before_listen=speech_input._no_op):
+        before_listen()
+        self.turns += 1
+        return self.patient.answer(self.output.last_prompt)
+
+
+# A patient with the symptoms of one dataset row, who mentions two of them up front
+class SyntheticPatient:
+    def __init__(self, number, present, rng):
+        self.number = number
+        self.present = present
+        mentioned = rng.sample(sorted(present), min(2, len(present)))
+        self.description = "i have " + " and ".join(mentioned)
+
+    def answer(self, prompt):
+        if prompt == "What is your name?":
+            return f"patient {self.number}"
+        if prompt.startswith("How old"):
+            return str(20 + self.number % 60)
+        if prompt.startswith("What is your Gender"):
+            return "female" if self.number % 2 else "male"
+        if prompt == "Please describe your symptoms.":
+            return self.description
+        if prompt.startswith("Do you have "):
+            symptom = prompt[len("Do you have "):-len("? (yes/no)")]
+            return "yes" if symptom in self.present else "no"
+        # Name confirmation and follow-up questions
+        return "yes"
+
+
+# Function to load 1)main.py with the speech stand-ins; its patient log is created in
+# `directory` (the log path is relative to the working directory)
+def load_console_app(directory):
+    speech_output.SpeechOutput = SilentSpeechOutput
+    speech_input.create_speech_recognizer = ScriptedRecognizer
+    spec = importlib.util.spec_from_file_location("console_app", os.path.join(ROOT, "1)main.py"))
+    app = importlib.util.module_from_spec(spec)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            spec.loader.exec_module(app)
+    finally:
+        os.chdir(cwd)
+    app.speech_recognizer.output = app.speech_output
+    return app
+
+
+# Function to run one interview the way the main block of 1)main.py does
+def interview(app, patient):
+    app.speech_recognizer.patient = patient
+    patient_info = app.get_patient_details()
+    description = app.confirm_or_correct("Please describe your symptoms.")
+    relevant_diseases, detected_symptoms = app.extract_relevant_diseases(description)
+    symptom_patterns, ranked = app.run_interview(relevant_diseases, detected_symptoms)
+    confirmed, not_confirmed = app.evaluate_diseases(symptom_patterns)
+    app.display_final_evaluation(confirmed, not_confirmed, ranked)
+    with metrics.span("storage"):
+        app.store_patient_info(patient_info, confirmed, not_confirmed, ranked, description)
+
+
+def make_patients(count, seed=0):
+    rng = random.Random(seed)
+    symptoms, matrix, _ = load_dataset()
+    rows = [rng.randrange(len(matrix)) for _ in range(count)]
+    return [SyntheticPatient(number, {symptoms[index] for index in np.flatnonzero(matrix[row])}, rng)
+            for number, row in enumerate(rows)]
+
+
+# Function to time evaluate_diseases for random answers to the knowledge base symptoms
+def time_evaluate_diseases(count, seed=0):
+    rng = random.Random(seed)
+    answer_sets = [{symptom: rng.random() < 0.5 for symptoms in DISEASE_SYMPTOMS.values() for symptom in symptoms}
+                   for _ in range(count)]
+    start = time.perf_counter()
+    for answers in answer_sets:
+        patterns = {disease: build_symptom_pattern(symptoms, answers) for disease, symptoms in DISEASE_SYMPTOMS.items()}
+        evaluate_diseases(patterns, DISEASE_MATRIX)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def run(patient_count, mongo_uri="mongomock://"):
+    directory = tempfile.mkdtemp(prefix="console-bench-")
+    database.MONGO_URI = mongo_uri
+    try:
+        app = load_console_app(directory)
+        patients = make_patients(patient_count)
+        metrics.registry = metrics.Registry(sample_rate=1.0)
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for patient in patients:
+                interview(app, patient)
+        seconds = time.perf_counter() - start
+        app.patient_log.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    turns = app.speech_recognizer.turns / patient_count
+    print(f"{patient_count} interviews: {seconds / patient_count * 1000:.2f} ms each, "
+          f"{turns:.1f} answers per interview")
+    results = {"interview_ms": seconds / patient_count * 1000, "answers_per_interview": turns}
+    totals = metrics.registry.span_totals()
+    for name in SPANS:
+        if name in totals:
+            per_interview = totals[name][1] / patient_count * 1000
+            print(f"  {name:19s} {per_interview:8.3f} ms per interview")
+            results[f"{name}_ms"] = per_interview
+
+    evaluate_us = time_evaluate_diseases(patient_count * 50)
+    print(f"evaluate_diseases: {evaluate_us:.2f} us per patient")
+    results["evaluate_diseases_us"] = evaluate_us
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=200)
+    parser.add_argument("--mongo", metavar="URI", default="mongomock://", help="use a real mongod instead of mongomock")
+    args = parser.parse_args()
+    run(args.patients, args.mongo)
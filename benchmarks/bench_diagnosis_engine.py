@@ -0,0 +1,71 @@
+# Benchmark: DiagnosisEngine single-patient and batch scoring on dataset-derived patients.
+#
+#   python benchmarks/bench_diagnosis_engine.py [--patients 5000] [--observed 4]
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from diagnosis_engine import CONFIRMED, DENIED, DiagnosisEngine, load_dataset  # noqa: E402
+
+
+# Function to turn dataset rows into patients who reported only a few symptoms either way
+def make_patients(matrix, count, observed, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(matrix), size=count)
+    vectors = np.zeros((count, matrix.shape[1]), dtype=np.int8)
+    for patient, row in enumerate(rows):
+        present = np.flatnonzero(matrix[row])
+        absent = np.flatnonzero(matrix[row] == 0)
+        confirmed = rng.choice(present, size=min(observed, len(present)), replace=False)
+        denied = rng.choice(absent, size=observed, replace=False)
+        vectors[patient, confirmed] = CONFIRMED
+        vectors[patient, denied] = DENIED
+    return rows, vectors
+
+
+def run(patient_count, observed):
+    start = time.perf_counter()
+    symptoms, matrix, labels = load_dataset()
+    engine = DiagnosisEngine(symptoms, matrix, labels)
+    print(f"Loaded and trained in {(time.perf_counter() - start) * 1000:.1f} ms: "
+          f"{matrix.shape[0]} rows, {len(symptoms)} symptoms, {len(engine.prognoses)} prognoses, "
+          f"{engine.packed.nbytes} bytes packed")
+
+    rows, vectors = make_patients(matrix, patient_count, observed)
+
+    start = time.perf_counter()
+    for vector in vectors:
+        engine.rank(vector)
+    single_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    order, _ = engine.rank_batch(vectors)
+    batch_seconds = time.perf_counter() - start
+
+    expected = np.array([engine.prognoses.index(labels[row]) for row in rows])
+    top1 = np.mean(order[:, 0] == expected)
+    top5 = np.mean((order == expected[:, None]).any(axis=1))
+    print(f"Single patient: {single_seconds / patient_count * 1e6:.1f} us/patient")
+    print(f"Batch of {patient_count}: {batch_seconds * 1000:.1f} ms total, "
+          f"{batch_seconds / patient_count * 1e6:.2f} us/patient")
+    print(f"Accuracy with {observed} confirmed + {observed} denied symptoms: top-1 {top1:.1%}, top-5 {top5:.1%}")
+    return {
+        "single_us": single_seconds / patient_count * 1e6,
+        "batch_us": batch_seconds / patient_count * 1e6,
+        "top1_accuracy": float(top1),
+        "top5_accuracy": float(top5),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--observed", type=int, default=4)
+    args = parser.parse_args()
+    run(args.patients, args.observed)
@@ -0,0 +1,190 @@
+# Benchmark: many kiosks on one kiosk_manager process. Measures what one more kiosk costs
+# against a process of its own: the resident memory of a fresh process that loads the
+# knowledge base (what every console kiosk pays), then the memory added per kiosk while N
+# kiosks are connected and part-way through their interview, then the throughput and
+# answer latency when they all finish at once. The kiosks are socket clients that send
+# typed answers (T frames), so no recognizer model is loaded; with Vosk the model is shared
+# too, and each answer only adds a KaldiRecognizer for its duration.
+#
+#   python benchmarks/bench_kiosk_sessions.py [--kiosks 64]
+import argparse
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import kiosk_manager  # noqa: E402
+from database import get_client  # noqa: E402
+from knowledge_base import load_knowledge_base  # noqa: E402
+from patient_log import PatientLog  # noqa: E402
+
+HEADER = kiosk_manager.HEADER
+
+# Run in a fresh interpreter: the resident memory of one full kiosk process after startup
+FULL_PROCESS = """
+import os, sys
+sys.path.insert(0, {root!r})
+import kiosk_manager
+from knowledge_base import load_knowledge_base
+knowledge_base = load_knowledge_base()
+print(open("/proc/self/statm").read().split()[1] if os.path.exists("/proc/self/statm") else "")
+"""
+
+
+# Function to return the resident memory of this process in MB (peak where /proc is missing)
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def full_process_mb():
+    output = subprocess.run([sys.executable, "-c", FULL_PROCESS.format(root=ROOT)], capture_output=True,
+                            text=True, check=True, env=dict(os.environ, MONGO_URI="mongomock://")).stdout
+    pages = output.strip().splitlines()[-1] if output.strip() else ""
+    return int(pages) * os.sysconf("SC_PAGE_SIZE") / 1e6 if pages.isdigit() else None
+
+
+def receive_frame(connection):
+    data = b""
+    while len(data) < HEADER.size:
+        chunk = connection.recv(HEADER.size - len(data))
+        if not chunk:
+            raise ConnectionError("the manager closed the connection")
+        data += chunk
+    kind, length = HEADER.unpack(data)
+    payload = b""
+    while len(payload) < length:
+        payload += connection.recv(length - len(payload))
+    return kind, payload
+
+
+# A kiosk that answers every prompt for one patient; it stops at its first yes/no question
+# until `go` is set, and records the time from each answer to the next L frame
+class BenchKiosk(threading.Thread):
+    def __init__(self, number, port, paused, go):
+        super().__init__(daemon=True)
+        self.number = number
+        self.port = port
+        self.paused = paused
+        self.go = go
+        self.latencies = []
+        self.result = None
+
+    def answer(self, prompt):
+        if prompt == "What is your name?":
+            return f"kiosk {self.number}"
+        if prompt.startswith("How old"):
+            return str(20 + self.number % 60)
+        if prompt.startswith("What is your Gender"):
+            return "female" if self.number % 2 else "male"
+        if prompt == "Please describe your symptoms.":
+            return "i have itching and skin rash" if self.number % 2 else "i keep sneezing and have a runny nose"
+        return "yes" if self.number % 3 else "no"
+
+    def run(self):
+        with socket.create_connection(("127.0.0.1", self.port)) as connection:
+            prompt, answered = "", None
+            while True:
+                kind, payload = receive_frame(connection)
+                if kind == kiosk_manager.PROMPT:
+                    prompt = payload.decode("utf-8")
+                elif kind == kiosk_manager.LISTEN:
+                    if answered is not None:
+                        self.latencies.append(time.perf_counter() - answered)
+                    if prompt.startswith("Do you have") and not self.go.is_set():
+                        self.paused.release()
+                        self.go.wait()
+                    text = self.answer(prompt).encode("utf-8")
+                    answered = time.perf_counter()
+                    connection.sendall(HEADER.pack(kiosk_manager.TEXT, len(text)) + text)
+                elif kind == kiosk_manager.RESULT:
+                    self.result = json.loads(payload)
+                    return
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(kiosk_count):
+    full_mb = full_process_mb()
+    directory = tempfile.mkdtemp(prefix="kiosk-bench-")
+    # Session traces go to traces/ of the working directory
+    cwd = os.getcwd()
+    os.chdir(directory)
+    patient_log = PatientLog(os.path.join(directory, "patient_log"))
+    # One spare session: the warm-up kiosk's may not be released yet when the others connect
+    manager = kiosk_manager.KioskManager(load_knowledge_base(), None, patient_log,
+                                         get_client("mongomock://")["kiosk_bench"]["patients"],
+                                         max_sessions=kiosk_count + 1)
+    server = kiosk_manager.KioskServer(("127.0.0.1", 0), manager)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # One kiosk end to end first, so lazily created state is not counted per kiosk
+        warm_up, go = threading.Semaphore(0), threading.Event()
+        go.set()
+        kiosk = BenchKiosk(0, server.server_address[1], warm_up, go)
+        kiosk.start()
+        kiosk.join()
+
+        before = rss_mb()
+        paused, go = threading.Semaphore(0), threading.Event()
+        kiosks = [BenchKiosk(number, server.server_address[1], paused, go) for number in range(1, kiosk_count + 1)]
+        for kiosk in kiosks:
+            kiosk.start()
+        for _ in kiosks:
+            paused.acquire()
+        per_kiosk_mb = (rss_mb() - before) / kiosk_count
+
+        start = time.perf_counter()
+        go.set()
+        for kiosk in kiosks:
+            kiosk.join()
+        seconds = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+        patient_log.close()
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    # The client threads of this benchmark live in the same process, so their memory counts too
+    latencies = [latency for kiosk in kiosks for latency in kiosk.latencies]
+    completed = sum(kiosk.result is not None for kiosk in kiosks)
+    if full_mb:
+        print(f"One kiosk process (interpreter, imports, knowledge base): {full_mb:.1f} MB")
+    print(f"{kiosk_count} kiosks in one manager: {per_kiosk_mb * 1000:.0f} KB each "
+          f"(kiosk client threads included)" + (f", {per_kiosk_mb / full_mb:.1%} of a process" if full_mb else ""))
+    print(f"{completed} assessments finished in {seconds:.2f} s ({completed / seconds:.0f}/s), "
+          f"answer to next question p50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+    results = {
+        "per_kiosk_kb": per_kiosk_mb * 1000,
+        "assessments_per_second": completed / seconds,
+        "answer_p50_ms": percentile(latencies, 0.5) * 1000,
+        "answer_p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+    if full_mb:
+        results["full_process_mb"] = full_mb
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kiosks", type=int, default=64)
+    args = parser.parse_args()
+    run(args.kiosks)
@@ -0,0 +1,120 @@
+# Benchmark: sending a day's appointment reminders the old way (send_email opened a new
+# SMTP connection and logged in for every message) versus the pooled Mailer, against a
+# local aiosmtpd server that accepts any login. TLS is left out (the handshakes the
+# pool saves would make the gap bigger against a real server); every SMTP command pays
+# a simulated network round trip.
+#
+#   python benchmarks/bench_mailer.py [--messages 2000] [--pool-size 2]
+import argparse
+import asyncio
+import os
+import smtplib
+import sys
+import logging
+import time
+from email.message import EmailMessage
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mailer import Mailer, SMTPPool, render  # noqa: E402
+
+# aiosmtpd logs a deprecation warning on every login
+logging.getLogger("mail.log").setLevel(logging.ERROR)
+
+# Simulated network round trip per SMTP command
+ROUND_TRIP_SECONDS = 0.001
+
+
+# SMTP server stand-in that delays every command and counts sessions and messages
+class CountingHandler:
+    def __init__(self):
+        self.sessions = 0
+        self.messages = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        session.host_name = hostname
+        return responses
+
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        envelope.mail_from = address
+        return "250 OK"
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        self.messages += 1
+        return "250 Message accepted"
+
+
+def accept_any_login(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+def reminders(count):
+    for number in range(count):
+        yield f"patient{number}@example.com", {
+            "patient_name": f"Patient {number}", "doctor_name": f"Dr. {number % 40}", "day": "Monday",
+            "time_slot": "10:00 AM - 11:00 AM", "meet_link": f"https://meet.google.com/abc-{number:04d}",
+        }
+
+
+# The old send_email: connect, log in and quit for every single message
+def send_email(port, to_email, subject, body):
+    message = EmailMessage()
+    message["From"] = "clinic@example.com"
+    message["To"] = to_email
+    message["Subject"] = subject
+    message.set_content(body)
+    server = smtplib.SMTP("127.0.0.1", port)
+    server.login("clinic@example.com", "password")
+    server.send_message(message)
+    server.quit()
+
+
+def run(count, pool_size):
+    handler = CountingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=8025, authenticator=accept_any_login,
+                            auth_require_tls=False)
+    controller.start()
+    try:
+        print(f"{count} reminder emails, {ROUND_TRIP_SECONDS * 1000:.0f} ms per SMTP command")
+        start = time.perf_counter()
+        for to_email, context in reminders(count):
+            subject, body = render("appointment_reminder", context)
+            send_email(controller.port, to_email, subject, body)
+        legacy = time.perf_counter() - start
+        print(f"connection per email: {legacy:.2f} s, {handler.sessions} SMTP sessions, {handler.messages} delivered")
+
+        handler.sessions = handler.messages = 0
+        pool = SMTPPool("127.0.0.1", controller.port, "clinic@example.com", "password", starttls=False,
+                        size=pool_size, max_messages=1000)
+        mailer = Mailer(pool, "clinic@example.com", rate=0)
+        start = time.perf_counter()
+        for to_email, context in reminders(count):
+            mailer.send(to_email, "appointment_reminder", context)
+        mailer.close()
+        pooled = time.perf_counter() - start
+        print(f"pooled Mailer:        {pooled:.2f} s, {handler.sessions} SMTP sessions, {handler.messages} delivered, "
+              f"{len(mailer.dead_letters)} dead letters")
+        print(f"Speed-up: {legacy / pooled:.1f}x")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--pool-size", type=int, default=2)
+    args = parser.parse_args()
+    run(args.messages, args.pool_size)
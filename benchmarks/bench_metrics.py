@@ -0,0 +1,59 @@
+# Benchmark: the cost of the instrumentation in metrics.py. Times an empty block N times
+# bare, inside span() with metrics disabled, sampled at 10% and 100%, and while writing a
+# session trace, and prints the overhead per span. Also checks that sampled histograms
+# still estimate the true span count.
+#
+#   python benchmarks/bench_metrics.py [--spans 200000]
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import metrics  # noqa: E402
+
+
+# Function to time `count` empty spans; returns nanoseconds per span
+def time_spans(count):
+    span = metrics.span
+    start = time.perf_counter()
+    for _ in range(count):
+        with span("bench", operation="noop"):
+            pass
+    return (time.perf_counter() - start) / count * 1e9
+
+
+def run(count):
+    start = time.perf_counter()
+    for _ in range(count):
+        pass
+    bare = (time.perf_counter() - start) / count * 1e9
+    print(f"{count} spans, empty loop {bare:.0f} ns per iteration")
+
+    for label, enabled, rate in (("disabled", False, 1.0), ("sampled 10%", True, 0.1), ("sampled 100%", True, 1.0)):
+        metrics.registry = metrics.Registry(enabled=enabled, sample_rate=rate)
+        per_span = time_spans(count)
+        estimate = metrics.registry.span_totals().get("bench", (0, 0))[0]
+        print(f"{label:>13}: {per_span - bare:6.0f} ns per span, histogram count {estimate:.0f}")
+
+    directory = tempfile.mkdtemp(prefix="metrics-bench-")
+    try:
+        metrics.registry = metrics.Registry(sample_rate=1.0)
+        metrics.start_trace(directory=directory, sample_rate=1.0)
+        traced = min(count, 20000)
+        per_span = time_spans(traced)
+        metrics.end_trace()
+        print(f"{'traced':>13}: {per_span - bare:6.0f} ns per span ({traced} spans written to the trace)")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spans", type=int, default=200000)
+    args = parser.parse_args()
+    run(args.spans)
@@ -0,0 +1,116 @@
+# Benchmark: the structured patient log versus the old patient_info.txt. Appends N
+# assessments to both, then looks up random assessments: in the text file that means
+# scanning and parsing every entry, in the log one seek through the sidecar index (also
+# after rotated segments were gzip-compressed). Finally uploads the log to mongomock as
+# the MongoDB write-ahead buffer does after an outage.
+#
+#   python benchmarks/bench_patient_log.py [--records 20000] [--lookups 200] [--upload 2000]
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from assessment import build_patient_document  # noqa: E402
+from database import get_client  # noqa: E402
+from patient_log import PatientLog  # noqa: E402
+
+
+# The old text format (one free-form entry per assessment, "=" separators)
+def write_text_entry(file, document):
+    file.write("\n" + "=" * 30 + "\n")
+    file.write(f"Name: {document['name']}\nAge: {document['age']}\nSex: {document['sex']}\n")
+    file.write(f"Assessment: {document['_id']}\n")
+    file.write(f"Symptom Description: {document['symptom_description']}\n")
+    file.write("Symptoms and Final Evaluation:\n\nConfirmed Diagnoses:\n")
+    for diagnosis in document["confirmed_diagnoses"]:
+        file.write(f"- {diagnosis['disease']} with symptom evaluation as: {', '.join(diagnosis['symptom_evaluation'])}\n")
+
+
+# Function to find one entry of the text file: the only way is a full scan
+def scan_text(path, assessment_id):
+    with open(path) as file:
+        for entry in file.read().split("=" * 30):
+            if f"Assessment: {assessment_id}\n" in entry:
+                return entry
+    return None
+
+
+def make_document(number):
+    document = build_patient_document(
+        {"name": f"Patient {number}", "age": 20 + number % 60, "sex": "female" if number % 2 else "male"},
+        [("Common Cold", ["cough: yes", "fever: yes", "runny nose: yes"])], [("Influenza", ["chills: no"])],
+        [("Common Cold", 0.61), ("Influenza", 0.22)], patient_id=f"patient-{number % 1000}",
+    )
+    document["symptom_description"] = "I have had a cough and a fever since yesterday"
+    return document
+
+
+def run(count, lookups, upload_count):
+    directory = tempfile.mkdtemp(prefix="patient-log-bench-")
+    try:
+        documents = [make_document(number) for number in range(count)]
+        text_path = os.path.join(directory, "patient_info.txt")
+        start = time.perf_counter()
+        for document in documents:
+            with open(text_path, "a") as file:
+                write_text_entry(file, document)
+        print(f"{count} assessments")
+        print(f"patient_info.txt append: {time.perf_counter() - start:.2f} s, {os.path.getsize(text_path) / 1e6:.1f} MB")
+
+        # fsync off here so the run measures the format, not the disk
+        patient_log = PatientLog(os.path.join(directory, "log"), max_bytes=2 * 1024 * 1024, fsync=False)
+        start = time.perf_counter()
+        for document in documents:
+            patient_log.append(document)
+        appended = time.perf_counter() - start
+        patient_log.wait()
+        size = sum(os.path.getsize(os.path.join(patient_log.directory, name)) for name in os.listdir(patient_log.directory))
+        print(f"patient log append:      {appended:.2f} s, {size / 1e6:.1f} MB on disk after compression")
+
+        sample = [random.choice(documents)["_id"] for _ in range(lookups)]
+        scanned = sample[:max(1, lookups // 20)]
+        start = time.perf_counter()
+        for assessment_id in scanned:
+            assert scan_text(text_path, assessment_id)
+        per_scan = (time.perf_counter() - start) / len(scanned)
+        start = time.perf_counter()
+        for assessment_id in sample:
+            assert patient_log.get(assessment_id)["_id"] == assessment_id
+        per_get = (time.perf_counter() - start) / len(sample)
+        print(f"lookup by assessment ID: text scan {per_scan * 1000:.1f} ms, indexed log {per_get * 1000:.2f} ms "
+              f"({per_scan / per_get:.0f}x)")
+
+        start = time.perf_counter()
+        streamed = sum(1 for _ in patient_log)
+        print(f"streaming read of the whole log: {streamed} records in {time.perf_counter() - start:.2f} s")
+
+        patient_log.close()
+
+        # mongomock upserts get slow on big collections, so the upload uses a smaller log
+        outage_log = PatientLog(os.path.join(directory, "outage"), fsync=False)
+        for document in documents[:upload_count]:
+            outage_log.append(document)
+        collection = get_client("mongomock://")["patient_log_bench"]["patients"]
+        collection.drop()
+        start = time.perf_counter()
+        uploaded = outage_log.sync(collection)
+        print(f"upload after an outage (mongomock): {uploaded} records in {time.perf_counter() - start:.2f} s, "
+              f"a second sync uploads {outage_log.sync(collection)}")
+        outage_log.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--upload", type=int, default=2000, help="records uploaded to mongomock")
+    args = parser.parse_args()
+    run(args.records, args.lookups, args.upload)
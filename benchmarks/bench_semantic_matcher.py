@@ -0,0 +1,121 @@
+# Benchmark: the semantic symptom matcher. Builds the embedding index of the knowledge base
+# symptoms and the dataset columns, loads it back from the disk cache, then times utterances
+# (phrase embedding plus the cosine search) against the latency budget and checks which
+# paraphrases are found. By default a hashing encoder (character trigrams) stands in for the
+# model, which times everything but the model itself; --model runs a real
+# sentence-transformers model on the CPU (the paraphrase results only mean something then).
+#
+#   python benchmarks/bench_semantic_matcher.py [--utterances 500] [--model sentence-transformers/all-MiniLM-L6-v2]
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from diagnosis_engine import load_dataset  # noqa: E402
+from knowledge_base import DISEASE_SYMPTOMS  # noqa: E402
+from semantic_matcher import BUDGET_MS, SemanticMatcher, SentenceEncoder  # noqa: E402
+
+# Paraphrases the synonym lists do not contain, with the symptom they describe
+PARAPHRASES = [
+    ("my skin keeps breaking out", "skin rash"),
+    ("i can't stop scratching my arms", "itching"),
+    ("my nose won't stop dripping", "runny nose"),
+    ("my eyes are red and itch all the time", "itchy eyes"),
+    ("there are dark blotches on my skin", "dischromic patches"),
+    ("i've been hacking all night", "cough"),
+    ("i keep sneezing every morning", "sneezing"),
+    ("small hard lumps came up under the skin", "nodal skin eruptions"),
+]
+
+
+# Stand-in encoder: hashed character trigrams, L2-normalized (deterministic, no model)
+class HashingEncoder:
+    name = "hashing-trigrams-384"
+
+    def __init__(self, dimensions=384):
+        self.dimensions = dimensions
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            padded = f"  {text} "
+            for i in range(len(padded) - 2):
+                vectors[row, zlib.crc32(padded[i:i + 3].encode()) % self.dimensions] += 1
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+
+def make_utterances(symptoms, count, seed=0):
+    rng = random.Random(seed)
+    fillers = ["i have", "and my", "for three days", "it started with", "my doctor thinks it is", "also"]
+    return [" ".join(f"{rng.choice(fillers)} {symptom}" for symptom in rng.sample(symptoms, rng.randint(1, 3)))
+            for _ in range(count)]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(utterance_count, model=None):
+    encoder = SentenceEncoder(model) if model else HashingEncoder()
+    dataset_symptoms, _, _ = load_dataset()
+    directory = tempfile.mkdtemp(prefix="semantic-bench-")
+    try:
+        start = time.perf_counter()
+        SemanticMatcher(encoder, DISEASE_SYMPTOMS, dataset_symptoms, directory)
+        build_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        matcher = SemanticMatcher(encoder, DISEASE_SYMPTOMS, dataset_symptoms, directory)
+        load_seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    rows, dimensions = matcher.vectors.shape
+    print(f"{encoder.name}: {rows} descriptions x {dimensions} dimensions "
+          f"({matcher.vectors.nbytes / 1024:.0f} KB as float16)")
+    print(f"Index build: {build_seconds * 1000:.1f} ms, load from the cache: {load_seconds * 1000:.1f} ms")
+
+    utterances = make_utterances(dataset_symptoms, utterance_count)
+    latencies = {}
+    for name in ("cold", "warm"):
+        latencies[name] = []
+        for text in utterances:
+            start = time.perf_counter()
+            matcher.search(text)
+            latencies[name].append(time.perf_counter() - start)
+        print(f"Per utterance, phrase cache {name}: p50 {percentile(latencies[name], 0.5) * 1000:.2f} ms, "
+              f"p99 {percentile(latencies[name], 0.99) * 1000:.2f} ms (budget {BUDGET_MS:.0f} ms for embedding)")
+
+    found = 0
+    for text, symptom in PARAPHRASES:
+        matches = matcher.search(text)
+        found += symptom in matches
+        best = max(matches.items(), key=lambda item: item[1]) if matches else ("-", 0)
+        print(f"  {text!r:48s} {symptom:22s} best: {best[0]} ({best[1]:.2f})")
+    print(f"Paraphrases found: {found}/{len(PARAPHRASES)}")
+    return {
+        "build_ms": build_seconds * 1000,
+        "load_ms": load_seconds * 1000,
+        "cold_p50_ms": percentile(latencies["cold"], 0.5) * 1000,
+        "cold_p99_ms": percentile(latencies["cold"], 0.99) * 1000,
+        "warm_p50_ms": percentile(latencies["warm"], 0.5) * 1000,
+        "warm_p99_ms": percentile(latencies["warm"], 0.99) * 1000,
+        "paraphrases_found": found,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--utterances", type=int, default=500)
+    parser.add_argument("--model", help="sentence-transformers model to use instead of the hashing stand-in")
+    args = parser.parse_args()
+    run(args.utterances, args.model)
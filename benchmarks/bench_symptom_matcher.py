@@ -0,0 +1,164 @@
+# Benchmark: per-call regex symptom extraction vs. the precompiled SymptomMatcher
+# on the full 132-symptom vocabulary from Dataset/symbipredict_2022.csv. A second set of
+# transcripts has speech recognition errors in the symptom words, to compare how many
+# symptoms exact matching and fuzzy matching recover, and at what cost.
+#
+#   python benchmarks/bench_symptom_matcher.py [--transcripts 2000] [--error-rate 0.3]
+import argparse
+import csv
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from diagnosis_engine import DATASET_PATH, column_to_symptom  # noqa: E402
+from symptom_matcher import MIN_CONFIDENCE, SymptomMatcher  # noqa: E402
+
+
+# Function to build a disease -> symptom -> synonyms table from the dataset
+def load_dataset_vocabulary(path=DATASET_PATH):
+    with open(path, newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        symptoms = [column_to_symptom(column) for column in header[:-1]]
+        vocabulary = {}
+        for row in reader:
+            disease = row[-1].strip()
+            table = vocabulary.setdefault(disease, {})
+            for symptom, flag in zip(symptoms, row[:-1]):
+                if flag == "1" and symptom not in table:
+                    # The name plus a couple of spoken variants, like the WordNet-expanded lists
+                    table[symptom] = [symptom, symptom.replace(" of ", " "), symptom + "s"]
+    return vocabulary, symptoms
+
+
+# The extraction loop 1)main.py used before SymptomMatcher, kept as the baseline
+def legacy_extract_symptoms(disease_symptoms, user_input):
+    detected_symptoms = {}
+    for disease, symptoms in disease_symptoms.items():
+        detected_symptoms[disease] = []
+        for symptom, synonyms in symptoms.items():
+            pattern = re.compile(r'\b(' + '|'.join(synonyms) + r')\b')
+            if pattern.search(user_input):
+                detected_symptoms[disease].append(symptom)
+    return {disease: sym for disease, sym in detected_symptoms.items() if sym}
+
+
+# Function to make synthetic transcripts mentioning a few random symptoms each
+def make_transcripts(symptoms, count, seed=0):
+    rng = random.Random(seed)
+    fillers = ["i have", "and also", "since yesterday", "a bit of", "really bad", "my doctor said"]
+    transcripts = []
+    for _ in range(count):
+        words = []
+        for symptom in rng.sample(symptoms, rng.randint(1, 4)):
+            words.append(rng.choice(fillers))
+            words.append(symptom)
+        transcripts.append(" ".join(words))
+    return transcripts
+
+
+# Function to garble a word as a recognizer might: one letter replaced, dropped or swapped
+def mishear(word, rng):
+    i = rng.randrange(1, len(word) - 1)
+    edit = rng.choice(("replace", "drop", "swap"))
+    if edit == "replace":
+        return word[:i] + rng.choice("aeiouy") + word[i + 1:]
+    if edit == "drop":
+        return word[:i] + word[i + 1:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+# Function to make transcripts whose symptom words are misheard with probability
+# `error_rate` (words of 5+ letters); returns (transcript, mentioned symptoms) pairs
+def make_misheard_transcripts(symptoms, count, error_rate, seed=0):
+    rng = random.Random(seed)
+    transcripts = []
+    for _ in range(count):
+        mentioned = rng.sample(symptoms, rng.randint(1, 4))
+        words = []
+        for symptom in mentioned:
+            words.append("i have")
+            words.extend(mishear(word, rng) if len(word) >= 5 and rng.random() < error_rate else word
+                         for word in symptom.split())
+        transcripts.append((" ".join(words), set(mentioned)))
+    return transcripts
+
+
+# Function to return the share of mentioned symptoms found, and the number of symptoms
+# found that were not mentioned
+def recall(matcher, transcripts, min_confidence):
+    found = extra = total = 0
+    for text, mentioned in transcripts:
+        detected = {symptom for symptoms in matcher.match(text, min_confidence).values() for symptom in symptoms}
+        found += len(detected & mentioned)
+        extra += len(detected - mentioned)
+        total += len(mentioned)
+    return found / total, extra
+
+
+def run(transcript_count, error_rate=0.3):
+    vocabulary, symptoms = load_dataset_vocabulary()
+    pairs = sum(len(table) for table in vocabulary.values())
+    print(f"Vocabulary: {len(vocabulary)} diseases, {len(symptoms)} symptoms, {pairs} (disease, symptom) pairs")
+
+    start = time.perf_counter()
+    matcher = SymptomMatcher(vocabulary)
+    build_seconds = time.perf_counter() - start
+    print(f"SymptomMatcher build: {build_seconds * 1000:.1f} ms")
+
+    transcripts = make_transcripts(symptoms, transcript_count)
+
+    start = time.perf_counter()
+    legacy_results = [legacy_extract_symptoms(vocabulary, text) for text in transcripts]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matcher_results = [matcher.match(text, min_confidence=1.0) for text in transcripts]
+    matcher_seconds = time.perf_counter() - start
+
+    agreeing = sum(a == b for a, b in zip(legacy_results, matcher_results))
+    print(f"Legacy regex:   {legacy_seconds / transcript_count * 1e6:10.1f} us/transcript")
+    print(f"SymptomMatcher: {matcher_seconds / transcript_count * 1e6:10.1f} us/transcript")
+    print(f"Speed-up: {legacy_seconds / matcher_seconds:.1f}x, identical results on {agreeing}/{transcript_count}")
+
+    misheard = make_misheard_transcripts(symptoms, transcript_count, error_rate)
+    matcher._candidates.clear()
+    start = time.perf_counter()
+    for text, _ in misheard:
+        matcher.match(text)
+    fuzzy_cold_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for text, _ in misheard:
+        matcher.match(text)
+    fuzzy_seconds = time.perf_counter() - start
+    exact_recall, exact_extra = recall(matcher, misheard, 1.0)
+    fuzzy_recall, fuzzy_extra = recall(matcher, misheard, MIN_CONFIDENCE)
+    print(f"Misheard transcripts ({error_rate:.0%} of long symptom words garbled):")
+    print(f"  exact matching: {exact_recall:.1%} of symptoms found, {exact_extra} not mentioned")
+    print(f"  fuzzy matching: {fuzzy_recall:.1%} of symptoms found, {fuzzy_extra} not mentioned, "
+          f"{fuzzy_cold_seconds / transcript_count * 1e6:.1f} us/transcript "
+          f"({fuzzy_seconds / transcript_count * 1e6:.1f} with the candidate cache warm)")
+    return {
+        "build_ms": build_seconds * 1000,
+        "legacy_us": legacy_seconds / transcript_count * 1e6,
+        "matcher_us": matcher_seconds / transcript_count * 1e6,
+        "transcripts_per_second": transcript_count / matcher_seconds,
+        "fuzzy_cold_us": fuzzy_cold_seconds / transcript_count * 1e6,
+        "fuzzy_us": fuzzy_seconds / transcript_count * 1e6,
+        "exact_recall_accuracy": exact_recall,
+        "fuzzy_recall_accuracy": fuzzy_recall,
+        "fuzzy_not_mentioned": fuzzy_extra,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transcripts", type=int, default=2000)
+    parser.add_argument("--error-rate", type=float, default=0.3)
+    args = parser.parse_args()
+    run(args.transcripts, args.error_rate)
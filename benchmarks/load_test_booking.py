@@ -0,0 +1,335 @@
+# Load test: the Flask booking app (2)GoogleMeet_Schedule.py on the threaded development
+# server) versus the async booking service (booking_service.py on Hypercorn). Each
+# simulated patient loads the doctor list, looks at a doctor's slots and books one of
+# them; the script reports requests/sec and p50/p99 latency per endpoint.
+#
+# By default each app runs in a child process on its own seeded mongomock database, next
+# to a local Google Calendar stand-in and an aiosmtpd server (each adding a network delay)
+# in a third process. Note that
+# the Flask app answers a booking with 202 and leaves the Calendar event and emails to its
+# job workers, while the async service creates the event and sends both emails before
+# answering; "confirmed" is the time until a booking is scheduled (for Flask, polling
+# /booking_status until the workers are done). --flask-url/--async-url drive running servers instead (seed a
+# shared database with --mongo).
+#
+#   python benchmarks/load_test_booking.py [--users 200] [--doctors 50] [--smtp-pool 10] [--mongo URI] [--flask-url URL --async-url URL]
+import argparse
+import asyncio
+import datetime as dt
+import http.server
+import importlib.util
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+# Delays of the external services
+CALENDAR_SECONDS = 0.15
+SMTP_COMMAND_SECONDS = 0.01
+
+FLASK_PORT, ASYNC_PORT, CALENDAR_PORT, SMTP_PORT = 5055, 8055, 8056, 8057
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+# Google Calendar stand-in: answers an event insert after CALENDAR_SECONDS
+class CalendarHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        event = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(CALENDAR_SECONDS)
+        event["htmlLink"] = f"https://calendar.example/{event['id']}"
+        event["conferenceData"] = {"entryPoints": [{"uri": f"https://meet.example/{event['id'][:10]}"}]}
+        body = json.dumps(event).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CalendarServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+# SMTP stand-in: every command of a session takes SMTP_COMMAND_SECONDS
+class SlowSMTPHandler:
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        await asyncio.sleep(SMTP_COMMAND_SECONDS)
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(SMTP_COMMAND_SECONDS)
+        return "250 Message accepted"
+
+
+# The Flask app's Calendar client, pointed at the Calendar stand-in
+class StandInRequest:
+    def __init__(self, body):
+        self.body = body
+
+    def execute(self):
+        request = urllib.request.Request(f"http://127.0.0.1:{CALENDAR_PORT}/calendars/primary/events",
+                                         json.dumps(self.body).encode(), {"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return json.loads(response.read())
+
+
+class StandInCalendarManager:
+    def events(self):
+        return self
+
+    def insert(self, calendarId, body, **params):
+        return StandInRequest(body)
+
+
+# Credentials manager stand-in for the async service's Calendar client
+class StaticCredentials:
+    token = "load-test"
+
+    def current_credentials(self):
+        return self
+
+    def credentials(self):
+        return self
+
+
+def seed(client, doctor_count, patient_count):
+    from database import APPOINTMENTS_DB, PATIENTS_DB
+    from patient_store import normalize_name
+
+    db = client[APPOINTMENTS_DB]
+    for name in ("appointments", "availability_rules", "slots", "bookings"):
+        db[name].delete_many({})
+    doctor_ids = db["appointments"].insert_many([{
+        "doctor_name": f"Dr. {number}", "qualification": "MBBS", "doctor_email": f"doctor{number}@example.com",
+        "specialization": ["Cardiologist", "Dermatologist", "Neurologist"][number % 3], "available_slots": {},
+    } for number in range(doctor_count)]).inserted_ids
+    db["availability_rules"].insert_many([{
+        "_id": str(doctor_id), "doctor_name": f"Dr. {number}", "timezone": "Asia/Kolkata", "slot_minutes": 30,
+        "weekly": {day: [["09:00", "17:00"]] for day in WEEKDAYS}, "version": 1,
+    } for number, doctor_id in enumerate(doctor_ids)])
+    patients = client[PATIENTS_DB]["patients"]
+    patients.delete_many({})
+    patients.insert_many([{
+        "_id": f"assessment-{number}", "patient_id": f"patient-{number}", "name": f"Patient {number}",
+        "name_normalized": normalize_name(f"Patient {number}"), "age": 40, "sex": "female",
+        "assessed_at": dt.datetime.now(dt.timezone.utc),
+        "confirmed_diagnoses": [{"disease": "Migraine", "symptom_evaluation": ["headache: yes"]}],
+    } for number in range(patient_count)])
+
+
+def in_process_environment(smtp_pool):
+    os.environ["MONGO_URI"] = "mongomock://"
+    os.environ.update(SMTP_HOST="127.0.0.1", SMTP_PORT=str(SMTP_PORT), SMTP_STARTTLS="0", SMTP_USERNAME="",
+                      SMTP_FROM="clinic@example.com", SMTP_POOL_SIZE=str(smtp_pool),
+                      CALENDAR_API_URL=f"http://127.0.0.1:{CALENDAR_PORT}")
+
+
+# The Calendar and SMTP stand-ins, in a process of their own
+def serve_stand_ins():
+    from aiosmtpd.controller import Controller
+
+    logging.getLogger("mail.log").setLevel(logging.ERROR)
+    Controller(SlowSMTPHandler(), hostname="127.0.0.1", port=SMTP_PORT).start()
+    CalendarServer(("127.0.0.1", CALENDAR_PORT), CalendarHandler).serve_forever()
+
+
+# mongomock is not thread-safe: serialize its collection and cursor operations (only the
+# threaded Flask app needs this, a real MongoDB does its own locking)
+def lock_mongomock():
+    import mongomock.collection
+
+    lock = threading.RLock()
+
+    def locked(method):
+        def wrapper(*args, **kwargs):
+            with lock:
+                return method(*args, **kwargs)
+        return wrapper
+
+    for cls in (mongomock.collection.Collection, mongomock.collection.Cursor):
+        for name, method in list(vars(cls).items()):
+            if callable(method) and (not name.startswith("__") or name == "__next__") and name != "__init__":
+                setattr(cls, name, locked(method))
+
+
+# Each app runs in its own process on its own seeded mongomock database
+def serve_flask(doctor_count, users, smtp_pool):
+    in_process_environment(smtp_pool)
+    lock_mongomock()
+    from werkzeug.serving import make_server
+
+    from database import get_client
+
+    seed(get_client(), doctor_count, users)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    spec = importlib.util.spec_from_file_location("flask_booking_app", os.path.join(ROOT, "2)GoogleMeet_Schedule.py"))
+    flask_app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(flask_app)
+    flask_app.calendar_manager = StandInCalendarManager()
+    flask_server = make_server("127.0.0.1", FLASK_PORT, flask_app.app, threaded=True)
+    flask_server.serve_forever()
+
+
+def serve_async(doctor_count, users, smtp_pool):
+    in_process_environment(smtp_pool)
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    from database import get_client
+
+    seed(get_client(), doctor_count, users)
+    import booking_service
+
+    booking_service.CalendarServiceManager = StaticCredentials
+    config = Config()
+    config.bind = [f"127.0.0.1:{ASYNC_PORT}"]
+    config.backlog = 1024
+    config.accesslog = None
+    asyncio.run(serve(booking_service.app, config))
+
+
+def start_in_process(doctor_count, users, smtp_pool):
+    processes = [multiprocessing.Process(target=serve_stand_ins, daemon=True)]
+    processes += [multiprocessing.Process(target=target, args=(doctor_count, users, smtp_pool), daemon=True)
+                  for target in (serve_flask, serve_async)]
+    for process in processes:
+        process.start()
+    for port in (CALENDAR_PORT, SMTP_PORT, FLASK_PORT, ASYNC_PORT):
+        wait_for_port(port, seconds=60)
+    return f"http://127.0.0.1:{FLASK_PORT}", f"http://127.0.0.1:{ASYNC_PORT}", processes
+
+
+def wait_for_port(port, seconds=10):
+    deadline = time.monotonic() + seconds
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def call(url, method="GET", payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    headers = {"Content-Type": "application/json"} if data else {}
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data, headers, method=method), timeout=60) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as error:
+        return error.code, None
+
+
+# One patient: doctor list, one doctor's slots on a random day, book a random slot
+def patient(base_url, number, doctor_count, latencies, statuses, barrier):
+    doctor = f"Dr. {random.randrange(doctor_count)}"
+    day = dt.date.today() + dt.timedelta(days=random.randint(1, 6))
+    barrier.wait()
+    steps = [
+        ("get_doctors", lambda: call(f"{base_url}/get_doctors")),
+        ("get_slots", lambda: call(f"{base_url}/get_slots?" + urllib.parse.urlencode(
+            {"doctor_name": doctor, "start": day.isoformat(), "end": (day + dt.timedelta(days=1)).isoformat()}))),
+    ]
+    slots = []
+    for name, step in steps:
+        start = time.perf_counter()
+        status, body = step()
+        latencies.setdefault(name, []).append(time.perf_counter() - start)
+        statuses.append(status)
+        if name == "get_slots" and body:
+            slots = body.get("available_slots", [])
+    if not slots:
+        return
+    start = time.perf_counter()
+    status, body = call(f"{base_url}/book_appointment", "POST", {
+        "slot_id": random.choice(slots)["slot_id"], "patient_email": f"patient{number}@example.com",
+        "patient_name": f"Patient {number}", "assessment_id": f"assessment-{number}",
+    })
+    latencies.setdefault("book_appointment", []).append(time.perf_counter() - start)
+    statuses.append(status)
+    state = "pending" if status == 202 else "scheduled" if status == 200 else None
+    while state == "pending":
+        time.sleep(0.05)
+        _, body = call(f"{base_url}/booking_status/{body['booking_id']}")
+        state = body["status"]
+    if state == "scheduled":
+        latencies.setdefault("confirmed", []).append(time.perf_counter() - start)
+
+
+def run_once(name, base_url, users, doctor_count):
+    latencies, statuses = {}, []
+    barrier = threading.Barrier(users)
+    threads = [threading.Thread(target=patient, args=(base_url, number, doctor_count, latencies, statuses, barrier))
+               for number in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    print(f"{name}: {len(statuses)} requests in {seconds:.2f} s ({len(statuses) / seconds:.0f} req/s), "
+          f"statuses {dict(sorted((status, statuses.count(status)) for status in set(statuses)))}")
+    results = {
+        "requests_per_second": len(statuses) / seconds,
+        "server_errors": sum(1 for status in statuses if status >= 500),
+    }
+    for endpoint, values in latencies.items():
+        values.sort()
+        p50, p99 = values[len(values) // 2], values[min(len(values) - 1, int(len(values) * 0.99))]
+        print(f"  {endpoint:17s} p50 {p50 * 1000:7.1f} ms   p99 {p99 * 1000:7.1f} ms")
+        results[f"{endpoint}_p50_ms"] = p50 * 1000
+        results[f"{endpoint}_p99_ms"] = p99 * 1000
+    return results
+
+
+def run(users, doctor_count, mongo, flask_url, async_url, smtp_pool):
+    processes = []
+    if flask_url or async_url:
+        if mongo:
+            from database import get_client
+
+            seed(get_client(mongo), doctor_count, users)
+    else:
+        flask_url, async_url, processes = start_in_process(doctor_count, users, smtp_pool)
+    print(f"{users} concurrent patients, {doctor_count} doctors, Calendar {CALENDAR_SECONDS * 1000:.0f} ms, "
+          f"SMTP {SMTP_COMMAND_SECONDS * 1000:.0f} ms per command")
+    results = {}
+    try:
+        if flask_url:
+            results["flask"] = run_once("Flask (threaded dev server)", flask_url, users, doctor_count)
+        if async_url:
+            results["async"] = run_once("Async service (Hypercorn)", async_url, users, doctor_count)
+    finally:
+        for process in processes:
+            process.terminate()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--smtp-pool", type=int, default=10, help="SMTP connections of the in-process async service")
+    parser.add_argument("--mongo", metavar="URI", help="seed this database before driving running servers")
+    parser.add_argument("--flask-url", help="URL of a running Flask booking app")
+    parser.add_argument("--async-url", help="URL of a running async booking service")
+    args = parser.parse_args()
+    run(args.users, args.doctors, args.mongo, args.flask_url, args.async_url, args.smtp_pool)
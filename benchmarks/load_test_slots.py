@@ -0,0 +1,205 @@
+# Load test: 500 concurrent users browsing doctors and slots, with and without the
+# read-through cache. Each user loads the doctor list and then looks at slots of random
+# doctors/days, replaying ETags like a browser does; a background "booker" keeps claiming
+# slots so the cache is invalidated while users browse.
+#
+# By default the two routes are served in-process from mongomock with a simulated MongoDB
+# round trip; --url drives a running app instead (uncached numbers then need a build of
+# the app without the cache).
+#
+#   python benchmarks/load_test_slots.py [--users 500] [--lookups 10] [--doctors 50] [--url http://localhost:5000]
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import mongomock
+from flask import Flask, jsonify, request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from read_cache import DOCTORS_TAG, ReadCache, cached_json_response  # noqa: E402
+from slot_booking import claim_slot  # noqa: E402
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+TIMES = [f"{hour:02d}:00 {half} - {hour + 1 if hour < 12 else 1:02d}:00 {half}"
+         for half in ("AM", "PM") for hour in (9, 10, 11)]
+
+# Simulated network round trip per MongoDB query (mongomock answers instantly)
+ROUND_TRIP_SECONDS = 0.002
+
+
+# Collection wrapper that adds the round trip and counts queries
+class CountingCollection:
+    def __init__(self, collection):
+        self.collection = collection
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def _query(self):
+        with self._lock:
+            self.queries += 1
+        time.sleep(ROUND_TRIP_SECONDS)
+
+    def find(self, *args, **kwargs):
+        self._query()
+        return list(self.collection.find(*args, **kwargs))
+
+    def find_one(self, *args, **kwargs):
+        self._query()
+        return self.collection.find_one(*args, **kwargs)
+
+    def update_one(self, *args, **kwargs):
+        self._query()
+        return self.collection.update_one(*args, **kwargs)
+
+
+def make_collection(doctor_count):
+    collection = mongomock.MongoClient()["doctor_appointments_load"]["appointments"]
+    collection.insert_many([{
+        "doctor_name": f"Dr. {number}",
+        "qualification": "MBBS",
+        "specialization": ["Cardiologist", "Dermatologist", "Neurologist"][number % 3],
+        "available_slots": {day: [{"time": time_slot, "available": True} for time_slot in TIMES] for day in DAYS},
+    } for number in range(doctor_count)])
+    return CountingCollection(collection)
+
+
+# The two routes as they were before the cache (baseline) and with it
+def make_app(collection, cache):
+    app = Flask(__name__)
+
+    def load_doctors():
+        doctors = collection.find({}, {"_id": 0, "doctor_name": 1, "qualification": 1, "specialization": 1})
+        return doctors, 200, [DOCTORS_TAG]
+
+    def load_slots(doctor_name, day):
+        doctor_info = collection.find_one({"doctor_name": doctor_name})
+        if not doctor_info:
+            return {"message": "Doctor not found or no available slots for the selected day."}, 400, []
+        slots = [slot for slot in doctor_info["available_slots"].get(day, []) if slot["available"]]
+        return {"available_slots": slots}, 200, [str(doctor_info["_id"])]
+
+    @app.route("/get_doctors")
+    def get_doctors():
+        if cache is None:
+            return jsonify(load_doctors()[0])
+        return cached_json_response(cache, ("doctors",), load_doctors)
+
+    @app.route("/get_slots")
+    def get_slots():
+        key = ("slots", request.args.get("doctor_name"), request.args.get("day"))
+        if cache is None:
+            payload, status, _ = load_slots(*key[1:])
+            return jsonify(payload), status
+        return cached_json_response(cache, key, lambda: load_slots(*key[1:]))
+
+    return app
+
+
+# Function to build a fetch(path, etag) -> (status, etag) for the in-process app or a URL
+def make_fetch(app=None, url=None):
+    if url is None:
+        client_local = threading.local()
+
+        def fetch(path, etag):
+            client = getattr(client_local, "client", None)
+            if client is None:
+                client = client_local.client = app.test_client()
+            headers = {"If-None-Match": etag} if etag else {}
+            response = client.get(path, headers=headers)
+            return response.status_code, response.headers.get("ETag")
+        return fetch
+
+    def fetch(path, etag):
+        headers = {"If-None-Match": etag} if etag else {}
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url + path, headers=headers)) as response:
+                response.read()
+                return response.status, response.headers.get("ETag")
+        except urllib.error.HTTPError as error:
+            return error.code, etag
+    return fetch
+
+
+def browse(fetch, doctor_count, lookups, latencies, statuses, barrier):
+    etags = {}
+    # Users compare a few doctors/days and go back and forth between them
+    choices = [
+        "/get_slots?" + urllib.parse.urlencode({"doctor_name": f"Dr. {random.randrange(doctor_count)}", "day": random.choice(DAYS)})
+        for _ in range(4)
+    ]
+    paths = ["/get_doctors"] + [random.choice(choices) for _ in range(lookups)]
+    barrier.wait()
+    for path in paths:
+        start = time.perf_counter()
+        status, etag = fetch(path, etags.get(path))
+        latencies.append(time.perf_counter() - start)
+        statuses.append(status)
+        if etag:
+            etags[path] = etag
+
+
+# Function to keep booking random slots (and invalidating their doctor) until stopped
+def book_continuously(collection, cache, doctor_count, stop):
+    while not stop.is_set():
+        doctor_name = f"Dr. {random.randrange(doctor_count)}"
+        if claim_slot(collection.collection, doctor_name, random.choice(DAYS), random.choice(TIMES)) and cache is not None:
+            cache.note_write(str(collection.collection.find_one({"doctor_name": doctor_name}, {"_id": 1})["_id"]))
+        time.sleep(0.01)
+
+
+def run_once(name, fetch, users, lookups, doctor_count, collection=None, cache=None):
+    latencies, statuses = [], []
+    barrier = threading.Barrier(users)
+    stop = threading.Event()
+    booker = None
+    if collection is not None:
+        booker = threading.Thread(target=book_continuously, args=(collection, cache, doctor_count, stop))
+        booker.start()
+    threads = [threading.Thread(target=browse, args=(fetch, doctor_count, lookups, latencies, statuses, barrier))
+               for _ in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    stop.set()
+    if booker is not None:
+        booker.join()
+
+    latencies.sort()
+    requests = len(latencies)
+    line = (f"{name:10s} {requests} requests in {seconds:.2f} s ({requests / seconds:.0f} req/s), "
+            f"p50 {latencies[requests // 2] * 1000:.1f} ms, p95 {latencies[int(requests * 0.95)] * 1000:.1f} ms, "
+            f"304s {statuses.count(304)}")
+    if collection is not None:
+        line += f", MongoDB queries {collection.queries}"
+    print(line)
+
+
+def run(users, lookups, doctor_count, url):
+    print(f"{users} concurrent users, 1 doctor list + {lookups} slot lookups each")
+    if url:
+        run_once("app", make_fetch(url=url), users, lookups, doctor_count)
+        return
+    for name, cache in (("no cache", None), ("cached", ReadCache())):
+        collection = make_collection(doctor_count)
+        run_once(name, make_fetch(app=make_app(collection, cache)), users, lookups, doctor_count, collection, cache)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--lookups", type=int, default=10)
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--url", help="load test a running app instead of the in-process routes")
+    args = parser.parse_args()
+    run(args.users, args.lookups, args.doctors, args.url)
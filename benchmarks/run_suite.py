@@ -0,0 +1,225 @@
+# Benchmark suite: runs the hot paths of the three scripts against local stand-ins (no
+# microphone, speakers, MongoDB server, Gmail or Google Calendar needed) and writes the
+# results to a JSON file, so two revisions can be compared:
+#
+#   symptom_extraction  SymptomMatcher on dataset-derived transcripts (bench_symptom_matcher)
+#   semantic_matching   the semantic matcher's index load and per-utterance search, with a
+#                       hashing encoder standing in for the model (bench_semantic_matcher)
+#   diagnosis_engine    prognosis ranking per patient (bench_diagnosis_engine)
+#   console_interview   1)main.py with a scripted recognizer and silent TTS, plus the cost of
+#                       evaluate_diseases per patient (bench_console_interview)
+#   kiosk_sessions      many socket kiosks on one kiosk_manager process: memory per kiosk
+#                       against a whole process, assessments/sec and answer latency
+#                       (bench_kiosk_sessions)
+#   booking             /get_doctors, /get_slots and /book_appointment under concurrent
+#                       patients, Flask app and async service, with a Calendar HTTP stand-in
+#                       and aiosmtpd (load_test_booking)
+#   slot_reset          the reset job of 3)Resetting_slot.py over N booked appointments
+#                       (bench_calendar_sync)
+#
+# MongoDB is mongomock unless --mongo points at a local mongod (console_interview and
+# slot_reset; the booking servers always seed their own mongomock).
+#
+#   python benchmarks/run_suite.py [--quick] [--only booking,slot_reset] [--mongo URI]
+#                                  [--output FILE] [--compare BASELINE.json] [--threshold 0.1]
+#
+# A benchmark whose dependencies are missing (e.g. SpeechRecognition for console_interview) is
+# recorded as skipped. With --compare the script exits with status 1 if a metric got worse
+# than the baseline by more than the threshold.
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import traceback
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("MONGO_URI", "mongomock://")
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Workload sizes: the default run and --quick
+SIZES = {
+    "full": {"transcripts": 2000, "utterances": 500, "patients": 5000, "interviews": 200, "kiosks": 64, "users": 200,
+             "doctors": 50, "appointments": 10000},
+    "quick": {"transcripts": 300, "utterances": 100, "patients": 500, "interviews": 30, "kiosks": 16, "users": 30,
+              "doctors": 10, "appointments": 1000},
+}
+
+# Metric name suffixes and whether a higher value is better; other metrics are informational
+DIRECTIONS = (("_per_second", True), ("_accuracy", True), ("_us", False), ("_ms", False), ("_seconds", False))
+
+
+def run_symptom_extraction(sizes, mongo_uri):
+    import bench_symptom_matcher
+
+    return bench_symptom_matcher.run(sizes["transcripts"])
+
+
+def run_semantic_matching(sizes, mongo_uri):
+    import bench_semantic_matcher
+
+    return bench_semantic_matcher.run(sizes["utterances"])
+
+
+def run_diagnosis_engine(sizes, mongo_uri):
+    import bench_diagnosis_engine
+
+    return bench_diagnosis_engine.run(sizes["patients"], observed=4)
+
+
+def run_console_interview(sizes, mongo_uri):
+    import bench_console_interview
+
+    return bench_console_interview.run(sizes["interviews"], mongo_uri)
+
+
+def run_kiosk_sessions(sizes, mongo_uri):
+    import bench_kiosk_sessions
+
+    return bench_kiosk_sessions.run(sizes["kiosks"])
+
+
+def run_booking(sizes, mongo_uri):
+    import load_test_booking
+
+    return load_test_booking.run(sizes["users"], sizes["doctors"], None, None, None, smtp_pool=10)
+
+
+def run_slot_reset(sizes, mongo_uri):
+    import bench_calendar_sync
+
+    return bench_calendar_sync.run(sizes["appointments"], sizes["doctors"], 0.0, mongo_uri)
+
+
+BENCHMARKS = {
+    "symptom_extraction": run_symptom_extraction,
+    "semantic_matching": run_semantic_matching,
+    "diagnosis_engine": run_diagnosis_engine,
+    "console_interview": run_console_interview,
+    "kiosk_sessions": run_kiosk_sessions,
+    "booking": run_booking,
+    "slot_reset": run_slot_reset,
+}
+
+
+# Function to describe the checked-out revision (commit, plus "-dirty" with local changes)
+def current_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+# Function to flatten nested results into {"benchmark.metric": value}
+def flatten(results, prefix=""):
+    flat = {}
+    for name, value in results.items():
+        key = f"{prefix}{name}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{key}."))
+        elif isinstance(value, (int, float)):
+            flat[key] = value
+    return flat
+
+
+# Function to return True when a higher value of the metric is better, False when lower is
+# better and None when it is informational
+def higher_is_better(metric):
+    for suffix, higher in DIRECTIONS:
+        if metric.endswith(suffix):
+            return higher
+    return None
+
+
+# Function to print the change of every metric against a baseline file; returns the
+# metrics that regressed by more than `threshold` (a fraction)
+def compare(report, baseline, threshold):
+    current, previous = flatten(report["results"]), flatten(baseline["results"])
+    print(f"\nCompared with {baseline['revision']} ({baseline['created']}):")
+    regressions = []
+    for metric in sorted(current.keys() & previous.keys()):
+        old, new = previous[metric], current[metric]
+        higher = higher_is_better(metric)
+        if higher is None or not old:
+            continue
+        change = (new - old) / old
+        worse = -change if higher else change
+        flag = ""
+        if worse > threshold:
+            flag = "  REGRESSION"
+            regressions.append(metric)
+        print(f"  {metric:45s} {old:12.3f} -> {new:12.3f} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and write machine-readable results.")
+    parser.add_argument("--quick", action="store_true", help="small workloads, for a fast check")
+    parser.add_argument("--only", help="comma-separated benchmarks to run: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--mongo", metavar="URI", default="mongomock://", help="use a real mongod instead of mongomock")
+    parser.add_argument("--output", help="results file (default benchmarks/results/<time>-<revision>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change reported as a regression")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    sizes = SIZES["quick" if args.quick else "full"]
+
+    report = {
+        "revision": current_revision(),
+        "created": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "sizes": sizes,
+        "mongo": "mongomock" if args.mongo.startswith("mongomock://") else "mongod",
+        "results": {},
+        "skipped": {},
+    }
+    for name in names:
+        print(f"\n== {name}")
+        start = time.perf_counter()
+        try:
+            report["results"][name] = BENCHMARKS[name](sizes, args.mongo)
+        except ImportError as e:
+            print(f"Skipped: {e}")
+            report["skipped"][name] = str(e)
+            continue
+        except Exception as e:
+            traceback.print_exc()
+            report["skipped"][name] = f"failed: {e!r}"
+            continue
+        report["results"][name]["wall_seconds_total"] = time.perf_counter() - start
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = dt.datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{report['revision']}.json")
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+# Simulator: replays dataset rows as synthetic patients through the interview of 1)main.py
+# (run_interview, answered by the scripted recognizer of bench_console_interview) and
+# compares its voice turns with the fixed interview it replaced, which asked every symptom
+# of every relevant disease (ask_follow_up per disease). A turn is one answer after the
+# symptom description, follow-up questions included.
+#
+#   python benchmarks/simulate_interviews.py [--patients 1000] [--confidence 0.9]
+import argparse
+import contextlib
+import functools
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_console_interview import SyntheticPatient, load_console_app  # noqa: E402
+from diagnosis_engine import load_dataset  # noqa: E402
+from interview_planner import InterviewPlanner  # noqa: E402
+
+
+# Function to count the answers given while `interview` runs
+def count_turns(app, interview):
+    start = app.speech_recognizer.turns
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = interview()
+    return app.speech_recognizer.turns - start, result
+
+
+def run(patient_count, confidence, seed=0):
+    directory = tempfile.mkdtemp(prefix="interview-sim-")
+    try:
+        app = load_console_app(directory)
+        app.patient_log.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    app.InterviewPlanner = functools.partial(InterviewPlanner, confidence=confidence)
+
+    rng = random.Random(seed)
+    symptoms, matrix, labels = load_dataset()
+    groups = {}
+    correct = 0
+    for number in range(patient_count):
+        row = rng.randrange(len(matrix))
+        patient = SyntheticPatient(number, {symptoms[i] for i in np.flatnonzero(matrix[row])}, rng)
+        app.speech_recognizer.patient = patient
+        relevant_diseases, detected_symptoms = app.extract_relevant_diseases(patient.description)
+
+        fixed, _ = count_turns(app, lambda: [app.ask_follow_up(disease, {}) for disease in relevant_diseases])
+        adaptive, (_, ranked) = count_turns(app, lambda: app.run_interview(relevant_diseases, detected_symptoms))
+        correct += ranked[0][0] == labels[row]
+        for group in ["all", *(sorted(relevant_diseases) or ["no relevant disease"])]:
+            groups.setdefault(group, ([], []))
+            groups[group][0].append(fixed)
+            groups[group][1].append(adaptive)
+
+    print(f"{patient_count} patients through run_interview of 1)main.py at confidence {confidence}, "
+          f"top-1 accuracy {correct / patient_count:.1%}")
+    results = {"top1_accuracy": correct / patient_count}
+    for group, (fixed, adaptive) in groups.items():
+        print(f"  {group:22s} {len(fixed):5d} patients  fixed: median {np.median(fixed):.0f} turns "
+              f"(mean {np.mean(fixed):.1f})  adaptive: median {np.median(adaptive):.0f} turns "
+              f"(mean {np.mean(adaptive):.1f})")
+        results[group] = {"fixed_median_turns": float(np.median(fixed)),
+                          "adaptive_median_turns": float(np.median(adaptive))}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--confidence", type=float, default=0.9)
+    args = parser.parse_args()
+    run(args.patients, args.confidence)
@@ -0,0 +1,95 @@
+# Concurrency stress test: many threads race to book the same slot.
+# The atomic claim must produce exactly one winner per round; the old
+# read-check-update sequence is run as well for comparison.
+#
+#   python benchmarks/stress_slot_booking.py [--threads 64] [--rounds 50] [--mongo mongodb://localhost:27017/]
+import argparse
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from slot_booking import claim_slot  # noqa: E402
+
+DOCTOR = "Dr. Stress"
+DAY = "Monday"
+TIME_SLOT = "10:00 AM - 11:00 AM"
+
+# Simulated network round trip between the legacy read and write (mongomock answers instantly)
+ROUND_TRIP_SECONDS = 0.001
+
+
+# The booking sequence book_appointment used before claim_slot, kept as the baseline
+def legacy_book(collection, doctor_name, day, time_slot):
+    doctor_info = collection.find_one({'doctor_name': doctor_name})
+    slots = doctor_info['available_slots'].get(day, [])
+    slot = next((slot for slot in slots if slot['time'] == time_slot), None)
+    if not slot or not slot['available']:
+        return False
+    time.sleep(ROUND_TRIP_SECONDS)
+    collection.update_one(
+        {'doctor_name': doctor_name, f'available_slots.{day}.time': time_slot},
+        {'$set': {'available_slots.' + day + '.$.available': False}}
+    )
+    return True
+
+
+# Function to reset the test doctor to a single free slot
+def reset_doctor(collection):
+    collection.delete_many({"doctor_name": DOCTOR})
+    collection.insert_one({
+        "doctor_name": DOCTOR,
+        "available_slots": {DAY: [{"time": TIME_SLOT, "available": True}]},
+    })
+
+
+# Function to run one round: all threads start together and try to book the slot
+def race(collection, book, thread_count):
+    reset_doctor(collection)
+    barrier = threading.Barrier(thread_count)
+    winners = []
+
+    def patient():
+        barrier.wait()
+        if book(collection, DOCTOR, DAY, TIME_SLOT):
+            winners.append(threading.get_ident())
+
+    threads = [threading.Thread(target=patient) for _ in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(winners)
+
+
+def run(thread_count, rounds, mongo_uri):
+    if mongo_uri:
+        from pymongo import MongoClient
+
+        collection = MongoClient(mongo_uri)["doctor_appointments_stress"]["appointments"]
+    else:
+        import mongomock
+
+        collection = mongomock.MongoClient()["doctor_appointments_stress"]["appointments"]
+
+    for name, book in (("legacy read-check-update", legacy_book), ("atomic claim_slot", claim_slot)):
+        winners = [race(collection, book, thread_count) for _ in range(rounds)]
+        double_bookings = sum(count > 1 for count in winners)
+        print(f"{name:26s} {rounds} rounds x {thread_count} threads: "
+              f"max winners per slot {max(winners)}, rounds with double booking {double_bookings}")
+        if book is claim_slot and any(count != 1 for count in winners):
+            sys.exit("FAIL: the atomic claim did not produce exactly one winner in every round")
+    collection.delete_many({"doctor_name": DOCTOR})
+    print("OK: exactly one winner in every round")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--mongo", metavar="URI", help="use a real mongod instead of mongomock")
+    args = parser.parse_args()
+    run(args.threads, args.rounds, args.mongo)
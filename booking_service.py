@@ -0,0 +1,330 @@
+import argparse
+import asyncio
+import datetime as dt
+import json
+import os
+import uuid
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from quart import Quart, jsonify, render_template, request
+
+from availability import Availability, combine_free_slots, parse_slot_id, requested_window
+from calendar_service import AsyncCalendar, CalendarServiceManager, meet_event_body, meet_links
+from database import APPOINTMENTS_DB, PATIENTS_DB, ensure_indexes, get_async_client, get_client
+from mailer import AsyncMailer
+from metrics import instrument_quart
+from patient_store import assessment_query, build_patient_info
+from read_cache import DOCTORS_TAG, LISTING_FIELDS, ReadCache, watch_changes
+from slot_booking import claim_slot_update, release_slot_update, slot_filter
+from slot_store import (
+    BOOKED, CLINIC_TIMEZONE, FREE, SlotStore, as_utc, booked_slot, claim_update, local_day_and_time, next_weekday,
+    parse_time_slot, release_update, slot_to_json, slots_filter,
+)
+
+# Async (ASGI) version of the booking app: the same pages and API as
+# 2)GoogleMeet_Schedule.py, with MongoDB (Motor), Google Calendar (httpx) and SMTP
+# (aiosmtplib) awaited instead of blocking, so one process serves many bookings whose
+# Calendar or email calls are slow. A booking claims its slot, records the booking, creates
+# the Calendar event, then sends both emails concurrently and answers with the Meet link.
+# The queries are the ones of slot_booking.py, slot_store.py and patient_store.py.
+#
+#   python booking_service.py --bind 0.0.0.0:8000 --workers 4
+
+app = Quart(__name__)
+
+# Request timings and the Prometheus /metrics endpoint
+instrument_quart(app)
+
+# MongoDB collections (Motor)
+client = get_async_client()
+db = client[APPOINTMENTS_DB]
+collection = db["appointments"]
+bookings_collection = db["bookings"]
+slots_collection = db["slots"]
+rules_collection = db["availability_rules"]
+patient_collection = client[PATIENTS_DB]["patients"]
+
+# Generates (and caches) the slots of availability rules; the rules and stored slots are
+# read with Motor here, so its collections are never used
+rule_slots = Availability(None, SlotStore(None))
+
+# Read-through cache for the doctor listing and slot lookups, invalidated by change streams
+# (on a replica set) or by this service's own writes
+read_cache = ReadCache()
+sync_db = get_client()[APPOINTMENTS_DB]
+watch_changes(read_cache, [sync_db["appointments"], sync_db["slots"], sync_db["availability_rules"]])
+
+# Created when the server starts, inside its event loop
+calendar = None
+mailer = None
+
+
+@app.before_serving
+async def start_clients():
+    global calendar, mailer
+    await asyncio.to_thread(ensure_indexes)
+    calendar = AsyncCalendar(CalendarServiceManager())
+    mailer = AsyncMailer(dead_letters=db["email_dead_letters"])
+
+
+@app.after_serving
+async def stop_clients():
+    await calendar.close()
+    await mailer.close()
+
+
+@app.route('/')
+async def index():
+    return await render_template('index.html')
+
+
+# Function to answer from the read cache (with ETag / If-None-Match), loading on a miss
+async def cached_json_response(key, loader):
+    cached = read_cache.get(key)
+    if cached is None:
+        generation = read_cache.generation
+        payload, status, tags = await loader()
+        body = json.dumps(payload, sort_keys=True).encode()
+        if status != 200:
+            return app.response_class(body, status=status, mimetype="application/json")
+        etag = read_cache.set(key, body, tags, generation)
+    else:
+        etag, body = cached
+    response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return await response.make_conditional(request)
+
+
+@app.route('/get_doctors', methods=['GET'])
+async def get_doctors():
+    return await cached_json_response(("doctors",), load_doctors)
+
+
+# Function to load the doctor listing for the cache
+async def load_doctors():
+    projection = dict({"_id": 0}, **{field: 1 for field in LISTING_FIELDS})
+    doctors = await collection.find({}, projection).to_list(None)
+    return doctors, 200, [DOCTORS_TAG]
+
+
+# Fetch available slots for a specific doctor on a given day (or date range)
+@app.route("/get_slots", methods=["GET", "POST"])
+async def get_slots():
+    params = await request.get_json(silent=True) or request.args
+    key = ("slots", params.get("doctor_name"), params.get("day"), params.get("start"), params.get("end"))
+    return await cached_json_response(key, lambda: load_slots(*key[1:]))
+
+
+# Function to load the free slots of a doctor for the cache
+async def load_slots(doctor_name, day, start_date=None, end_date=None):
+    doctor_info = await collection.find_one({"doctor_name": doctor_name})
+    if not doctor_info:
+        return {"message": "Doctor not found or no available slots for the selected day."}, 400, []
+    doctor_id = str(doctor_info["_id"])
+
+    rule = await rules_collection.find_one({"_id": doctor_id})
+    if rule:
+        start, end = requested_window(day, start_date, end_date)
+        # Free and booked stored slots in one indexed query
+        stored = await slots_collection.find(slots_filter(start, end, [FREE, BOOKED], doctor_id)).to_list(None)
+        slots = combine_free_slots(
+            [slot for slot in stored if slot["status"] == FREE],
+            [slot for slot in stored if slot["status"] == BOOKED],
+            rule_slots.rule_slots(rule, start, end),
+        )
+        return {"available_slots": [slot_to_json(slot) for slot in slots]}, 200, [doctor_id]
+    slots = doctor_info["available_slots"].get(day, [])
+    return {"available_slots": [slot for slot in slots if slot["available"]]}, 200, [doctor_id]
+
+
+# Function to find the assessment given by ID, else the latest one under the patient's name
+async def find_assessment(assessment_id=None, name=None):
+    query = assessment_query(assessment_id=assessment_id, name=name)
+    if query is None:
+        return None
+    query_filter, options = query
+    return await patient_collection.find_one(query_filter, **options)
+
+
+# Function to find the next occurrence of a weekday-keyed "10:00 AM - 11:00 AM" slot in UTC
+def next_occurrence(day, time_slot, now=None):
+    now = now or dt.datetime.now(dt.timezone.utc)
+    start, end = parse_time_slot(next_weekday(now.astimezone(CLINIC_TIMEZONE).date(), day), time_slot)
+    if start <= now:
+        start, end = start + dt.timedelta(days=7), end + dt.timedelta(days=7)
+    return start, end
+
+
+# Function to claim a slot for a booking with one conditional write (the queries of
+# SlotStore.claim/claim_new and slot_booking.claim_slot); returns False if it was taken
+async def claim(booking_id, slot_id, slot, stored, doctor_name, day, time_slot):
+    if slot_id and stored:
+        claimed = await slots_collection.find_one_and_update(
+            *claim_update(slot_id, booking_id), return_document=ReturnDocument.AFTER
+        )
+        return claimed is not None
+    if slot_id:
+        # Generated slot: the insert fails for everyone but the first patient
+        try:
+            await slots_collection.insert_one(booked_slot(slot, booking_id))
+            return True
+        except DuplicateKeyError:
+            return await claim(booking_id, slot_id, slot, True, doctor_name, day, time_slot)
+    result = await collection.update_one(*claim_slot_update(doctor_name, day, time_slot))
+    return result.modified_count == 1
+
+
+# Function to give a claimed slot back when the rest of the booking fails
+async def release(booking_id, slot_id, doctor_name, day, time_slot):
+    if slot_id:
+        await slots_collection.update_one(*release_update(slot_id, booking_id))
+    else:
+        await collection.update_one(*release_slot_update(doctor_name, day, time_slot))
+
+
+# Book an appointment
+@app.route('/book_appointment', methods=['POST'])
+async def book_appointment():
+    data = await request.get_json()
+    slot_id = data.get('slot_id')
+    stored_slot = slot = None
+    if slot_id:
+        # Booking a slot by its ID: stored in the slot store, or generated from a rule
+        doctor_id, start = parse_slot_id(slot_id)
+        stored_slot, rule = await asyncio.gather(
+            slots_collection.find_one({"_id": slot_id}),
+            rules_collection.find_one({"_id": doctor_id}),
+        )
+        slot = stored_slot
+        if slot is None and rule and start > dt.datetime.now(dt.timezone.utc):
+            slot = rule_slots.rule_slot(rule, slot_id, start)
+        if not slot:
+            return jsonify({'message': 'The selected time slot does not exist.'}), 400
+        doctor_name = slot['doctor_name']
+        day, time_slot = local_day_and_time(slot)
+    else:
+        doctor_name = data['doctor_name']
+        day = data['day']
+        time_slot = data['time_slot']
+    patient_email = data['patient_email']
+    patient_name = data['patient_name']
+
+    # The doctor and the assessment are looked up concurrently
+    assessment_id = data.get('assessment_id')
+    doctor_info, latest_patient = await asyncio.gather(
+        collection.find_one({'doctor_name': doctor_name}),
+        find_assessment(assessment_id=assessment_id, name=patient_name),
+    )
+    if not doctor_info:
+        return jsonify({'message': 'Doctor not found.'}), 400
+    if not latest_patient:
+        if assessment_id:
+            return jsonify({'message': f"No assessment found with the ID '{assessment_id}'."}), 400
+        return jsonify({'message': f"No patient found with the name '{patient_name}'. Please ensure the name matches exactly."}), 400
+
+    # Hex UUIDs are also valid Calendar event IDs, which makes the event insert idempotent
+    booking_id = uuid.uuid4().hex
+    if not await claim(booking_id, slot_id, slot, stored_slot is not None, doctor_name, day, time_slot):
+        exists = slot_id or await collection.count_documents(slot_filter(doctor_name, day, time_slot), limit=1)
+        if not exists:
+            return jsonify({'message': 'The selected time slot does not exist.'}), 400
+        return jsonify({'message': 'The selected time slot is already booked.', 'booked': False}), 409
+    read_cache.note_write(str(doctor_info['_id']))
+
+    start_utc, end_utc = (as_utc(slot['start_utc']), as_utc(slot['end_utc'])) if slot else next_occurrence(day, time_slot)
+    patient_info = build_patient_info(latest_patient)
+    booking = {
+        "_id": booking_id,
+        "doctor_name": doctor_name,
+        "doctor_email": doctor_info['doctor_email'],
+        "day": day,
+        "time_slot": time_slot,
+        "slot_id": slot_id,
+        "patient_name": latest_patient.get('name', 'N/A'),
+        "assessment_id": latest_patient['_id'],
+        "patient_id": latest_patient.get('patient_id'),
+        "patient_email": patient_email,
+        "patient_info": patient_info,
+        "status": "pending",
+    }
+    event = meet_event_body(doctor_info['doctor_email'], patient_email, start_utc, end_utc, patient_info, booking_id)
+
+    # Record the booking first, so a Calendar event (which invites both attendees) is only
+    # created for a booking that exists
+    try:
+        await bookings_collection.insert_one(booking)
+    except PyMongoError as e:
+        print(f"Failed to record booking {booking_id}: {e}")
+        await release(booking_id, slot_id, doctor_name, day, time_slot)
+        read_cache.note_write(str(doctor_info['_id']))
+        return jsonify({'message': 'The appointment could not be booked, please try again.'}), 500
+
+    try:
+        created = await calendar.insert_event(event)
+    except Exception as e:
+        print(f"Failed to create the Calendar event of booking {booking_id}: {e!r}")
+        # The insert may have reached Google before failing: cancel the event if it exists
+        try:
+            await calendar.delete_event(booking_id)
+        except Exception as delete_error:
+            print(f"Could not cancel the Calendar event of booking {booking_id}: {delete_error!r}")
+        await release(booking_id, slot_id, doctor_name, day, time_slot)
+        read_cache.note_write(str(doctor_info['_id']))
+        await bookings_collection.update_one({"_id": booking_id}, {"$set": {"status": "failed", "error": str(e)}})
+        return jsonify({'message': 'The appointment could not be booked, please try again.'}), 502
+
+    _, google_meet_link = meet_links(created)
+    context = {
+        "doctor_name": doctor_name,
+        "patient_name": booking['patient_name'],
+        "patient_info": patient_info,
+        "time_slot": time_slot,
+        "meet_link": google_meet_link,
+    }
+    # Store the Meet link and send both confirmation emails concurrently
+    _, doctor_emailed, patient_emailed = await asyncio.gather(
+        bookings_collection.update_one({"_id": booking_id}, {"$set": {"status": "scheduled", "meet_link": google_meet_link}}),
+        mailer.send(doctor_info['doctor_email'], "doctor_confirmation", context, f"{booking_id}-doctor-email"),
+        mailer.send(patient_email, "patient_confirmation", context, f"{booking_id}-patient-email"),
+        return_exceptions=True,
+    )
+
+    return jsonify({
+        'message': 'Appointment successfully booked!',
+        'booking_id': booking_id,
+        'meet_link': google_meet_link,
+        'emails_sent': doctor_emailed is True and patient_emailed is True,
+    }), 200
+
+
+# Check a booking (same answer as the Flask app's /booking_status)
+@app.route('/booking_status/<booking_id>', methods=['GET'])
+async def booking_status(booking_id):
+    booking = await bookings_collection.find_one({"_id": booking_id})
+    if not booking:
+        return jsonify({'message': 'Booking not found.'}), 404
+    return jsonify({'booking_id': booking_id, 'status': booking['status'], 'meet_link': booking.get('meet_link')})
+
+
+# Production entry point: Hypercorn with `workers` processes (each runs its own event loop)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the async booking service.")
+    parser.add_argument("--bind", default=os.environ.get("BOOKING_SERVICE_BIND", "0.0.0.0:8000"))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)))
+    args = parser.parse_args(argv)
+
+    from hypercorn.config import Config
+    from hypercorn.run import run
+
+    config = Config()
+    config.bind = [args.bind]
+    config.workers = args.workers
+    config.application_path = "booking_service:app"
+    config.accesslog = "-"
+    run(config)
+
+
+if __name__ == "__main__":
+    main()
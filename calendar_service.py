@@ -0,0 +1,207 @@
+import asyncio
+import datetime as dt
+import os.path
+import threading
+
+import google_auth_httplib2
+import httplib2
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+
+from metrics import span
+
+# SCOPES for Google Calendar API
+SCOPES = ["https://www.googleapis.com/auth/calendar"]
+
+TOKEN_PATH = "./Key/token.json"
+CREDENTIALS_PATH = "./Key/Credentials.json"
+
+# Base URL of the Calendar REST API (overridable, e.g. to point load tests at a stand-in)
+CALENDAR_API_URL = os.environ.get("CALENDAR_API_URL", "https://www.googleapis.com/calendar/v3")
+
+
+# Calendar API request that records each execution as a "calendar" span labelled with the
+# API method (calendar.events.insert, ...)
+class TimedHttpRequest(HttpRequest):
+    def execute(self, *args, **kwargs):
+        with span("calendar", operation=self.methodId or self.method):
+            return super().execute(*args, **kwargs)
+
+
+# Shared Google Calendar credentials and service.
+# Credentials are read from the token file once and refreshed proactively, shortly before
+# they expire, under a lock: when several threads notice the expiry together only the first
+# refreshes and the others reuse its result. The Calendar service is built once from the
+# discovery document bundled with google-api-python-client (no discovery HTTP call), and
+# every request runs on an HTTP connection private to the calling thread, so one service
+# handle can be shared by all request handlers and job workers.
+class CalendarServiceManager:
+    def __init__(self, token_path=TOKEN_PATH, credentials_path=CREDENTIALS_PATH, scopes=SCOPES,
+                 refresh_margin=dt.timedelta(minutes=5), http_factory=httplib2.Http):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.scopes = scopes
+        self.refresh_margin = refresh_margin
+        self.http_factory = http_factory
+        self.refresh_count = 0
+        self._credentials = None
+        self._service = None
+        self._events = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # Function to check whether credentials are missing, invalid or about to expire
+    def _needs_refresh(self, creds):
+        if not creds or not creds.valid:
+            return True
+        # google-auth keeps `expiry` as a naive UTC datetime
+        return creds.expiry is not None and creds.expiry - self.refresh_margin <= dt.datetime.utcnow()
+
+    # Function to load, refresh or (interactively) obtain credentials and save the token
+    def _load_credentials(self):
+        creds = self._credentials
+        if creds is None and os.path.exists(self.token_path):
+            creds = Credentials.from_authorized_user_file(self.token_path, self.scopes)
+        if self._needs_refresh(creds):
+            if creds and creds.refresh_token:
+                with span("calendar", operation="token_refresh"):
+                    creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, self.scopes)
+                creds = flow.run_local_server(port=0)
+            self.refresh_count += 1
+            with open(self.token_path, "w") as token:
+                token.write(creds.to_json())
+        return creds
+
+    # Function to return valid credentials, refreshing them at most once at a time
+    def credentials(self):
+        creds = self._credentials
+        if not self._needs_refresh(creds):
+            return creds
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._needs_refresh(self._credentials):
+                self._credentials = self._load_credentials()
+            return self._credentials
+
+    # Function to return the credentials if they are loaded and need no refresh, else None
+    # (lets async code skip a thread hop on the common path)
+    def current_credentials(self):
+        creds = self._credentials
+        return None if self._needs_refresh(creds) else creds
+
+    # Function to return this thread's authorized HTTP connection
+    def _thread_http(self):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials(), http=self.http_factory())
+            self._local.http = http
+        # Requests always carry the current (possibly refreshed) credentials
+        http.credentials = self.credentials()
+        return http
+
+    # Function to build each API request on the calling thread's connection
+    def _build_request(self, http, *args, **kwargs):
+        return TimedHttpRequest(self._thread_http(), *args, **kwargs)
+
+    # Function to return the shared Calendar service handle
+    def service(self):
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    self._service = build(
+                        "calendar", "v3",
+                        http=self.http_factory(),
+                        requestBuilder=self._build_request,
+                        static_discovery=True,
+                    )
+        return self._service
+
+    # Function to return the shared events resource (service.events() rebuilds every
+    # method from the discovery document on each call, so it is created only once)
+    def events(self):
+        if self._events is None:
+            self._events = self.service().events()
+        return self._events
+
+
+# Function to build the Calendar event of an appointment with a Google Meet conference.
+# With a fixed event ID a retried insert cannot create a second event.
+def meet_event_body(doctor_email, patient_email, start_utc, end_utc, patient_info, event_id=None):
+    event = {
+        "summary": "Doctor Appointment",
+        "location": "Online (Google Meet)",
+        "description": f"Doctor appointment scheduled.\n\n{patient_info}",
+        "start": {"dateTime": start_utc.isoformat(), "timeZone": "UTC"},
+        "end": {"dateTime": end_utc.isoformat(), "timeZone": "UTC"},
+        "attendees": [{"email": patient_email}, {"email": doctor_email}],
+        "conferenceData": {
+            "createRequest": {
+                "requestId": f"meet-{event_id or start_utc.isoformat()}",
+                "conferenceSolutionKey": {"type": "hangoutsMeet"},
+            },
+        },
+    }
+    if event_id:
+        event["id"] = event_id
+    return event
+
+
+# Function to return the (event link, Meet link) of a created event
+def meet_links(event):
+    meet_link = (
+        event.get("conferenceData", {})
+        .get("entryPoints", [{}])[0]
+        .get("uri", "Google Meet link not available")
+    )
+    return event.get("htmlLink"), meet_link
+
+
+# Google Calendar client for asyncio code, calling the REST API directly over one shared
+# httpx connection pool. Credentials come from a CalendarServiceManager; refreshing them is
+# blocking, so it runs in a thread and only when they are about to expire.
+class AsyncCalendar:
+    def __init__(self, manager, base_url=CALENDAR_API_URL, calendar_id="primary", timeout=30):
+        import httpx
+
+        self.manager = manager
+        self.calendar_id = calendar_id
+        self._http = httpx.AsyncClient(base_url=base_url, timeout=timeout)
+
+    async def _headers(self):
+        creds = self.manager.current_credentials()
+        if creds is None:
+            creds = await asyncio.to_thread(self.manager.credentials)
+        return {"Authorization": f"Bearer {creds.token}"}
+
+    # Function to create an event (or return it if an event with its ID already exists)
+    async def insert_event(self, event):
+        path = f"/calendars/{self.calendar_id}/events"
+        headers = await self._headers()
+        with span("calendar", operation="calendar.events.insert"):
+            response = await self._http.post(
+                path, json=event, headers=headers, params={"conferenceDataVersion": 1, "sendUpdates": "all"},
+            )
+            if response.status_code == 409 and event.get("id"):
+                response = await self._http.get(f"{path}/{event['id']}", headers=headers)
+            response.raise_for_status()
+        return response.json()
+
+    # Function to delete (cancel) an event; returns False if there was no such event
+    async def delete_event(self, event_id):
+        headers = await self._headers()
+        with span("calendar", operation="calendar.events.delete"):
+            response = await self._http.delete(
+                f"/calendars/{self.calendar_id}/events/{event_id}", headers=headers, params={"sendUpdates": "all"},
+            )
+            if response.status_code in (404, 410):
+                return False
+            response.raise_for_status()
+        return True
+
+    async def close(self):
+        await self._http.aclose()
@@ -0,0 +1,116 @@
+import datetime as dt
+
+from googleapiclient.errors import HttpError
+from pymongo import UpdateOne
+
+from slot_store import as_utc
+
+
+# Function to parse an RFC 3339 Calendar time into an aware UTC datetime
+def parse_event_time(value):
+    return dt.datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(dt.timezone.utc)
+
+
+# Incremental sync between Google Calendar and the booked appointments of every doctor.
+# Booked slots whose stored end time has passed are released without any API call. The
+# Calendar is only asked for what changed since the previous run (events.list with the
+# stored syncToken), which catches moved and cancelled meetings. All slot changes of a run
+# are written with one bulk_write holding a single update per doctor. The new syncToken is
+# stored only once every update was applied; otherwise the next run lists the same changes
+# again.
+class CalendarSync:
+    def __init__(self, collection, state_collection, events, calendar_id="primary", lookback=dt.timedelta(days=30)):
+        self.collection = collection
+        self.state_collection = state_collection
+        self.events = events
+        self.calendar_id = calendar_id
+        self.lookback = lookback
+        self.api_calls = 0
+
+    # Function to list changed events: {event_id: event}, the next sync token, and
+    # whether this was a full sync (no usable sync token)
+    def fetch_changes(self, now):
+        state = self.state_collection.find_one({"_id": self.calendar_id}) or {}
+        sync_token = state.get("sync_token")
+        params = {"calendarId": self.calendar_id, "showDeleted": True, "maxResults": 2500}
+        if sync_token:
+            params["syncToken"] = sync_token
+        else:
+            params["timeMin"] = (now - self.lookback).isoformat()
+
+        changes = {}
+        page_token = None
+        while True:
+            try:
+                self.api_calls += 1
+                response = self.events.list(pageToken=page_token, **params).execute()
+            except HttpError as error:
+                # 410 Gone: the sync token expired, start over with a full sync
+                if sync_token and error.resp.status == 410:
+                    self.state_collection.delete_one({"_id": self.calendar_id})
+                    return self.fetch_changes(now)
+                raise
+            for event in response.get("items", []):
+                changes[event["id"]] = event
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return changes, response.get("nextSyncToken"), not sync_token
+
+    # Function to release ended slots and store changed end times; returns the number released
+    def run(self, now=None):
+        now = now or dt.datetime.now(dt.timezone.utc)
+        changes, next_sync_token, full_sync = self.fetch_changes(now)
+
+        operations = []
+        released = 0
+        doctors = self.collection.find({"appointments": {"$exists": True}}, {"doctor_name": 1, "appointments": 1})
+        for doctor in doctors:
+            # One update per doctor; every changed slot is addressed by its array index and
+            # guarded by its event_id, so a concurrently modified array makes the update a
+            # no-op (and the next run, from the same sync token, tries it again)
+            guards = {}
+            changes_to_set = {}
+            for day, appointments in doctor.get("appointments", {}).items():
+                for index, appointment in enumerate(appointments):
+                    event_id = appointment.get("event_id")
+                    if appointment.get("available") or not event_id:
+                        continue
+
+                    stored_end = as_utc(appointment.get("end_utc"))
+                    end = stored_end
+                    event = changes.get(event_id)
+                    if event is not None:
+                        if event.get("status") == "cancelled":
+                            end = now
+                        elif "dateTime" in event.get("end", {}):
+                            end = parse_event_time(event["end"]["dateTime"])
+                    elif end is None and full_sync:
+                        # Not even listed by a full sync: the meeting ended before the lookback window
+                        end = now
+
+                    path = f"appointments.{day}.{index}"
+                    if end is not None and end <= now:
+                        changes_to_set[f"{path}.available"] = True
+                        released += 1
+                        print(f"Slot for {doctor['doctor_name']} on {day} at {appointment['time_slot']} is now available.")
+                    elif end != stored_end:
+                        changes_to_set[f"{path}.end_utc"] = end
+                    else:
+                        continue
+                    guards[f"{path}.event_id"] = event_id
+
+            if changes_to_set:
+                operations.append(UpdateOne({"_id": doctor["_id"], **guards}, {"$set": changes_to_set}))
+
+        applied = True
+        if operations:
+            result = self.collection.bulk_write(operations, ordered=False)
+            applied = result.matched_count == len(operations)
+            if not applied:
+                print(f"{len(operations) - result.matched_count} doctors changed during the sync, "
+                      f"their slots are updated on the next run.")
+        if next_sync_token and applied:
+            self.state_collection.update_one(
+                {"_id": self.calendar_id}, {"$set": {"sync_token": next_sync_token}}, upsert=True
+            )
+        return released
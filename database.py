@@ -0,0 +1,190 @@
+import os
+import queue
+import threading
+import time
+
+from pymongo import ASCENDING, InsertOne, MongoClient, monitoring
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from metrics import record_span
+
+# Connection settings, overridable through the environment. A "mongomock://" URI uses an
+# in-memory mongomock client instead of a server (for tests and benchmarks).
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/")
+APPOINTMENTS_DB = os.environ.get("APPOINTMENTS_DB", "doctor_appointments")
+PATIENTS_DB = os.environ.get("PATIENTS_DB", "patient_database")
+
+POOL_OPTIONS = {
+    "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", 50)),
+    "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", 2)),
+    "maxIdleTimeMS": int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", 300000)),
+    "connectTimeoutMS": int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+    "serverSelectionTimeoutMS": int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+    "socketTimeoutMS": int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", 20000)),
+}
+
+
+# Records every MongoDB command as a "mongo" span labelled with the command name (the
+# driver reports the duration, so nothing is timed twice)
+class CommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record_span("mongo", event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        record_span("mongo", event.duration_micros / 1e6, failed=True, command=event.command_name)
+
+
+COMMAND_METRICS = CommandMetrics()
+
+_clients = {}
+_async_clients = {}
+_clients_lock = threading.Lock()
+
+# Queue markers of BufferedWriter: write the current batch now / write it and stop
+_FLUSH, _STOP = object(), object()
+
+
+# Function to return the shared client of a URI (one connection pool per process)
+def get_client(uri=None):
+    uri = uri or MONGO_URI
+    with _clients_lock:
+        client = _clients.get(uri)
+        if client is None:
+            if uri.startswith("mongomock://"):
+                import mongomock
+
+                client = mongomock.MongoClient()
+            else:
+                client = MongoClient(uri, event_listeners=[COMMAND_METRICS], **POOL_OPTIONS)
+            _clients[uri] = client
+    return client
+
+
+# Function to return the shared asyncio (Motor) client of a URI, for the async booking
+# service. With "mongomock://" it wraps the in-memory client of get_client, so sync and
+# async code in one process see the same data.
+def get_async_client(uri=None):
+    uri = uri or MONGO_URI
+    with _clients_lock:
+        client = _async_clients.get(uri)
+    if client is None:
+        if uri.startswith("mongomock://"):
+            from mongomock_motor import AsyncMongoMockClient
+
+            client = AsyncMongoMockClient(mock_mongo_client=get_client(uri))
+        else:
+            from motor.motor_asyncio import AsyncIOMotorClient
+
+            client = AsyncIOMotorClient(uri, event_listeners=[COMMAND_METRICS], **POOL_OPTIONS)
+        with _clients_lock:
+            client = _async_clients.setdefault(uri, client)
+    return client
+
+
+# Function to create every index the apps rely on. Each component declares its own indexes
+# (ensure_indexes); this runs them all once at startup.
+def ensure_indexes(client=None):
+    from availability import Availability
+    from job_queue import JobQueue
+    from mailer import ensure_sent_log_indexes
+    from patient_store import ensure_patient_indexes
+    from slot_store import SlotStore
+
+    client = client or get_client()
+    appointments_db = client[APPOINTMENTS_DB]
+    # /get_slots and /book_appointment look doctors up by name
+    appointments_db["appointments"].create_index([("doctor_name", ASCENDING)])
+    slot_store = SlotStore(appointments_db["slots"], appointments_db["slots_archive"])
+    slot_store.ensure_indexes()
+    Availability(appointments_db["availability_rules"], slot_store).ensure_indexes()
+    JobQueue(appointments_db["jobs"], {}).ensure_indexes()
+    ensure_sent_log_indexes(appointments_db["sent_emails"])
+    ensure_patient_indexes(client[PATIENTS_DB]["patients"])
+    ensure_patient_indexes(client[PATIENTS_DB]["assessments"])
+
+
+# Buffered background writer for one collection.
+# Documents (or bulk write operations) are queued and written by a worker thread in batches
+# of up to `batch_size` with one unordered bulk_write, at the latest `flush_interval` seconds
+# after the first queued item. At most `max_pending` items wait in the queue; write() blocks
+# beyond that (backpressure), so a slow database slows producers down instead of letting
+# memory grow.
+class BufferedWriter:
+    def __init__(self, collection, batch_size=500, flush_interval=1.0, max_pending=10000):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._errors = []
+        self._closed = False
+        self._thread = threading.Thread(target=self._work, name=f"writer-{collection.name}", daemon=True)
+        self._thread.start()
+
+    # Function to queue a document for insertion, or any pymongo bulk write operation
+    def write(self, item, timeout=None):
+        if self._closed:
+            raise RuntimeError("The writer is closed.")
+        self._queue.put(item, timeout=timeout)
+
+    # Function to write everything queued so far right away; returns False if any write
+    # failed since the previous flush
+    def flush(self):
+        if not self._closed:
+            self._queue.put(_FLUSH)
+        self._queue.join()
+        errors, self._errors = self._errors, []
+        return not errors
+
+    # Function to write what is left and stop the worker
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._thread.join()
+        return self.flush()
+
+    def _work(self):
+        batch, markers = [], 0
+        deadline = None
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()) if batch else None)
+            except queue.Empty:
+                item = _FLUSH  # the flush interval is over
+            else:
+                if item is _FLUSH or item is _STOP:
+                    markers += 1
+                else:
+                    batch.append(item)
+                    if len(batch) == 1:
+                        deadline = time.monotonic() + self.flush_interval
+            if item is _FLUSH or item is _STOP or len(batch) >= self.batch_size:
+                if batch:
+                    self._write(batch)
+                for _ in range(len(batch) + markers):
+                    self._queue.task_done()
+                batch, markers = [], 0
+                if item is _STOP:
+                    return
+
+    def _write(self, batch):
+        operations = [item if not isinstance(item, dict) else InsertOne(item) for item in batch]
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+            self.written += len(batch)
+        except BulkWriteError as e:
+            # Unordered: everything but the failed operations was written
+            failed = len(e.details.get("writeErrors", [])) or len(batch)
+            print(f"Failed to write {failed} of {len(batch)} documents to {self.collection.name}: {e}")
+            self.written += len(batch) - failed
+            self.failed += failed
+            self._errors.append(e)
+        except PyMongoError as e:
+            print(f"Failed to write {len(batch)} documents to {self.collection.name}: {e}")
+            self.failed += len(batch)
+            self._errors.append(e)
@@ -0,0 +1,107 @@
+import csv
+import os
+
+import numpy as np
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Dataset", "symbipredict_2022.csv")
+
+# Symptom states in a patient vector
+UNKNOWN, CONFIRMED, DENIED = 0, 1, -1
+
+
+# Function to turn a dataset column such as "spotting_ urination" into "spotting urination"
+def column_to_symptom(column):
+    return " ".join(column.replace("_", " ").split())
+
+
+# Function to load the dataset into a uint8 symptom matrix and a prognosis label per row
+def load_dataset(path=DATASET_PATH):
+    with open(path, newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        rows = list(reader)
+    symptoms = [column_to_symptom(column) for column in header[:-1]]
+    matrix = np.array([row[:-1] for row in rows], dtype=np.uint8)
+    labels = [row[-1].strip() for row in rows]
+    return symptoms, matrix, labels
+
+
+# Naive-Bayes diagnosis engine over the symbipredict dataset.
+# Training reduces the dataset to one row of P(symptom | prognosis) per prognosis, so
+# scoring a patient is a pair of small matrix products against every prognosis at once.
+class DiagnosisEngine:
+    def __init__(self, symptoms, matrix, labels, smoothing=1.0):
+        self.symptoms = list(symptoms)
+        self.symptom_index = {symptom: i for i, symptom in enumerate(self.symptoms)}
+        self.prognoses, label_ids = np.unique(np.asarray(labels), return_inverse=True)
+        self.prognoses = self.prognoses.tolist()
+
+        # Dataset rows kept as bitsets: 132 symptoms fit in 17 bytes per row
+        self.packed = np.packbits(matrix.astype(bool), axis=1)
+
+        counts = np.zeros((len(self.prognoses), len(self.symptoms)), dtype=np.float64)
+        np.add.at(counts, label_ids, matrix)
+        totals = np.bincount(label_ids, minlength=len(self.prognoses)).astype(np.float64)
+
+        # Laplace-smoothed P(symptom present | prognosis), shape (prognoses, symptoms)
+        present = (counts + smoothing) / (totals[:, None] + 2 * smoothing)
+        self.log_present = np.log(present).T.copy()
+        self.log_absent = np.log1p(-present).T.copy()
+        self.log_prior = np.log(totals / totals.sum())
+
+    @classmethod
+    def from_csv(cls, path=DATASET_PATH, smoothing=1.0):
+        return cls(*load_dataset(path), smoothing=smoothing)
+
+    # Function to build a patient vector from confirmed and denied symptom names.
+    # Names the dataset does not know are ignored.
+    def encode(self, confirmed=(), denied=()):
+        vector = np.zeros(len(self.symptoms), dtype=np.int8)
+        for symptom in denied:
+            index = self.symptom_index.get(symptom)
+            if index is not None:
+                vector[index] = DENIED
+        for symptom in confirmed:
+            index = self.symptom_index.get(symptom)
+            if index is not None:
+                vector[index] = CONFIRMED
+        return vector
+
+    # Function to build a patient vector from ask_follow_up style names ("+itching", "-cough")
+    def encode_symptom_names(self, symptom_names):
+        confirmed = [name[1:] for name in symptom_names if name.startswith("+")]
+        denied = [name[1:] for name in symptom_names if name.startswith("-")]
+        return self.encode(confirmed, denied)
+
+    # Function to score a batch of patient vectors, shape (patients, symptoms), against
+    # every prognosis. Returns posterior probabilities of shape (patients, prognoses).
+    def score_batch(self, vectors):
+        vectors = np.atleast_2d(vectors)
+        confirmed = (vectors == CONFIRMED).astype(np.float64)
+        denied = (vectors == DENIED).astype(np.float64)
+        log_scores = confirmed @ self.log_present + denied @ self.log_absent + self.log_prior
+        log_scores -= log_scores.max(axis=1, keepdims=True)
+        scores = np.exp(log_scores)
+        return scores / scores.sum(axis=1, keepdims=True)
+
+    # Function to score a single patient vector, returning one probability per prognosis
+    def score(self, vector):
+        confirmed = np.flatnonzero(vector == CONFIRMED)
+        denied = np.flatnonzero(vector == DENIED)
+        log_scores = (self.log_present[confirmed].sum(axis=0)
+                      + self.log_absent[denied].sum(axis=0)
+                      + self.log_prior)
+        scores = np.exp(log_scores - log_scores.max())
+        return scores / scores.sum()
+
+    # Function to return the top prognoses as (prognosis, probability), best first
+    def rank(self, vector, top=5):
+        scores = self.score(vector)
+        order = np.argsort(scores)[::-1][:top]
+        return [(self.prognoses[i], float(scores[i])) for i in order]
+
+    # Function to rank every patient in a batch; returns (prognosis indices, probabilities)
+    def rank_batch(self, vectors, top=5):
+        scores = self.score_batch(vectors)
+        order = np.argsort(-scores, axis=1)[:, :top]
+        return order, np.take_along_axis(scores, order, axis=1)
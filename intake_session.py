@@ -0,0 +1,214 @@
+from assessment import build_symptom_pattern, evaluate_diseases, follow_ups_confirm, is_affirmative, is_negative
+from interview_planner import InterviewPlanner
+from metrics import span
+from symptom_matcher import reported_symptoms
+
+# Number of times a yes/no question is asked before the symptom is noted as absent
+MAX_ATTEMPTS = 3
+
+# Patient details asked before the interview, in order
+DETAILS = ("name", "age", "sex", "symptoms")
+
+PROMPTS = {
+    "name": "What is your name?",
+    "age": "How old are you?",
+    "sex": "What is your Gender? (male/female)",
+    "symptoms": "Please describe your symptoms.",
+}
+
+
+# The voice interview of 1)main.py as a state machine driven by one utterance at a time, so
+# a web service can run many interviews without holding anything between requests.
+# A session is a plain JSON-serializable dict:
+#   patient      name, age and sex given so far
+#   description  the patient's own description of the symptoms
+#   detected     {disease: {symptom: confidence}} found in the description
+#   answers      {symptom: bool} for every symptom asked about
+#   phase        "details", "interview" (adaptive questions), "complete" (remaining symptoms
+#                of the relevant diseases, when no prognosis got confident) or "done"
+#   question     the pending question: [detail], ["symptom", symptom] or
+#                ["follow_up", symptom, index]
+#   follow_ups   answers to the follow-up questions of the pending symptom
+#   retries      unclear answers to the pending question
+#   asked        adaptive questions asked so far
+#   ranked       [[prognosis, probability], ...] once the adaptive interview is over
+
+
+# Function to start a session; details already known (e.g. typed into a form) are not asked
+def new_session(knowledge_base, patient_info=None, description=None):
+    patient_info = patient_info or {}
+    session = {
+        "patient": {key: patient_info[key] for key in ("name", "age", "sex") if patient_info.get(key)},
+        "description": description,
+        "detected": {},
+        "answers": {},
+        "phase": "details",
+        "question": None,
+        "follow_ups": [],
+        "retries": 0,
+        "asked": 0,
+        "ranked": [],
+    }
+    if description:
+        with span("symptom_extraction"):
+            session["detected"] = knowledge_base["symptom_matcher"].match_scored(description)
+    advance(session, knowledge_base)
+    return session
+
+
+# Function to return the text of the pending question, or None once the interview is over
+def current_question(session, knowledge_base):
+    question = session["question"]
+    if question is None:
+        return None
+    if question[0] in PROMPTS:
+        return PROMPTS[question[0]]
+    if question[0] == "symptom":
+        return f"Do you have {question[1]}? (yes/no)"
+    return follow_ups_for(knowledge_base, question[1])[question[2]]
+
+
+# Function to find the follow-up questions for a symptom in any disease that has it
+def follow_ups_for(knowledge_base, symptom):
+    for questions in knowledge_base["follow_up_questions"].values():
+        if symptom in questions:
+            return questions[symptom]
+    return []
+
+
+# Function to answer the pending question; returns a message for the patient (empty when
+# the answer was accepted without comment). The session moves on to the next question.
+def submit(session, utterance, knowledge_base):
+    question = session["question"]
+    if question is None:
+        return ""
+    response = utterance.strip().lower()
+    kind = question[0]
+
+    if kind == "name":
+        if not response:
+            return "I did not catch that. Can you please repeat?"
+        session["patient"]["name"] = utterance.strip()
+    elif kind == "age":
+        if not (response.isdigit() and 0 < int(response) < 120):
+            return "Please provide a valid age (a number between 1 and 120)."
+        session["patient"]["age"] = response
+    elif kind == "sex":
+        # Handling common misrecognitions
+        if response in ["male", "m", "mail"]:
+            session["patient"]["sex"] = "male"
+        elif response in ["female", "f"]:
+            session["patient"]["sex"] = "female"
+        else:
+            return "Please specify male or female."
+    elif kind == "symptoms":
+        if not response:
+            return "I did not catch that. Can you please repeat?"
+        session["description"] = utterance.strip()
+        with span("symptom_extraction"):
+            session["detected"] = knowledge_base["symptom_matcher"].match_scored(response)
+    elif kind == "symptom":
+        symptom = question[1]
+        if is_affirmative(response):
+            if follow_ups_for(knowledge_base, symptom):
+                session["question"] = ["follow_up", symptom, 0]
+                session["follow_ups"] = []
+                session["retries"] = 0
+                return ""
+            session["answers"][symptom] = True
+        elif is_negative(response):
+            session["answers"][symptom] = False
+        else:
+            session["retries"] += 1
+            if session["retries"] < MAX_ATTEMPTS:
+                return "I didn't catch that. Can you please say yes or no?"
+            session["answers"][symptom] = False
+            advance(session, knowledge_base)
+            return f"I will note that you do not have {symptom}."
+    else:
+        symptom, index = question[1], question[2]
+        session["follow_ups"].append(response)
+        if index + 1 < len(follow_ups_for(knowledge_base, symptom)):
+            session["question"] = ["follow_up", symptom, index + 1]
+            return ""
+        session["answers"][symptom] = follow_ups_confirm(session["follow_ups"])
+
+    advance(session, knowledge_base)
+    return ""
+
+
+# Function to pick the next question: missing details, then the most informative symptom
+# until one prognosis is confident enough, and only if none got there the unanswered
+# symptoms of every relevant disease. Each symptom is asked at most once.
+def advance(session, knowledge_base):
+    session["retries"] = 0
+    session["follow_ups"] = []
+    if session["phase"] == "details":
+        for detail in DETAILS:
+            known = session["description"] if detail == "symptoms" else session["patient"].get(detail)
+            if not known:
+                session["question"] = [detail]
+                return
+        session["phase"] = "interview"
+
+    answers = session["answers"]
+    if session["phase"] == "interview":
+        with span("question_planning"):
+            planner = InterviewPlanner(knowledge_base["diagnosis_engine"])
+            mentioned = dict.fromkeys(reported_symptoms(session["detected"]), True)
+            planner.restore(dict(mentioned, **answers), session["asked"])
+            symptom = planner.next_symptom()
+        if symptom is not None:
+            session["asked"] = planner.questions
+            session["question"] = ["symptom", symptom]
+            return
+        session["ranked"] = [[prognosis, probability] for prognosis, probability in planner.rank()]
+        # A confident prognosis ends the interview; otherwise the relevant diseases are completed
+        session["phase"] = "done" if planner.confident() else "complete"
+
+    if session["phase"] == "complete":
+        disease_symptoms = knowledge_base["disease_symptoms"]
+        for disease in session["detected"]:
+            for symptom in disease_symptoms[disease]:
+                if symptom not in answers:
+                    session["question"] = ["symptom", symptom]
+                    return
+        session["phase"] = "done"
+    session["question"] = None
+
+
+# Function to evaluate a finished session; returns (patient_info, confirmed_prognoses,
+# not_confirmed_prognoses, ranked_prognoses) as the console interview does
+def evaluate_session(session, knowledge_base):
+    disease_symptoms = knowledge_base["disease_symptoms"]
+    # Symptoms the patient described count as present unless denied
+    known = dict.fromkeys(reported_symptoms(session["detected"]), True)
+    known.update(session["answers"])
+    with span("evaluation"):
+        symptom_patterns = {
+            disease: build_symptom_pattern(disease_symptoms[disease], known)
+            for disease in session["detected"]
+        }
+        confirmed, not_confirmed = evaluate_diseases(symptom_patterns, knowledge_base["disease_matrix"])
+    patient_info = {key: session["patient"].get(key, "N/A") for key in ("name", "age", "sex")}
+    ranked = [(prognosis, probability) for prognosis, probability in session["ranked"]]
+    return patient_info, confirmed, not_confirmed, ranked
+
+
+# Function to list the sentences of the final evaluation, as they are shown and spoken
+def evaluation_lines(confirmed, not_confirmed, ranked=()):
+    lines = []
+    if confirmed:
+        lines.append("Based on your responses, the following conditions may be present:")
+        lines.extend(f"- {disease}" for disease in confirmed)
+    else:
+        lines.append("No specific conditions were confirmed based on the symptoms provided.")
+
+    if not_confirmed:
+        lines.append("The following conditions were considered but not confirmed:")
+        lines.extend(f"- {disease}" for disease in not_confirmed)
+
+    if ranked:
+        lines.append("The most likely conditions according to our symptom database are:")
+        lines.extend(f"- {prognosis} ({probability:.0%})" for prognosis, probability in ranked)
+    return lines
@@ -0,0 +1,83 @@
+import numpy as np
+
+from diagnosis_engine import CONFIRMED, DENIED, UNKNOWN
+
+
+# Function to compute the entropy (in bits) of each probability row
+def entropy(probabilities):
+    safe = np.where(probabilities > 0, probabilities, 1.0)
+    return -(probabilities * np.log2(safe)).sum(axis=-1)
+
+
+# Adaptive interview over the DiagnosisEngine prognoses.
+# The planner keeps the posterior over every prognosis and always proposes the unasked
+# symptom with the highest expected information gain. A symptom shared by several
+# prognoses is a single question, and the interview stops as soon as one prognosis
+# reaches the confidence threshold (or the question budget runs out).
+class InterviewPlanner:
+    def __init__(self, engine, confidence=0.9, max_questions=15, min_gain=1e-3):
+        self.engine = engine
+        self.confidence = confidence
+        self.max_questions = max_questions
+        self.min_gain = min_gain
+        # P(symptom present | prognosis), shape (symptoms, prognoses)
+        self.present = np.exp(engine.log_present)
+        self.vector = np.zeros(len(engine.symptoms), dtype=np.int8)
+        self.posterior = engine.score(self.vector)
+        self.questions = 0
+
+    # Function to record what the patient said about a symptom (unknown names are ignored)
+    def record(self, symptom, present):
+        index = self.engine.symptom_index.get(symptom)
+        if index is None:
+            return
+        self.vector[index] = CONFIRMED if present else DENIED
+        self.posterior = self.engine.score(self.vector)
+
+    # Function to rebuild the planner of an interview from its answers ({symptom: bool}) and
+    # the number of questions already asked, scoring once (web sessions store only these)
+    def restore(self, answers, questions=0):
+        for symptom, present in answers.items():
+            index = self.engine.symptom_index.get(symptom)
+            if index is not None:
+                self.vector[index] = CONFIRMED if present else DENIED
+        self.posterior = self.engine.score(self.vector)
+        self.questions = questions
+
+    # Function to compute the expected information gain of asking each symptom next
+    def expected_information_gain(self):
+        joint_yes = self.present * self.posterior
+        joint_no = self.posterior - joint_yes
+        p_yes = joint_yes.sum(axis=1)
+        p_no = 1.0 - p_yes
+        entropy_yes = entropy(joint_yes / p_yes[:, None])
+        entropy_no = entropy(joint_no / p_no[:, None])
+        gain = entropy(self.posterior) - p_yes * entropy_yes - p_no * entropy_no
+        gain[self.vector != UNKNOWN] = -np.inf
+        return gain
+
+    # Function to check whether one prognosis has reached the confidence threshold
+    def confident(self):
+        return self.posterior.max() >= self.confidence
+
+    # Function to check whether the interview can stop
+    def finished(self):
+        return (self.confident()
+                or self.questions >= self.max_questions
+                or not (self.vector == UNKNOWN).any())
+
+    # Function to pick the next symptom to ask about, or None when the interview is over
+    def next_symptom(self):
+        if self.finished():
+            return None
+        gain = self.expected_information_gain()
+        best = int(np.argmax(gain))
+        if gain[best] < self.min_gain:
+            return None
+        self.questions += 1
+        return self.engine.symptoms[best]
+
+    # Function to return the top prognoses as (prognosis, probability), best first
+    def rank(self, top=3):
+        order = np.argsort(self.posterior)[::-1][:top]
+        return [(self.engine.prognoses[i], float(self.posterior[i])) for i in order]
@@ -0,0 +1,154 @@
+import datetime as dt
+import threading
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from metrics import count, span
+
+
+# Function to return the current time in UTC
+def utc_now():
+    return dt.datetime.now(dt.timezone.utc)
+
+
+# Persistent background job queue stored in a MongoDB collection.
+# Every job document is keyed by its idempotency key, so enqueueing the same work twice is a
+# no-op. Workers lease jobs with an atomic find_one_and_update; a job whose worker died is
+# picked up again once its lease expires. Failures are retried with exponential backoff
+# until `max_attempts`, after which the job is marked failed (as is a job whose worker died
+# on its last attempt). A worker records the outcome only while it still holds the lease.
+class JobQueue:
+    def __init__(self, collection, handlers, workers=4, max_attempts=5, lease_seconds=120, poll_seconds=1.0):
+        self.collection = collection
+        self.handlers = handlers
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    # Function to create the index used to find due jobs
+    def ensure_indexes(self):
+        self.collection.create_index([("status", ASCENDING), ("run_after", ASCENDING)])
+
+    # Function to add a job; returns False if a job with this key already exists
+    def enqueue(self, kind, payload, key):
+        now = utc_now()
+        try:
+            self.collection.insert_one({
+                "_id": key,
+                "kind": kind,
+                "payload": payload,
+                "status": "pending",
+                "attempts": 0,
+                "run_after": now,
+                "created_at": now,
+            })
+        except DuplicateKeyError:
+            return False
+        self._wake.set()
+        return True
+
+    # Function to return the stored state of a job
+    def get(self, key):
+        return self.collection.find_one({"_id": key})
+
+    # Function to lease the next due job (or one whose lease expired with attempts left);
+    # when there is none, jobs abandoned on their last attempt are marked failed
+    def claim(self):
+        now = utc_now()
+        job = self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "run_after": {"$lte": now}},
+                {"status": "running", "locked_until": {"$lte": now}, "attempts": {"$lt": self.max_attempts}},
+            ]},
+            {
+                "$set": {"status": "running", "locked_until": now + dt.timedelta(seconds=self.lease_seconds)},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_after", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is None:
+            self._fail_abandoned(now)
+        return job
+
+    # Function to mark failed the jobs whose worker died (or hung) on their last attempt
+    def _fail_abandoned(self, now):
+        while True:
+            job = self.collection.find_one_and_update(
+                {"status": "running", "locked_until": {"$lte": now}, "attempts": {"$gte": self.max_attempts}},
+                {"$set": {"status": "failed", "error": "lease expired on the last attempt"},
+                 "$unset": {"locked_until": ""}},
+            )
+            if job is None:
+                return
+            print(f"Job {job['_id']} ({job['kind']}) failed: its lease expired on attempt {job['attempts']}")
+            count("jobs_failed", kind=job["kind"])
+
+    # Function to run a leased job and record the outcome; returns "lost" without recording
+    # it if the lease expired and another worker claimed the job meanwhile
+    def run(self, job):
+        try:
+            with span("job", kind=job["kind"]):
+                result = self.handlers[job["kind"]](job["payload"])
+        except Exception as e:
+            print(f"Job {job['_id']} ({job['kind']}) failed on attempt {job['attempts']}: {e}")
+            if job["attempts"] >= self.max_attempts:
+                count("jobs_failed", kind=job["kind"])
+                update = {"status": "failed", "error": str(e)}
+            else:
+                count("job_retries", kind=job["kind"])
+                backoff = dt.timedelta(seconds=2 ** job["attempts"])
+                update = {"status": "pending", "error": str(e), "run_after": utc_now() + backoff}
+        else:
+            update = {"status": "done", "result": result, "finished_at": utc_now()}
+        recorded = self.collection.update_one(
+            {"_id": job["_id"], "status": "running", "attempts": job["attempts"]},
+            {"$set": update, "$unset": {"locked_until": ""}},
+        )
+        if not recorded.matched_count:
+            print(f"Job {job['_id']} ({job['kind']}) lost its lease on attempt {job['attempts']}")
+            count("jobs_lost_lease", kind=job["kind"])
+            return "lost"
+        return update["status"]
+
+    # Function to process due jobs until none are left (useful for scripts and tests)
+    def run_pending(self):
+        processed = 0
+        job = self.claim()
+        while job is not None:
+            self.run(job)
+            processed += 1
+            job = self.claim()
+        return processed
+
+    def _work(self):
+        while not self._stopping.is_set():
+            job = self.claim()
+            if job is None:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+            self.run(job)
+
+    # Function to start the worker threads
+    def start(self):
+        if self._threads:
+            return
+        self.ensure_indexes()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    # Function to stop the worker threads after their current job
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
@@ -0,0 +1,383 @@
+import argparse
+import glob
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from assessment import build_patient_document, is_clear_yes_or_no
+from database import PATIENTS_DB, get_client
+from intake_session import current_question, evaluate_session, evaluation_lines, new_session, submit
+from knowledge_base import load_knowledge_base
+from metrics import count, end_trace, span, start_trace
+from patient_log import open_worker_log
+from patient_store import ensure_patient_indexes
+from speech_output import CACHE_DIR, cache_path
+
+# One session-manager process for many voice assessment kiosks. Instead of one console
+# process per kiosk (1)main.py, each loading the knowledge base and the speech model), every
+# kiosk connection runs the interview of intake_session on its own thread, and all of them
+# share what is expensive and read-only:
+#   - the compiled knowledge base (symptom matcher, diagnosis engine), loaded once
+#   - the recognizer model (a Vosk model is loaded once; each answer gets its own small
+#     KaldiRecognizer on top of it)
+#   - the patient log and the MongoDB client
+# What a kiosk adds is its session dict, its socket and a thread.
+#
+#   python kiosk_manager.py --bind 0.0.0.0:7000 --max-sessions 32
+#   python kiosk_manager.py --replay kiosk_scripts/     (file channels, for testing)
+#
+# Kiosk protocol (TCP): frames of a 1-byte type, a 4-byte big-endian length and the payload.
+#   manager -> kiosk   P prompt text to show and speak
+#                      W prompt audio (WAV) for the P frame that follows, when the prompt is
+#                        pre-rendered in tts_cache/; the kiosk plays it instead of speaking P
+#                      L listen: the patient's answer is expected now
+#                      S stop streaming the answer
+#                      R the result (JSON), after which the connection is closed
+#   kiosk -> manager   A audio of the answer (16-bit mono PCM at 16 kHz, any chunk size)
+#                      E end of the answer's audio (end of speech, or in reply to S)
+#                      T a typed answer (UTF-8), instead of audio
+# Each answer ends with exactly one E or T; a kiosk that already sent it ignores S.
+KIOSK_BIND = os.environ.get("KIOSK_BIND", "0.0.0.0:7000")
+MAX_SESSIONS = int(os.environ.get("KIOSK_MAX_SESSIONS", 32))
+# Seconds a kiosk has to answer (and to finish a frame or an answer after S)
+LISTEN_TIMEOUT = float(os.environ.get("KIOSK_LISTEN_TIMEOUT", 8))
+# Unanswered questions in a row after which the kiosk is taken to be abandoned
+MAX_SILENT_ANSWERS = int(os.environ.get("KIOSK_MAX_SILENT_ANSWERS", 3))
+
+AUDIO, END, TEXT = b"A", b"E", b"T"
+PROMPT, PROMPT_AUDIO, LISTEN, STOP, RESULT = b"P", b"W", b"L", b"S", b"R"
+HEADER = struct.Struct(">cI")
+MAX_FRAME = 1024 * 1024
+
+
+# Function to return the pre-rendered audio of a prompt, or None
+def prompt_audio(message, cache_dir=CACHE_DIR):
+    try:
+        with open(cache_path(message, cache_dir), "rb") as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+# Kiosk channel over a TCP connection (see the protocol above). A dropped connection, a
+# broken frame or a kiosk that stops responding raises ConnectionError.
+class SocketChannel:
+    def __init__(self, connection, name, listen_timeout=LISTEN_TIMEOUT):
+        self.connection = connection
+        self.name = name
+        self.listen_timeout = listen_timeout
+        self._answering = False
+        # Prompts and the listen frame are small writes; do not hold them back for an ACK
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send(self, kind, payload=b""):
+        try:
+            self.connection.sendall(HEADER.pack(kind, len(payload)) + payload)
+        except OSError as e:
+            raise ConnectionError(f"could not send to the kiosk: {e}") from e
+
+    # Function to read `size` bytes; returns None if nothing arrived before the deadline
+    # (LISTEN_TIMEOUT from now without one)
+    def _read(self, size, deadline=None):
+        data = bytearray()
+        while len(data) < size:
+            timeout = self.listen_timeout if deadline is None or data else deadline - time.monotonic()
+            if timeout <= 0:
+                return None
+            self.connection.settimeout(timeout)
+            try:
+                chunk = self.connection.recv(size - len(data))
+            except socket.timeout:
+                if data:
+                    raise ConnectionError("the kiosk stopped in the middle of a frame")
+                return None
+            except OSError as e:
+                raise ConnectionError(f"could not read from the kiosk: {e}") from e
+            if not chunk:
+                raise ConnectionError("the kiosk disconnected")
+            data += chunk
+        return bytes(data)
+
+    # Function to read one frame; returns (None, b"") if none started before the deadline
+    def _receive(self, deadline=None):
+        header = self._read(HEADER.size, deadline)
+        if header is None:
+            return None, b""
+        kind, length = HEADER.unpack(header)
+        if length > MAX_FRAME:
+            raise ConnectionError(f"the kiosk sent a frame of {length} bytes")
+        payload = self._read(length) if length else b""
+        if payload is None:
+            raise ConnectionError("the kiosk stopped in the middle of a frame")
+        if kind in (END, TEXT):
+            self._answering = False
+        return kind, payload
+
+    # Function to show and speak a message on the kiosk
+    def say(self, message):
+        audio = prompt_audio(message)
+        if audio is not None:
+            self._send(PROMPT_AUDIO, audio)
+        self._send(PROMPT, message.encode("utf-8"))
+
+    # Function to stream audio frames until the answer ends or the deadline passes
+    def _audio_chunks(self, first, deadline):
+        yield first
+        while self._answering:
+            kind, payload = self._receive(deadline)
+            if kind is None:
+                return
+            if kind == AUDIO:
+                yield payload
+
+    # Function to get the patient's answer: a typed answer as it is, audio through the
+    # shared recognizer (stopping as soon as `accept_partial` accepts a partial hypothesis);
+    # "" when nothing usable arrived in time
+    def listen(self, recognizer, accept_partial=None):
+        self._answering = True
+        self._send(LISTEN)
+        deadline = time.monotonic() + self.listen_timeout
+        kind, payload = self._receive(deadline)
+        text = ""
+        if kind == TEXT:
+            text = payload.decode("utf-8", "replace").strip()
+        elif kind == AUDIO and recognizer is not None:
+            with span("stt", channel="socket"):
+                text = recognizer.transcribe_stream(self._audio_chunks(payload, deadline), accept_partial)
+        if self._answering:
+            self._send(STOP)
+            while self._answering:
+                if self._receive(time.monotonic() + self.listen_timeout)[0] is None:
+                    raise ConnectionError("the kiosk did not end its answer")
+        return text
+
+    # Function to send the result of the assessment
+    def finish(self, result):
+        self._send(RESULT, json.dumps(result).encode("utf-8"))
+
+
+# Kiosk channel over files, for testing without a kiosk: the answers come from a script,
+# one per line, either the answer's text or the path (relative to the script) of a WAV
+# recording to recognize, and the conversation is written to a transcript next to it
+# ("> " prompts, "< " answers, "= " the result). Running out of answers raises ConnectionError.
+class FileChannel:
+    def __init__(self, script_path, transcript_path=None):
+        with open(script_path, encoding="utf-8") as file:
+            self.answers = [line.rstrip("\n") for line in file]
+        self.name = os.path.basename(script_path)
+        self.directory = os.path.dirname(os.path.abspath(script_path))
+        self.transcript = open(transcript_path or os.path.splitext(script_path)[0] + ".transcript", "w",
+                               encoding="utf-8")
+
+    def say(self, message):
+        self.transcript.write(f"> {message}\n")
+
+    def listen(self, recognizer, accept_partial=None):
+        if not self.answers:
+            raise ConnectionError("the script has no more answers")
+        answer = self.answers.pop(0)
+        if answer.lower().endswith(".wav"):
+            path = os.path.join(self.directory, answer)
+            answer = ""
+            if recognizer is not None:
+                with span("stt", channel="file"):
+                    answer = recognizer.transcribe_file(path, accept_partial)
+        self.transcript.write(f"< {answer}\n")
+        return answer.strip()
+
+    def finish(self, result):
+        self.transcript.write(f"= {json.dumps(result)}\n")
+
+    def close(self):
+        self.transcript.close()
+
+
+# Runs assessment sessions for any number of kiosk channels at once, up to `max_sessions`.
+# The knowledge base and recognizer are only read, so every session thread uses the same
+# objects; each session keeps its own state in an intake_session dict and its own trace.
+class KioskManager:
+    def __init__(self, knowledge_base, recognizer=None, patient_log=None, patients_collection=None,
+                 max_sessions=MAX_SESSIONS):
+        self.knowledge_base = knowledge_base
+        self.recognizer = recognizer
+        self.patient_log = patient_log
+        self.patients_collection = patients_collection
+        self.max_sessions = max_sessions
+        self.active = 0
+        self.completed = 0
+        self._slots = threading.BoundedSemaphore(max_sessions)
+        self._lock = threading.Lock()
+
+    # Function to run one patient's assessment on a channel; returns the result, or None if
+    # the kiosk was turned away or left before the end
+    def run_session(self, channel, wait=False):
+        if not self._slots.acquire(blocking=wait):
+            count("kiosk_sessions_rejected")
+            print(f"Kiosk {channel.name} turned away: {self.max_sessions} sessions are running.")
+            try:
+                channel.say("All assessment lines are busy. Please try again in a moment.")
+            except ConnectionError:
+                pass
+            return None
+        with self._lock:
+            self.active += 1
+        session_id = uuid.uuid4().hex
+        start_trace(session_id)
+        try:
+            result = self._assess(channel, session_id)
+        except ConnectionError as e:
+            print(f"Kiosk {channel.name} left the assessment: {e}")
+            count("kiosk_sessions_abandoned")
+            result = None
+        finally:
+            end_trace()
+            with self._lock:
+                self.active -= 1
+            self._slots.release()
+        if result is not None:
+            with self._lock:
+                self.completed += 1
+        return result
+
+    def _assess(self, channel, session_id):
+        knowledge_base = self.knowledge_base
+        session = new_session(knowledge_base)
+        channel.say("Welcome to the health assessment program.")
+        message, silent = "", 0
+        while True:
+            question = current_question(session, knowledge_base)
+            if message:
+                channel.say(message)
+            if question is None:
+                break
+            channel.say(question)
+            # Yes/no questions stop listening once a partial hypothesis is nothing but yes or no
+            accept_partial = is_clear_yes_or_no if session["question"][0] in ("symptom", "follow_up") else None
+            utterance = channel.listen(self.recognizer, accept_partial)
+            silent = 0 if utterance.strip() else silent + 1
+            if silent >= MAX_SILENT_ANSWERS:
+                channel.say("No answer was heard, so the assessment has ended.")
+                raise ConnectionError(f"{silent} questions went unanswered")
+            message = submit(session, utterance, knowledge_base)
+
+        patient_info, confirmed, not_confirmed, ranked = evaluate_session(session, knowledge_base)
+        document = build_patient_document(patient_info, confirmed, not_confirmed, ranked)
+        document["symptom_description"] = session["description"]
+        with span("storage"):
+            self.store(document)
+
+        result = {
+            "session_id": session_id,
+            "assessment_id": document["_id"],
+            "confirmed": [disease for disease, _ in confirmed],
+            "not_confirmed": [disease for disease, _ in not_confirmed],
+            "ranked": ranked,
+        }
+        for line in evaluation_lines(result["confirmed"], result["not_confirmed"], ranked):
+            channel.say(line)
+        result["booking_url"] = f"/?assessment_id={result['assessment_id']}"
+        channel.finish(result)
+        return result
+
+    # Function to keep an assessment: in the patient log first, then uploaded to MongoDB
+    # (which may lag behind, as in the web service)
+    def store(self, document):
+        if self.patient_log is None:
+            return
+        self.patient_log.append(document)
+        if self.patients_collection is not None:
+            try:
+                self.patient_log.sync(self.patients_collection)
+            except Exception as e:
+                print(f"MongoDB is unavailable, the assessment was kept in the patient log: {e}")
+
+
+class KioskHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        host, port = self.client_address[:2]
+        self.server.manager.run_session(SocketChannel(self.request, f"{host}:{port}"))
+
+
+# TCP server with one thread per connected kiosk
+class KioskServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, address, manager):
+        self.manager = manager
+        super().__init__(address, KioskHandler)
+
+
+# Function to load the configured recognizer backend once for every kiosk, or None (typed
+# answers only) when speech recognition is unavailable
+def load_recognizer(backend=None):
+    if backend == "none":
+        return None
+    try:
+        from speech_input import create_speech_recognizer
+
+        return create_speech_recognizer(backend)
+    except (ImportError, RuntimeError, OSError) as e:
+        print(f"Speech recognition is unavailable ({e}); kiosks can only send typed answers.")
+        return None
+
+
+# Function to run every kiosk script of a directory (*.txt) as its own session, at most
+# `manager.max_sessions` at a time; returns the results
+def replay(manager, directory):
+    channels = [FileChannel(path) for path in sorted(glob.glob(os.path.join(directory, "*.txt")))]
+    try:
+        with ThreadPoolExecutor(max_workers=manager.max_sessions, thread_name_prefix="kiosk") as executor:
+            return list(executor.map(lambda channel: manager.run_session(channel, wait=True), channels))
+    finally:
+        for channel in channels:
+            channel.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run many voice assessment kiosks from one process.")
+    parser.add_argument("--bind", default=KIOSK_BIND, help="host:port the kiosks connect to")
+    parser.add_argument("--max-sessions", type=int, default=MAX_SESSIONS)
+    parser.add_argument("--speech-backend", choices=("vosk", "google", "none"),
+                        default=os.environ.get("SPEECH_BACKEND"))
+    parser.add_argument("--replay", metavar="DIR", help="run the kiosk scripts in DIR instead of listening")
+    args = parser.parse_args(argv)
+
+    knowledge_base = load_knowledge_base()
+    recognizer = load_recognizer(args.speech_backend)
+    patient_log = open_worker_log(name="kiosk")
+    patients_collection = get_client()[PATIENTS_DB]["patients"]
+    try:
+        ensure_patient_indexes(patients_collection)
+        uploaded = patient_log.sync(patients_collection)
+        if uploaded:
+            print(f"Uploaded {uploaded} assessments from the patient log.")
+    except Exception as e:
+        print(f"Could not prepare the patients collection: {e}")
+    manager = KioskManager(knowledge_base, recognizer, patient_log, patients_collection, args.max_sessions)
+
+    try:
+        if args.replay:
+            results = replay(manager, args.replay)
+            print(f"{sum(result is not None for result in results)} of {len(results)} kiosk scripts completed.")
+            return
+        host, port = args.bind.rsplit(":", 1)
+        with KioskServer((host, int(port)), manager) as server:
+            print(f"Waiting for kiosks on {args.bind} (up to {args.max_sessions} sessions)...")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+    finally:
+        patient_log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import copy
+import hashlib
+import json
+import os
+import pickle
+import time
+
+from diagnosis_engine import DATASET_PATH, DiagnosisEngine
+from semantic_matcher import SEMANTIC_MATCHING, load_semantic_matcher
+from symptom_matcher import SymptomMatcher
+
+# Bump whenever the layout of the compiled artifact changes
+FORMAT_VERSION = 2
+
+# Modules whose classes are pickled into the artifact (or that build it); a change to any of
+# them recompiles it
+SOURCE_FILES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ("knowledge_base.py", "symptom_matcher.py", "diagnosis_engine.py")
+]
+
+ARTIFACT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Dataset", "knowledge_base.pickle")
+
+# Define symptoms for multiple diseases (hand-written synonyms, before WordNet expansion)
+DISEASE_SYMPTOMS = {
+    "fungal_infection": {
+        "itching": ["itchy", "scratchy", "pruritus"],
+        "skin rash": ["rash", "red spots", "lesions", "irritation"],
+        "nodal skin eruptions": ["bumps", "lumps", "raised skin", "eruptions"],
+        "dischromic patches": ["discolored skin", "light patches", "dark patches", "pigment changes"]
+    },
+    "allergy": {
+        "sneezing": ["sneeze", "sneezes", "nasal irritation"],
+        "runny nose": ["nasal discharge", "rhinorrhea", "dripping nose"],
+        "itchy eyes": ["irritated eyes", "red eyes", "eye irritation"],
+        "cough": ["coughing", "dry cough", "persistent cough"]
+    }
+}
+
+# Symptom matrix for each disease
+DISEASE_MATRIX = {
+    "fungal_infection": [
+        [1, 1, 1, 1],
+        [1, 1, 1, 0],
+        [1, 1, 0, 0],
+        [0, 0, 1, 0],
+    ],
+    "allergy": [
+        [1, 1, 1, 1],
+        [1, 1, 0, 0],
+        [0, 0, 0, 0],
+    ]
+}
+
+# Follow-up questions asked once a symptom is confirmed
+FOLLOW_UP_QUESTIONS = {
+    "fungal_infection": {
+        "itching": ["Is the itching localized to one area? (yes/no)", "Does the itching worsen at night? (yes/no)"],
+        "skin rash": ["Does the rash appear red and irritated? (yes/no)", "Is the rash spreading? (yes/no)"],
+        "nodal skin eruptions": ["Are the eruptions painful? (yes/no)", "Are the bumps filled with fluid? (yes/no)"],
+        "dischromic patches": ["Are the patches lighter or darker than your skin? (yes/no)", "Are the patches well-defined or blurred? (yes/no)"]
+    },
+    "allergy": {
+        "sneezing": ["Is the sneezing frequent? (yes/no)", "Is it worse in the morning? (yes/no)"],
+        "runny nose": ["Is your nose constantly runny? (yes/no)", "Is nasal discharge clear? (yes/no)"],
+        "itchy eyes": ["Are your eyes red and itchy? (yes/no)", "Do your eyes water frequently? (yes/no)"],
+        "cough": ["Is the cough dry? (yes/no)", "Does the cough worsen at night? (yes/no)"]
+    }
+}
+
+
+# Function to get synonyms from WordNet (imported here so a cached start never loads it)
+def get_synonyms(word):
+    from nltk.corpus import wordnet
+
+    synonyms = set()
+    for syn in wordnet.synsets(word):
+        for lemma in syn.lemmas():
+            synonyms.add(lemma.name().replace('_', ' '))
+    return synonyms
+
+
+# Function to return a copy of the symptom table with WordNet synonyms appended
+def expand_synonyms(disease_symptoms):
+    expanded = copy.deepcopy(disease_symptoms)
+    for symptoms in expanded.values():
+        for symptom, descriptions in symptoms.items():
+            descriptions.extend(sorted(get_synonyms(symptom) - set(descriptions)))
+    return expanded
+
+
+# Function to hash everything the artifact is compiled from: the tables, the dataset and the
+# source of the pickled classes
+def source_hash(dataset_path=DATASET_PATH):
+    digest = hashlib.sha256()
+    tables = [FORMAT_VERSION, DISEASE_SYMPTOMS, DISEASE_MATRIX, FOLLOW_UP_QUESTIONS]
+    digest.update(json.dumps(tables, sort_keys=True).encode("utf-8"))
+    for path in [dataset_path, *SOURCE_FILES]:
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+# Function to compile the knowledge base and write it to disk atomically
+def compile_knowledge_base(path=ARTIFACT_PATH, dataset_path=DATASET_PATH):
+    disease_symptoms = expand_synonyms(DISEASE_SYMPTOMS)
+    knowledge_base = {
+        "format_version": FORMAT_VERSION,
+        "source_hash": source_hash(dataset_path),
+        "disease_symptoms": disease_symptoms,
+        "disease_matrix": copy.deepcopy(DISEASE_MATRIX),
+        "follow_up_questions": copy.deepcopy(FOLLOW_UP_QUESTIONS),
+        "symptom_matcher": SymptomMatcher(disease_symptoms),
+        "diagnosis_engine": DiagnosisEngine.from_csv(dataset_path),
+    }
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        pickle.dump(knowledge_base, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+    return knowledge_base
+
+
+# Function to load the compiled knowledge base, recompiling it when missing or stale
+def load_knowledge_base(path=ARTIFACT_PATH, dataset_path=DATASET_PATH):
+    try:
+        with open(path, "rb") as file:
+            knowledge_base = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        knowledge_base = None
+
+    if (not knowledge_base
+            or knowledge_base.get("format_version") != FORMAT_VERSION
+            or knowledge_base.get("source_hash") != source_hash(dataset_path)):
+        print("Compiling symptom knowledge base...")
+        knowledge_base = compile_knowledge_base(path, dataset_path)
+    if SEMANTIC_MATCHING:
+        # Paraphrase matching over the hand-written synonyms (WordNet lemmas would only add
+        # noise to the embeddings); the vectors are cached next to the artifact
+        knowledge_base["symptom_matcher"].semantic = load_semantic_matcher(
+            DISEASE_SYMPTOMS, knowledge_base["diagnosis_engine"].symptoms
+        )
+    return knowledge_base
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    compile_knowledge_base()
+    print(f"Compiled {ARTIFACT_PATH} in {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    load_knowledge_base()
+    print(f"Loaded it back in {(time.perf_counter() - start) * 1000:.1f} ms")
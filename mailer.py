@@ -0,0 +1,546 @@
+import argparse
+import asyncio
+import datetime as dt
+import os
+import queue
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+from jinja2 import Environment, StrictUndefined
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from database import APPOINTMENTS_DB, get_client
+from metrics import count, span
+
+# SMTP settings, overridable through the environment
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", 587))
+SMTP_USERNAME = os.environ.get("SMTP_USERNAME", "fromemail")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", "password")  # App-specific password
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "1") == "1"
+SMTP_FROM = os.environ.get("SMTP_FROM", SMTP_USERNAME)
+SMTP_POOL_SIZE = int(os.environ.get("SMTP_POOL_SIZE", 2))
+SMTP_RATE = float(os.environ.get("SMTP_RATE", 10))  # messages per second, 0 = unlimited
+
+# Email templates as (subject, body), compiled once at import
+TEMPLATES = {
+    "doctor_confirmation": (
+        "New Appointment Scheduled with {{ patient_name }}",
+        "Dear {{ doctor_name }},\n\nYou have a new appointment.\n\n{{ patient_info }}\n\n"
+        "Time: {{ time_slot }}\nMeet Link: {{ meet_link }}\n\nRegards,\nAppointment System",
+    ),
+    "patient_confirmation": (
+        "Appointment Confirmation with {{ doctor_name }}",
+        "Dear {{ patient_name }},\n\nYour appointment with {{ doctor_name }} is confirmed.\n"
+        "Time: {{ time_slot }}\nMeet Link: {{ meet_link }}\n\nRegards,\nAppointment System",
+    ),
+    "appointment_reminder": (
+        "Reminder: Appointment with {{ doctor_name }} on {{ day }}",
+        "Dear {{ patient_name }},\n\nThis is a reminder of your appointment with {{ doctor_name }}.\n"
+        "Time: {{ day }}, {{ time_slot }}\nMeet Link: {{ meet_link }}\n\nRegards,\nAppointment System",
+    ),
+}
+
+_environment = Environment(undefined=StrictUndefined, keep_trailing_newline=True)
+COMPILED_TEMPLATES = {
+    name: (_environment.from_string(subject), _environment.from_string(body))
+    for name, (subject, body) in TEMPLATES.items()
+}
+
+
+# Function to render a template into (subject, body)
+def render(template, context):
+    subject, body = COMPILED_TEMPLATES[template]
+    return subject.render(context), body.render(context)
+
+
+# Function to tell whether an SMTP error is worth retrying (connection problems and 4xx
+# replies) or permanent (5xx replies such as an unknown recipient)
+def is_transient(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+
+# Function to create the index of the sent-email log (keys of sent emails are kept for
+# `retention` so a repeated send within that time is skipped)
+def ensure_sent_log_indexes(collection, retention=dt.timedelta(days=30)):
+    collection.create_index([("sent_at", ASCENDING)], expireAfterSeconds=int(retention.total_seconds()))
+
+
+# Pool of authenticated SMTP connections.
+# A connection is opened (connect, STARTTLS, login) only when no idle one is left and fewer
+# than `size` are open; it is reused until it has sent `max_messages` messages or was idle
+# longer than `max_idle` seconds (servers drop idle sessions), then replaced.
+class SMTPPool:
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, username=SMTP_USERNAME, password=SMTP_PASSWORD,
+                 starttls=SMTP_STARTTLS, size=SMTP_POOL_SIZE, timeout=30, max_messages=100, max_idle=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.max_idle = max_idle
+        self.opened = 0
+        self._idle = []
+        self._open = 0
+        self._condition = threading.Condition()
+
+    def _connect(self):
+        with span("smtp", operation="connect"):
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                connection.starttls()
+            if self.username and self.password:
+                connection.login(self.username, self.password)
+        connection.sent = 0
+        connection.last_used = time.monotonic()
+        self.opened += 1
+        return connection
+
+    # Function to take a connection out of the pool (waits while all of them are busy)
+    def acquire(self):
+        with self._condition:
+            while True:
+                while self._idle:
+                    connection = self._idle.pop()
+                    if time.monotonic() - connection.last_used < self.max_idle:
+                        return connection
+                    self._discard(connection)
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                self._condition.wait()
+        try:
+            return self._connect()
+        except Exception:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+
+    # Function to give a connection back; broken or worn-out connections are closed
+    def release(self, connection, broken=False):
+        with self._condition:
+            connection.last_used = time.monotonic()
+            if broken or connection.sent >= self.max_messages:
+                self._discard(connection)
+            else:
+                self._idle.append(connection)
+            self._condition.notify()
+
+    def _discard(self, connection):
+        self._open -= 1
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+    # Function to close every idle connection
+    def close(self):
+        with self._condition:
+            while self._idle:
+                self._discard(self._idle.pop())
+
+
+# Sender of templated emails over pooled SMTP connections.
+# deliver() sends one email right away in the caller's thread: a permanent refusal goes to
+# the dead-letter store, a transient failure is raised so the booking apps' persistent
+# send_email jobs (which call it) retry it with backoff.
+# send() queues an email for the background workers instead (one thread per pooled
+# connection, started on first use), which send up to `batch_size` messages per connection
+# checkout. Either way at most `rate` messages per second go out overall. Queued messages
+# that fail transiently are retried on a fresh connection with exponential backoff; those
+# that still fail (or are refused permanently) are kept in the dead-letter store (a MongoDB
+# collection, or the `dead_letters` list without one) and can be sent again later.
+# Emails with a `key` are sent once: the keys of sent emails are kept in the `sent_log`
+# collection (or in memory without one) and a repeated key is skipped.
+class Mailer:
+    def __init__(self, pool=None, from_email=SMTP_FROM, dead_letters=None, batch_size=50, rate=SMTP_RATE,
+                 max_attempts=3, retry_delay=1.0, sent_log=None):
+        self.pool = pool or SMTPPool()
+        self.from_email = from_email
+        self.dead_letter_collection = dead_letters
+        self.dead_letters = []
+        self.sent_log = sent_log
+        self.batch_size = batch_size
+        self.rate = rate
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.sent = 0
+        self.skipped = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._rate_lock = threading.Lock()
+        self._next_send = time.monotonic()
+        self._sent_keys = set()
+        self._queued_keys = set()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    # Function to send an email with a ready subject and body now; returns False without
+    # sending if its key was sent before, or if the server refused it for good (the email is
+    # dead-lettered then). Transient SMTP errors are raised to the caller.
+    def deliver(self, to_email, subject, body, key=None):
+        if self._was_sent(key):
+            self.skipped += 1
+            return False
+        message = {"key": key, "to_email": to_email, "subject": subject, "body": body, "attempts": 1}
+        connection = self.pool.acquire()
+        try:
+            self._throttle()
+            with span("smtp", operation="send"):
+                connection.send_message(self._build(message))
+        except Exception as e:
+            self.pool.release(connection, broken=not isinstance(e, smtplib.SMTPRecipientsRefused))
+            if is_transient(e):
+                raise
+            self._dead_letter(message, e)
+            return False
+        connection.sent += 1
+        self.pool.release(connection)
+        self.sent += 1
+        self._record_sent(message)
+        return True
+
+    # Function to queue an email rendered from one of the TEMPLATES
+    def send(self, to_email, template, context, key=None):
+        subject, body = render(template, context)
+        return self.send_message(to_email, subject, body, key)
+
+    # Function to queue an email with a ready subject and body; returns False if an email
+    # with this key was queued or sent already
+    def send_message(self, to_email, subject, body, key=None):
+        if key is not None:
+            with self._lock:
+                if key in self._queued_keys or self._was_sent(key):
+                    self.skipped += 1
+                    return False
+                self._queued_keys.add(key)
+        self._start()
+        self._queue.put({"key": key, "to_email": to_email, "subject": subject, "body": body, "attempts": 0})
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._threads = [
+                threading.Thread(target=self._work, name=f"mailer-{number}", daemon=True)
+                for number in range(self.pool.size)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    # Function to tell whether the email with this key was sent already
+    def _was_sent(self, key):
+        if key is None:
+            return False
+        if self.sent_log is None:
+            return key in self._sent_keys
+        try:
+            return self.sent_log.count_documents({"_id": key}, limit=1) > 0
+        except PyMongoError as e:
+            print(f"Could not check the sent-email log for {key}: {e}")
+            return False
+
+    # Function to remember the key of a sent email (a crash between the send and this
+    # record can still repeat the email once, an email is never lost)
+    def _record_sent(self, message):
+        key = message["key"]
+        if key is None:
+            return
+        if self.sent_log is None:
+            self._sent_keys.add(key)
+            return
+        try:
+            self.sent_log.insert_one({"_id": key, "to_email": message["to_email"],
+                                      "sent_at": dt.datetime.now(dt.timezone.utc)})
+        except DuplicateKeyError:
+            pass
+        except PyMongoError as e:
+            print(f"Could not record the sent email {key}: {e}")
+
+    # Function to wait until every queued email was sent or dead-lettered
+    def flush(self):
+        self._queue.join()
+
+    # Function to send what is queued and stop the workers
+    def close(self):
+        self.flush()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+        self.pool.close()
+
+    # Function to queue the dead-lettered emails again; returns how many were queued
+    def retry_dead_letters(self):
+        if self.dead_letter_collection is not None:
+            letters = list(self.dead_letter_collection.find())
+            if letters:
+                self.dead_letter_collection.delete_many({"_id": {"$in": [letter["_id"] for letter in letters]}})
+        else:
+            letters, self.dead_letters = self.dead_letters, []
+        for letter in letters:
+            self.send_message(letter["to_email"], letter["subject"], letter["body"], letter.get("key"))
+        return len(letters)
+
+    def _build(self, message):
+        email = EmailMessage()
+        email["From"] = self.from_email
+        email["To"] = message["to_email"]
+        email["Subject"] = message["subject"]
+        email.set_content(message["body"])
+        return email
+
+    # Function to wait for the rate limit (messages are spaced 1/rate seconds apart)
+    def _throttle(self):
+        if not self.rate:
+            return
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_send - now
+            self._next_send = max(now, self._next_send) + 1.0 / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+    def _work(self):
+        while True:
+            message = self._queue.get()
+            if message is None:
+                self._queue.task_done()
+                return
+            batch = [message]
+            while len(batch) < self.batch_size:
+                try:
+                    message = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if message is None:
+                    # Leave the stop marker for this worker's next loop
+                    self._queue.task_done()
+                    self._queue.put(None)
+                    break
+                batch.append(message)
+            self._send_batch(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    # Function to send a batch over pooled connections, retrying transient failures
+    def _send_batch(self, batch):
+        pending = list(batch)
+        while pending:
+            try:
+                connection = self.pool.acquire()
+            except Exception as e:
+                # No connection: every message of the batch failed this attempt
+                pending = self._failed(pending, e)
+                continue
+            try:
+                while pending:
+                    if self._was_sent(pending[0]["key"]):
+                        self.skipped += 1
+                        self._done(pending.pop(0))
+                        continue
+                    self._throttle()
+                    with span("smtp", operation="send"):
+                        connection.send_message(self._build(pending[0]))
+                    connection.sent += 1
+                    self.sent += 1
+                    self._record_sent(pending[0])
+                    self._done(pending.pop(0))
+            except Exception as e:
+                # A refused recipient leaves the session usable, anything else replaces it
+                self.pool.release(connection, broken=not isinstance(e, smtplib.SMTPRecipientsRefused))
+                pending = self._failed(pending[:1], e) + pending[1:]
+            else:
+                self.pool.release(connection)
+
+    # Function to forget the key of a queued message once it was handled
+    def _done(self, message):
+        with self._lock:
+            self._queued_keys.discard(message["key"])
+
+    # Function to handle failed messages: the ones worth another attempt are returned (after
+    # a backoff), the others are moved to the dead-letter store
+    def _failed(self, messages, error):
+        retry = []
+        for message in messages:
+            message["attempts"] += 1
+            if is_transient(error) and message["attempts"] < self.max_attempts:
+                retry.append(message)
+            else:
+                self._dead_letter(message, error)
+                self._done(message)
+        if retry:
+            count("smtp_retries", len(retry))
+            attempts = max(message["attempts"] for message in retry)
+            print(f"Sending {len(retry)} emails failed (attempt {attempts}), retrying: {error}")
+            time.sleep(self.retry_delay * 2 ** (attempts - 1))
+        return retry
+
+    def _dead_letter(self, message, error):
+        print(f"Failed to send email to {message['to_email']}: {error}")
+        self.failed += 1
+        count("email_dead_letters")
+        letter = dict(message, error=str(error), failed_at=dt.datetime.now(dt.timezone.utc))
+        if self.dead_letter_collection is not None:
+            try:
+                self.dead_letter_collection.insert_one(letter)
+                return
+            except Exception as e:
+                print(f"Could not store the dead letter for {message['to_email']}: {e}")
+        self.dead_letters.append(letter)
+
+
+# Function to tell whether an aiosmtplib error is worth retrying (see is_transient)
+def is_transient_async(error):
+    import aiosmtplib
+
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(400 <= refused.code < 500 for refused in error.recipients)
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return 400 <= error.code < 500
+    return isinstance(error, (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError,
+                              aiosmtplib.SMTPTimeoutError, OSError))
+
+
+# Mailer for asyncio code (the async booking service): the same templates and dead-letter
+# store as Mailer, but each send() is awaited by the caller, so several emails can be sent
+# concurrently with asyncio.gather over a pool of up to `size` logged-in aiosmtplib connections.
+class AsyncMailer:
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, username=SMTP_USERNAME, password=SMTP_PASSWORD,
+                 starttls=SMTP_STARTTLS, from_email=SMTP_FROM, dead_letters=None, size=SMTP_POOL_SIZE,
+                 max_attempts=3, retry_delay=1.0, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.from_email = from_email
+        self.dead_letter_collection = dead_letters
+        self.dead_letters = []
+        self.size = size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.opened = 0
+        self.sent = 0
+        self.failed = 0
+        self._idle = []
+        self._slots = None
+
+    async def _acquire(self):
+        # Created lazily so the semaphore belongs to the running event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        await self._slots.acquire()
+        if self._idle:
+            return self._idle.pop()
+        import aiosmtplib
+
+        connection = aiosmtplib.SMTP(hostname=self.host, port=self.port, timeout=self.timeout,
+                                     start_tls=self.starttls)
+        try:
+            with span("smtp", operation="connect"):
+                await connection.connect()
+                if self.username and self.password:
+                    await connection.login(self.username, self.password)
+        except Exception:
+            self._slots.release()
+            raise
+        self.opened += 1
+        return connection
+
+    def _release(self, connection, broken=False):
+        if broken:
+            connection.close()
+        else:
+            self._idle.append(connection)
+        self._slots.release()
+
+    # Function to send an email rendered from one of the TEMPLATES; returns True once it
+    # was accepted, False if it ended up in the dead-letter store
+    async def send(self, to_email, template, context, key=None):
+        subject, body = render(template, context)
+        email = EmailMessage()
+        email["From"] = self.from_email
+        email["To"] = to_email
+        email["Subject"] = subject
+        email.set_content(body)
+
+        for attempt in range(1, self.max_attempts + 1):
+            connection = None
+            try:
+                connection = await self._acquire()
+                with span("smtp", operation="send"):
+                    await connection.send_message(email)
+            except Exception as e:
+                if connection is not None:
+                    self._release(connection, broken=True)
+                if not is_transient_async(e) or attempt == self.max_attempts:
+                    print(f"Failed to send email to {to_email}: {e}")
+                    self.failed += 1
+                    count("email_dead_letters")
+                    await self._dead_letter({"key": key, "to_email": to_email, "subject": subject, "body": body,
+                                             "attempts": attempt}, e)
+                    return False
+                count("smtp_retries")
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+            else:
+                self._release(connection)
+                self.sent += 1
+                return True
+
+    async def _dead_letter(self, message, error):
+        letter = dict(message, error=str(error), failed_at=dt.datetime.now(dt.timezone.utc))
+        if self.dead_letter_collection is not None:
+            try:
+                await self.dead_letter_collection.insert_one(letter)
+                return
+            except Exception as e:
+                print(f"Could not store the dead letter for {message['to_email']}: {e}")
+        self.dead_letters.append(letter)
+
+    # Function to log out of every idle connection
+    async def close(self):
+        while self._idle:
+            connection = self._idle.pop()
+            try:
+                await connection.quit()
+            except Exception:
+                connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the emails that could not be sent.")
+    parser.add_argument("command", choices=["list", "retry"],
+                        help="list: show the dead letters; retry: send them again")
+    parser.add_argument("--mongo", metavar="URI", help="MongoDB URI (default: $MONGO_URI)")
+    parser.add_argument("--database", default=APPOINTMENTS_DB)
+    args = parser.parse_args(argv)
+
+    dead_letters = get_client(args.mongo)[args.database]["email_dead_letters"]
+    if args.command == "list":
+        for letter in dead_letters.find().sort("failed_at", 1):
+            print(f"{letter['failed_at']:%Y-%m-%d %H:%M} {letter['to_email']}: {letter['subject']} ({letter['error']})")
+        return
+    mailer = Mailer(dead_letters=dead_letters)
+    queued = mailer.retry_dead_letters()
+    mailer.close()
+    print(f"Sent {mailer.sent} of {queued} emails, {mailer.failed} failed again.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import bisect
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+# Instrumentation settings, overridable through the environment. METRICS_SAMPLE_RATE times
+# only that fraction of spans (counters stay exact); TRACE_SAMPLE_RATE is the fraction of
+# console sessions that write a trace log.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+METRICS_SAMPLE_RATE = float(os.environ.get("METRICS_SAMPLE_RATE", 1.0))
+METRICS_PREFIX = os.environ.get("METRICS_PREFIX", "doctor_app")
+TRACE_DIR = os.environ.get("TRACE_DIR", "traces")
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", 1.0))
+
+# Upper bounds (seconds) of the latency histogram buckets, from 1 ms to 30 s
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# Process-wide latency histograms and counters.
+# A span is recorded into the histogram `<prefix>_span_seconds` under its name and labels;
+# counters are `<prefix>_<name>_total`. With a sample rate below 1 only that fraction of
+# spans is timed, each weighted by 1/rate so counts and sums stay estimates of the totals.
+class Registry:
+    def __init__(self, prefix=METRICS_PREFIX, sample_rate=METRICS_SAMPLE_RATE, enabled=METRICS_ENABLED):
+        self.prefix = prefix
+        self.sample_rate = sample_rate
+        self.enabled = enabled
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    # Function to decide whether to time the next span
+    def sampled(self):
+        return self.enabled and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    # Function to record one span duration; `labels` is a tuple of (name, value) pairs
+    def observe(self, name, seconds, labels=()):
+        weight = 1.0 if self.sample_rate >= 1 else 1.0 / self.sample_rate
+        index = bisect.bisect_left(BUCKETS, seconds)
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Bucket counts (the last one is +Inf), then the sum and the count
+                histogram = self._histograms[key] = [0.0] * (len(BUCKETS) + 3)
+            histogram[index] += weight
+            histogram[-2] += seconds * weight
+            histogram[-1] += weight
+
+    # Function to add to a counter
+    def inc(self, name, amount=1, labels=()):
+        if not self.enabled:
+            return
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    # Function to return a counter's current value
+    def value(self, name, **labels):
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    # Function to return {span name: (count, total seconds)} summed over all label values
+    def span_totals(self):
+        totals = {}
+        with self._lock:
+            for (name, _), values in self._histograms.items():
+                count, seconds = totals.get(name, (0.0, 0.0))
+                totals[name] = (count + values[-1], seconds + values[-2])
+        return totals
+
+    # Function to render every metric in the Prometheus text format
+    def render(self):
+        with self._lock:
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+            counters = dict(self._counters)
+        lines = []
+        if histograms:
+            name = f"{self.prefix}_span_seconds"
+            lines.append(f"# HELP {name} Duration of instrumented operations.")
+            lines.append(f"# TYPE {name} histogram")
+            for (span_name, labels), values in sorted(histograms.items()):
+                base = (("span", span_name),) + labels
+                cumulative = 0.0
+                for bound, bucket_count in zip(BUCKETS + ("+Inf",), values):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{format_labels(base + (('le', str(bound)),))} {cumulative:g}")
+                lines.append(f"{name}_sum{format_labels(base)} {values[-2]:.6f}")
+                lines.append(f"{name}_count{format_labels(base)} {values[-1]:g}")
+        for counter in sorted({name for name, _ in counters}):
+            name = f"{self.prefix}_{counter}_total"
+            lines.append(f"# TYPE {name} counter")
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == counter:
+                    lines.append(f"{name}{format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+# Function to format labels as {name="value",...}
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+# Per-session trace log: one JSON line per finished span, with its start (seconds since the
+# session began), duration, labels and thread, in traces/<session_id>.jsonl
+class Trace:
+    def __init__(self, session_id=None, directory=TRACE_DIR):
+        self.session_id = session_id or uuid.uuid4().hex
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{self.session_id}.jsonl")
+        self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    # Function to write one span
+    def record(self, name, started, seconds, labels, error=None):
+        entry = {"span": name, "start": round(started - self._started, 6), "seconds": round(seconds, 6)}
+        if labels:
+            entry["labels"] = dict(labels)
+        entry["thread"] = threading.current_thread().name
+        if error is not None:
+            entry["error"] = error
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+registry = Registry()
+
+# Trace of the current session: set per context (e.g. per request or kiosk thread), with a
+# process-wide fallback for the console flow, whose speech worker thread has no context of its own
+_current_trace = contextvars.ContextVar("trace", default=None)
+_process_trace = None
+
+
+# Function to start tracing a session (or not, depending on TRACE_SAMPLE_RATE); returns the
+# Trace, or None when the session was not sampled
+def start_trace(session_id=None, directory=TRACE_DIR, sample_rate=TRACE_SAMPLE_RATE, process_wide=False):
+    global _process_trace
+    if not registry.enabled or random.random() >= sample_rate:
+        return None
+    trace = Trace(session_id, directory)
+    _current_trace.set(trace)
+    if process_wide:
+        _process_trace = trace
+    return trace
+
+
+# Function to stop tracing the current session
+def end_trace():
+    global _process_trace
+    trace = _current_trace.get() or _process_trace
+    if trace is not None:
+        trace.close()
+    _current_trace.set(None)
+    if _process_trace is trace:
+        _process_trace = None
+
+
+# Function to time a block: records its duration into the span histogram (and the trace of
+# the current session) and counts a failure if it raises. `labels` become metric labels,
+# so keep their values few (an operation name, not an ID).
+# Spans that are neither sampled nor traced get a shared no-op context, so they cost little more
+# than the sampling decision.
+def span(name, **labels):
+    trace = _current_trace.get() or _process_trace
+    sampled = registry.sampled()
+    if trace is None and not sampled:
+        return _UNTIMED
+    return _timed_span(name, labels, trace, sampled)
+
+
+_UNTIMED = nullcontext()
+
+
+@contextmanager
+def _timed_span(name, labels, trace, sampled):
+    label_items = tuple(sorted(labels.items()))
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        seconds = time.perf_counter() - started
+        registry.inc("failures", labels=(("span", name),) + label_items)
+        if trace is not None:
+            trace.record(name, started, seconds, label_items, error=type(e).__name__)
+        if sampled:
+            registry.observe(name, seconds, label_items)
+        raise
+    seconds = time.perf_counter() - started
+    if trace is not None:
+        trace.record(name, started, seconds, label_items)
+    if sampled:
+        registry.observe(name, seconds, label_items)
+
+
+# Function to record a span measured elsewhere (e.g. reported by a driver's event listener)
+def record_span(name, seconds, failed=False, **labels):
+    label_items = tuple(sorted(labels.items()))
+    if failed:
+        registry.inc("failures", labels=(("span", name),) + label_items)
+    trace = _current_trace.get() or _process_trace
+    if trace is not None:
+        trace.record(name, time.perf_counter() - seconds, seconds, label_items, error="failed" if failed else None)
+    if registry.sampled():
+        registry.observe(name, seconds, label_items)
+
+
+# Function to count an event (retries, dead letters, ...)
+def count(name, amount=1, **labels):
+    registry.inc(name, amount, tuple(sorted(labels.items())))
+
+
+# Function to add a /metrics endpoint and request timing to a Flask app
+def instrument_flask(app):
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = getattr(g, "request_started", None)
+        if started is not None and request.endpoint != "prometheus_metrics":
+            record_request_metrics(request.endpoint, request.method, response.status_code, started)
+        return response
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+# Function to add a /metrics endpoint and request timing to a Quart app
+def instrument_quart(app):
+    from quart import Response, g, request
+
+    @app.before_request
+    async def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    async def record_request(response):
+        started = getattr(g, "request_started", None)
+        if started is not None and request.endpoint != "prometheus_metrics":
+            record_request_metrics(request.endpoint, request.method, response.status_code, started)
+        return response
+
+    @app.route('/metrics')
+    async def prometheus_metrics():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+# Function to record one HTTP request (the span is timed only if sampled; the count is exact)
+def record_request_metrics(endpoint, method, status, started):
+    endpoint = endpoint or "unknown"
+    count("http_requests", endpoint=endpoint, method=method, status=status)
+    if registry.sampled():
+        registry.observe("http", time.perf_counter() - started, (("endpoint", endpoint), ("method", method)))
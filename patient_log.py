@@ -0,0 +1,396 @@
+import argparse
+import bisect
+import datetime as dt
+import gzip
+import json
+import os
+import sys
+import threading
+
+from pymongo import ReplaceOne
+
+from database import PATIENTS_DB, get_client
+
+# Directory of the log, overridable through the environment
+PATIENT_LOG_DIR = os.environ.get("PATIENT_LOG_DIR", "patient_log")
+
+# Uncompressed size of the independently compressed blocks of a rotated segment; reading one
+# record decompresses at most one block
+BLOCK_SIZE = 64 * 1024
+
+
+# Function to encode datetimes as {"$date": "..."} (MongoDB extended JSON) so they are read back as datetimes
+def _encode(value):
+    if isinstance(value, dt.datetime):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Cannot store {type(value).__name__} in the patient log")
+
+
+def _decode(document):
+    if len(document) == 1 and "$date" in document:
+        return dt.datetime.fromisoformat(document["$date"])
+    return document
+
+
+# Function to serialize one record as one JSON line
+def dump_record(record):
+    return (json.dumps(record, default=_encode, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+# Function to parse one JSON line back into a record
+def load_record(line):
+    return json.loads(line, object_hook=_decode)
+
+
+# Append-only log of assessment records.
+# Records are stored as JSON lines in numbered segments (patients-000001.jsonl, ...). When a
+# segment reaches `max_bytes` a new one is started and the old one is compressed in the
+# background into gzip blocks (patients-000001.jsonl.gz plus a .blocks table). Every segment
+# has a sidecar index (.idx) with the offset of each record by assessment ID, patient ID and
+# date, so one record is read with a seek. The log also serves as a write-ahead buffer for
+# MongoDB: sync() uploads everything after a checkpoint, so records logged while the database
+# was down are stored once it is back.
+# A log opened with read_only=True leaves the files as they are (no repair, no index lines,
+# no compression), so it can be read while another process is writing to it.
+class PatientLog:
+    def __init__(self, directory=PATIENT_LOG_DIR, max_bytes=64 * 1024 * 1024, compress=True, fsync=True,
+                 read_only=False):
+        self.directory = directory
+        self.read_only = read_only
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._compressing = []
+        self._by_id = {}
+        self._by_patient = {}
+        self._by_date = {}
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _path(self, segment, suffix):
+        return os.path.join(self.directory, f"patients-{segment:06d}{suffix}")
+
+    def _segments(self):
+        segments = set()
+        if not os.path.isdir(self.directory):
+            return []
+        for name in os.listdir(self.directory):
+            if name.startswith("patients-") and name.endswith((".jsonl", ".jsonl.gz")):
+                segments.add(int(name[len("patients-"):].split(".")[0]))
+        return sorted(segments)
+
+    def _add_to_index(self, entry):
+        position = (entry["segment"], entry["offset"], entry["length"])
+        self._by_id[entry["id"]] = position
+        self._by_patient.setdefault(entry.get("patient_id"), []).append(position)
+        self._by_date.setdefault(entry.get("date"), []).append(position)
+
+    # Function to load the indexes, repair the active segment after a crash (drop a torn last
+    # line, index records whose index line was lost) and finish interrupted compressions.
+    # Read-only, records without an index line are indexed in memory and nothing is repaired.
+    def _load(self):
+        segments = self._segments() or [1]
+        for segment in segments:
+            if os.path.exists(self._path(segment, ".idx")):
+                with open(self._path(segment, ".idx"), encoding="utf-8") as index_file:
+                    for line in index_file:
+                        if line.endswith("\n"):
+                            self._add_to_index(json.loads(line))
+        self.segment = segments[-1]
+        path = self._path(self.segment, ".jsonl")
+        if not os.path.exists(path) and os.path.exists(path + ".gz"):
+            self.segment += 1
+            path = self._path(self.segment, ".jsonl")
+
+        indexed_end = max(
+            (offset + length for segment, offset, length in self._by_id.values() if segment == self.segment), default=0
+        )
+        if self.read_only:
+            if os.path.exists(path):
+                with open(path, "rb") as data_file:
+                    self._index_tail(data_file, indexed_end)
+            return
+        with open(path, "ab+") as data_file:
+            data_file.truncate(self._index_tail(data_file, indexed_end))
+        self._data_file = open(path, "ab")
+        self._index_file = open(self._path(self.segment, ".idx"), "a", encoding="utf-8")
+
+        for segment in segments:
+            if segment != self.segment and os.path.exists(self._path(segment, ".jsonl")):
+                self._compress_later(segment)
+
+    # Function to index the whole records of the active segment from `offset` on; returns
+    # where the last one ends
+    def _index_tail(self, data_file, offset):
+        data_file.seek(offset)
+        for line in data_file:
+            if not line.endswith(b"\n"):
+                break
+            self._index_record(load_record(line), self.segment, offset, len(line))
+            offset += len(line)
+        return offset
+
+    def _index_record(self, record, segment, offset, length, index_file=None):
+        assessed_at = record.get("assessed_at")
+        entry = {
+            "id": record["_id"],
+            "patient_id": record.get("patient_id"),
+            "date": assessed_at.date().isoformat() if isinstance(assessed_at, dt.datetime) else None,
+            "segment": segment,
+            "offset": offset,
+            "length": length,
+        }
+        self._add_to_index(entry)
+        if self.read_only:
+            return
+        if index_file is None:
+            with open(self._path(segment, ".idx"), "a", encoding="utf-8") as index_file:
+                index_file.write(json.dumps(entry) + "\n")
+        else:
+            index_file.write(json.dumps(entry) + "\n")
+
+    # Function to append one record (it must have an "_id"); returns once it is on disk
+    def append(self, record):
+        if self.read_only:
+            raise RuntimeError("The patient log is open read-only")
+        line = dump_record(record)
+        with self._lock:
+            if self._data_file.tell() and self._data_file.tell() + len(line) > self.max_bytes:
+                self._rotate()
+            offset = self._data_file.tell()
+            self._data_file.write(line)
+            self._data_file.flush()
+            if self.fsync:
+                os.fsync(self._data_file.fileno())
+            # The index line is written after the record, so a crash in between is repaired on load
+            self._index_record(record, self.segment, offset, len(line), self._index_file)
+            self._index_file.flush()
+
+    def _rotate(self):
+        self._data_file.close()
+        self._index_file.close()
+        finished = self.segment
+        self.segment += 1
+        self._data_file = open(self._path(self.segment, ".jsonl"), "ab")
+        self._index_file = open(self._path(self.segment, ".idx"), "a", encoding="utf-8")
+        self._compress_later(finished)
+
+    def _compress_later(self, segment):
+        if not self.compress:
+            return
+        thread = threading.Thread(target=self._compress, args=(segment,), name=f"patient-log-gzip-{segment}", daemon=True)
+        self._compressing.append(thread)
+        thread.start()
+
+    # Function to compress a finished segment into gzip blocks of whole records. The .blocks
+    # table maps the uncompressed offset of each block to its offset in the .gz file, so the
+    # offsets in the index stay valid.
+    def _compress(self, segment):
+        source = self._path(segment, ".jsonl")
+        blocks = []
+        with open(source, "rb") as plain, open(source + ".gz.tmp", "wb") as packed:
+            uncompressed = 0
+            while True:
+                chunk = plain.read(BLOCK_SIZE)
+                if not chunk:
+                    break
+                chunk += plain.readline()
+                blocks.append((uncompressed, packed.tell()))
+                packed.write(gzip.compress(chunk))
+                uncompressed += len(chunk)
+            packed.flush()
+            os.fsync(packed.fileno())
+        with open(self._path(segment, ".blocks.tmp"), "w", encoding="utf-8") as table:
+            json.dump(blocks, table)
+        with self._lock:
+            os.replace(self._path(segment, ".blocks.tmp"), self._path(segment, ".blocks"))
+            os.replace(source + ".gz.tmp", source + ".gz")
+            os.remove(source)
+
+    # Function to wait for background compressions (used before exiting and by the CLI)
+    def wait(self):
+        for thread in list(self._compressing):
+            thread.join()
+        self._compressing = []
+
+    # Function to open a segment positioned at an uncompressed offset (call with the lock
+    # held); returns the stream to read and the files to close afterwards
+    def _open_at(self, segment, offset):
+        path = self._path(segment, ".jsonl")
+        if os.path.exists(path):
+            data_file = open(path, "rb")
+            data_file.seek(offset)
+            return data_file, [data_file]
+        with open(self._path(segment, ".blocks"), encoding="utf-8") as table:
+            blocks = json.load(table)
+        block = bisect.bisect_right([start for start, _ in blocks], offset) - 1
+        start, packed_offset = blocks[block]
+        raw = open(path + ".gz", "rb")
+        raw.seek(packed_offset)
+        # GzipFile reads on through the following blocks (gzip members) if needed
+        data_file = gzip.GzipFile(fileobj=raw)
+        data_file.read(offset - start)
+        return data_file, [data_file, raw]
+
+    def _read(self, position):
+        segment, offset, length = position
+        with self._lock:
+            data_file, handles = self._open_at(segment, offset)
+            try:
+                return load_record(data_file.read(length))
+            finally:
+                for handle in handles:
+                    handle.close()
+
+    # Function to read one assessment by its ID (None if it is not in the log)
+    def get(self, assessment_id):
+        position = self._by_id.get(assessment_id)
+        return self._read(position) if position else None
+
+    # Function to read the assessments of a patient and/or of a date ("YYYY-MM-DD", UTC), oldest first
+    def find(self, patient_id=None, date=None):
+        if patient_id is not None:
+            positions = self._by_patient.get(patient_id, [])
+            if date is not None:
+                on_date = set(self._by_date.get(date, []))
+                positions = [position for position in positions if position in on_date]
+        elif date is not None:
+            positions = self._by_date.get(date, [])
+        else:
+            positions = sorted(self._by_id.values())
+        return [self._read(position) for position in positions]
+
+    # Function to stream every record from a position on, yielding (segment, end offset, record)
+    def records_from(self, segment=1, offset=0):
+        for current in self._segments():
+            if current < segment:
+                continue
+            position = offset if current == segment else 0
+            with self._lock:
+                data_file, handles = self._open_at(current, position)
+            try:
+                for line in data_file:
+                    if not line.endswith(b"\n"):
+                        break
+                    position += len(line)
+                    yield current, position, load_record(line)
+            finally:
+                for handle in handles:
+                    handle.close()
+
+    # Function to stream every record of the log, oldest first
+    def __iter__(self):
+        return (record for _, _, record in self.records_from())
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def _checkpoint_path(self, name):
+        return os.path.join(self.directory, f"{name}.checkpoint")
+
+    # Function to upload the records not yet in `collection` (everything after its checkpoint)
+    # in batches; replaces by _id, so records are never duplicated if a batch is sent twice.
+    # Returns the number of records uploaded; raises PyMongoError if the database is unreachable.
+    def sync(self, collection, batch_size=500):
+        with self._sync_lock:
+            checkpoint_path = self._checkpoint_path(collection.name)
+            segment, offset = 1, 0
+            if os.path.exists(checkpoint_path):
+                with open(checkpoint_path, encoding="utf-8") as checkpoint:
+                    segment, offset = json.load(checkpoint)
+
+            uploaded = 0
+            operations = []
+
+            def upload(position):
+                collection.bulk_write(operations, ordered=False)
+                with open(checkpoint_path + ".tmp", "w", encoding="utf-8") as checkpoint:
+                    json.dump(position, checkpoint)
+                os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+            position = None
+            for current, end, record in self.records_from(segment, offset):
+                operations.append(ReplaceOne({"_id": record["_id"]}, record, upsert=True))
+                position = [current, end]
+                if len(operations) >= batch_size:
+                    upload(position)
+                    uploaded += len(operations)
+                    operations = []
+            if operations:
+                upload(position)
+                uploaded += len(operations)
+            return uploaded
+
+    def close(self):
+        if not self.read_only:
+            with self._lock:
+                self._data_file.close()
+                self._index_file.close()
+        self.wait()
+
+
+# Function to open a log of its own for one process of a multi-process server. A log has a
+# single writer, so each process locks the first free numbered directory (web-0, web-1, ...)
+# under `directory`; a restarted process takes over a directory and uploads what is left in it.
+def open_worker_log(directory=PATIENT_LOG_DIR, name="web"):
+    try:
+        import fcntl
+    except ImportError:  # Windows: a single server process
+        fcntl = None
+    number = 0
+    while True:
+        worker_directory = os.path.join(directory, f"{name}-{number}")
+        os.makedirs(worker_directory, exist_ok=True)
+        lock_file = open(os.path.join(worker_directory, "lock"), "w")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                number += 1
+                continue
+        patient_log = PatientLog(worker_directory)
+        # Held (and the directory locked) for the lifetime of the process
+        patient_log.lock_file = lock_file
+        return patient_log
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read the patient log or upload it to MongoDB.")
+    parser.add_argument("command", choices=["get", "find", "dump", "sync"],
+                        help="get: one assessment by ID; find: by --patient-id/--date; dump: every record as JSONL; "
+                             "sync: upload records not yet in MongoDB")
+    parser.add_argument("assessment_id", nargs="?")
+    parser.add_argument("--patient-id")
+    parser.add_argument("--date", help="YYYY-MM-DD (UTC)")
+    parser.add_argument("--log-dir", default=PATIENT_LOG_DIR)
+    parser.add_argument("--mongo", metavar="URI", help="MongoDB URI (default: $MONGO_URI)")
+    parser.add_argument("--database", default=PATIENTS_DB)
+    parser.add_argument("--collection", default="patients")
+    args = parser.parse_args(argv)
+
+    # Only sync needs the writer; the others read alongside a running app
+    patient_log = PatientLog(args.log_dir, read_only=args.command != "sync")
+    if args.command == "get":
+        record = patient_log.get(args.assessment_id)
+        if record is None:
+            print(f"No assessment {args.assessment_id} in the log.")
+        else:
+            sys.stdout.write(dump_record(record).decode("utf-8"))
+    elif args.command == "find":
+        for record in patient_log.find(args.patient_id, args.date):
+            sys.stdout.write(dump_record(record).decode("utf-8"))
+    elif args.command == "dump":
+        for record in patient_log:
+            sys.stdout.write(dump_record(record).decode("utf-8"))
+    else:
+        uploaded = patient_log.sync(get_client(args.mongo)[args.database][args.collection])
+        print(f"Uploaded {uploaded} records to {args.database}.{args.collection}.")
+    patient_log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import argparse
+import datetime as dt
+import unicodedata
+import uuid
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.collation import Collation
+
+from database import PATIENTS_DB, get_client
+
+# Names are compared ignoring case and accents ("José" == "jose"); the name index is built
+# with this collation and queries must pass the same one to be answered from it
+NAME_COLLATION = Collation(locale="en", strength=1)
+
+
+# Function to normalize a name for lookups: Unicode NFKC, case folded, single spaces
+def normalize_name(name):
+    return " ".join(unicodedata.normalize("NFKC", str(name)).casefold().split())
+
+
+# Function to create a new patient or assessment ID
+def new_id():
+    return uuid.uuid4().hex
+
+
+# Function to build diagnosis details with symptom evaluation
+def build_diagnosis_details(diagnoses):
+    details = []
+    for diag in diagnoses:
+        disease = diag.get("disease", "N/A")
+        symptoms = "\n  ".join(diag.get("symptom_evaluation", [])) or "None"
+        details.append(f"- {disease}\n  Symptom Evaluation:\n  {symptoms}")
+    return "\n".join(details)
+
+
+# Function to describe an assessment for the Calendar event and the doctor's email
+def build_patient_info(assessment):
+    confirmed = build_diagnosis_details(assessment.get("confirmed_diagnoses", [])) or "None"
+    unconfirmed = build_diagnosis_details(assessment.get("unconfirmed_diagnoses", [])) or "None"
+    return (
+        f"Patient Name: {assessment.get('name', 'N/A')}\n"
+        f"Age: {assessment.get('age', 'N/A')}\n"
+        f"Sex: {assessment.get('sex', 'N/A')}\n\n"
+        f"Confirmed Diagnoses:\n{confirmed}\n\n"
+        f"Unconfirmed Diagnoses:\n{unconfirmed}"
+    )
+
+
+# Function to create the indexes of the patients collection
+def ensure_patient_indexes(collection):
+    collection.create_index(
+        [("name_normalized", ASCENDING), ("assessed_at", DESCENDING)], collation=NAME_COLLATION
+    )
+    collection.create_index([("patient_id", ASCENDING), ("assessed_at", DESCENDING)])
+
+
+# Function to build the query of find_assessment as (filter, find_one options), or None
+def assessment_query(assessment_id=None, patient_id=None, name=None):
+    if assessment_id:
+        return {"_id": assessment_id}, {}
+    if patient_id:
+        return {"patient_id": patient_id}, {"sort": [("assessed_at", DESCENDING)]}
+    if name:
+        return {"name_normalized": normalize_name(name)}, {"sort": [("assessed_at", DESCENDING)], "collation": NAME_COLLATION}
+    return None
+
+
+# Function to find an assessment record: by its ID, or else the latest one of a patient or
+# of a name. Each case is one indexed find_one sorted on the server.
+def find_assessment(collection, assessment_id=None, patient_id=None, name=None):
+    query = assessment_query(assessment_id, patient_id, name)
+    if query is None:
+        return None
+    query_filter, options = query
+    return collection.find_one(query_filter, **options)
+
+
+# Function to add name_normalized/assessed_at/patient_id to records stored before they
+# existed; returns the number of records updated
+def backfill_patients(collection, batch_size=1000):
+    operations = []
+    updated = 0
+    for record in collection.find({"name_normalized": {"$exists": False}}, {"name": 1}):
+        fields = {"name_normalized": normalize_name(record.get("name", "")), "patient_id": new_id()}
+        # Old records have ObjectIds, whose timestamp is when they were assessed
+        if hasattr(record["_id"], "generation_time"):
+            fields["assessed_at"] = record["_id"].generation_time
+        else:
+            fields["assessed_at"] = dt.datetime.now(dt.timezone.utc)
+        operations.append(UpdateOne({"_id": record["_id"]}, {"$set": fields}))
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+    return updated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the patients collection.")
+    parser.add_argument("command", choices=["backfill"],
+                        help="backfill: add the lookup fields to old records and create the indexes")
+    parser.add_argument("--mongo", metavar="URI", help="MongoDB URI (default: $MONGO_URI)")
+    parser.add_argument("--database", default=PATIENTS_DB)
+    parser.add_argument("--collection", default="patients")
+    args = parser.parse_args(argv)
+
+    collection = get_client(args.mongo)[args.database][args.collection]
+    updated = backfill_patients(collection)
+    ensure_patient_indexes(collection)
+    print(f"Updated {updated} patient records.")
+
+
+if __name__ == "__main__":
+    main()
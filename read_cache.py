@@ -0,0 +1,217 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, request
+
+# Tag of the cached doctor listing; every other entry is tagged with its doctor's _id
+DOCTORS_TAG = "doctors"
+
+# Fields of a doctor document that appear in the doctor listing
+LISTING_FIELDS = ("doctor_name", "qualification", "specialization")
+
+
+# Function to connect to a Redis-compatible server (Redis, KeyDB, Dragonfly...) used as a
+# second cache level shared by all app processes; returns None when not configured
+def connect_redis(url):
+    if not url:
+        return None
+    import redis
+
+    return redis.Redis.from_url(url)
+
+
+# In-process read-through cache for JSON API responses.
+# Entries are kept in LRU order and each carries the ETag of its body and the tags of the
+# data it was built from (the doctor listing, or one doctor's slots); invalidating a tag
+# drops exactly the entries that depend on it. `max_age` bounds how long an entry is
+# served, for answers that change with the clock (slots that have started disappear).
+# With a Redis client the entries are also shared between processes.
+class ReadCache:
+    def __init__(self, maxsize=1024, max_age=60, redis_client=None, prefix="read_cache"):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.redis = redis_client
+        self.prefix = prefix
+        # Set while change streams deliver invalidations (see watch_changes)
+        self.watching = False
+        self.hits = 0
+        self.misses = 0
+        # Bumped by every invalidation; a body loaded across an invalidation of one of its
+        # tags is not stored
+        self.generation = 0
+        self._invalidated_at = {}
+        self._cleared_at = 0
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def _redis_key(self, key):
+        return f"{self.prefix}:{json.dumps(key)}"
+
+    # Function to return the cached (etag, body) of a key, or None
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[3] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], entry[1]
+        if self.redis is not None:
+            shared = self.redis.get(self._redis_key(key))
+            if shared is not None:
+                shared = json.loads(shared)
+                self._store(key, shared["etag"], shared["body"].encode(), shared["tags"])
+                with self._lock:
+                    self.hits += 1
+                return shared["etag"], shared["body"].encode()
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _store(self, key, etag, body, tags):
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (etag, body, tags, time.monotonic() + self.max_age)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            for tag in entry[2]:
+                keys = self._tags.get(tag)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._tags[tag]
+
+    # Function to cache a response body under a key with the tags it depends on; returns its
+    # ETag. `generation` is the cache generation read before the body was loaded.
+    def set(self, key, body, tags, generation):
+        etag = hashlib.sha1(body).hexdigest()
+        with self._lock:
+            stale = generation < self._cleared_at or any(
+                generation < self._invalidated_at.get(tag, 0) for tag in tags
+            )
+        if stale:
+            return etag
+        self._store(key, etag, body, list(tags))
+        if self.redis is not None:
+            redis_key = self._redis_key(key)
+            pipe = self.redis.pipeline()
+            pipe.set(redis_key, json.dumps({"etag": etag, "body": body.decode(), "tags": list(tags)}), ex=self.max_age)
+            for tag in tags:
+                pipe.sadd(f"{self.prefix}:tag:{tag}", redis_key)
+            pipe.execute()
+        return etag
+
+    # Function to drop every entry that depends on one of the tags
+    def invalidate(self, *tags):
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                self._invalidated_at[tag] = self.generation
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+        if self.redis is not None:
+            for tag in tags:
+                tag_key = f"{self.prefix}:tag:{tag}"
+                keys = self.redis.smembers(tag_key)
+                self.redis.delete(tag_key, *keys)
+
+    # Function to invalidate after a write, unless change streams already take care of it
+    def note_write(self, *tags):
+        if not self.watching:
+            self.invalidate(*tags)
+
+    # Function to drop everything
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._cleared_at = self.generation
+            self._invalidated_at.clear()
+            self._entries.clear()
+            self._tags.clear()
+        if self.redis is not None:
+            for key in self.redis.scan_iter(f"{self.prefix}:*"):
+                self.redis.delete(key)
+
+
+# Function to answer a GET/POST with a cached JSON body (and 304 when the client's
+# If-None-Match still matches). `loader` returns (payload, status, tags); only 200
+# answers are cached.
+def cached_json_response(cache, key, loader):
+    cached = cache.get(key)
+    if cached is None:
+        generation = cache.generation
+        payload, status, tags = loader()
+        body = json.dumps(payload, sort_keys=True).encode()
+        if status != 200:
+            return current_app.response_class(body, status=status, mimetype="application/json")
+        etag = cache.set(key, body, tags, generation)
+    else:
+        etag, body = cached
+    response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    # Browsers keep the body but revalidate it with If-None-Match on every request
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
+# Function to translate one change stream event into cache tags
+def tags_for_change(collection_name, change):
+    operation = change["operationType"]
+    if operation in ("drop", "rename", "dropDatabase", "invalidate"):
+        return None  # everything
+    document_id = str(change["documentKey"]["_id"])
+    if collection_name == "appointments":
+        tags = [document_id]
+        updated = change.get("updateDescription", {}).get("updatedFields", {})
+        if operation != "update" or any(field.split(".")[0] in LISTING_FIELDS for field in updated):
+            tags.append(DOCTORS_TAG)
+        return tags
+    if collection_name == "slots":
+        # Slot IDs are "<doctor_id>-<start>"
+        return [document_id.rpartition("-")[0]]
+    # availability_rules: keyed by doctor _id
+    return [document_id]
+
+
+# Function to invalidate the cache from MongoDB change streams on the given collections.
+# Change streams need a replica set; if they cannot be opened this returns False and the
+# app keeps invalidating from its own write paths (ReadCache.note_write).
+def watch_changes(cache, collections):
+    streams = []
+    try:
+        for collection in collections:
+            streams.append((collection.name, collection.watch()))
+    except Exception as e:
+        print(f"Change streams unavailable, invalidating from the write paths: {e}")
+        for _, stream in streams:
+            stream.close()
+        return False
+
+    def follow(collection_name, stream):
+        try:
+            for change in stream:
+                tags = tags_for_change(collection_name, change)
+                if tags is None:
+                    cache.clear()
+                else:
+                    cache.invalidate(*tags)
+        except Exception as e:
+            # Events may have been missed: fall back to explicit invalidation
+            print(f"Change stream on {collection_name} stopped: {e}")
+            cache.watching = False
+            cache.clear()
+
+    cache.watching = True
+    for collection_name, stream in streams:
+        threading.Thread(target=follow, args=(collection_name, stream), name=f"cache-watch-{collection_name}", daemon=True).start()
+    return True
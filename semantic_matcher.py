@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Semantic symptom matching settings, overridable through the environment. It is off unless
+# SEMANTIC_MATCHING=1, and then needs the sentence-transformers package (CPU only).
+SEMANTIC_MATCHING = os.environ.get("SEMANTIC_MATCHING", "0") == "1"
+SEMANTIC_MODEL = os.environ.get("SEMANTIC_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+INDEX_DIR = os.environ.get(
+    "SEMANTIC_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "Dataset", "semantic_index")
+)
+# Cosine similarity from which a phrase counts as describing a symptom
+MIN_SIMILARITY = float(os.environ.get("SEMANTIC_MIN_SIMILARITY", 0.6))
+# Time allowed for embedding one utterance; phrases left over when it runs out are skipped
+BUDGET_MS = float(os.environ.get("SEMANTIC_BUDGET_MS", 50))
+
+# Longest phrase (in words) taken from an utterance
+MAX_NGRAM = 4
+
+# Phrases embedded per model call (the budget is checked between calls)
+BATCH_SIZE = 16
+
+# Most phrase embeddings kept in memory
+QUERY_CACHE_SIZE = 4096
+
+# Words of an utterance kept, apostrophes included ("can't stop scratching")
+PHRASE_WORD_PATTERN = re.compile(r"[\w']+")
+
+# Phrases made only of these words are not embedded
+STOPWORDS = frozenset(
+    "i i'm i've me my a an the and or but is am are was were be been have has had it it's to of in on at "
+    "with for from so very really just also since this that there do does did".split()
+)
+
+
+# Embedding backend: a sentence-transformers model on the CPU. `encode` returns
+# L2-normalized float32 vectors, one row per text. (Imported here so the app only loads the
+# model when semantic matching is switched on.)
+class SentenceEncoder:
+    def __init__(self, model_name=SEMANTIC_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(self, texts):
+        vectors = self.model.encode(list(texts), batch_size=BATCH_SIZE, normalize_embeddings=True,
+                                    convert_to_numpy=True, show_progress_bar=False)
+        return vectors.astype(np.float32)
+
+
+# Function to list the (description, symptom) rows of the index: every symptom name and
+# synonym of the knowledge base, then the symptom names of the dataset columns
+def index_entries(disease_symptoms, dataset_symptoms=()):
+    entries = {}
+    for symptoms in disease_symptoms.values():
+        for symptom, synonyms in symptoms.items():
+            for text in [symptom, *synonyms]:
+                entries.setdefault(text.lower(), symptom)
+    for symptom in dataset_symptoms:
+        entries.setdefault(symptom.lower(), symptom)
+    return list(entries.items())
+
+
+# Function to load the cached index vectors (float16, memory-mapped), embedding the
+# descriptions and writing the cache first if there is none for this model and vocabulary
+def load_index_vectors(encoder, texts, directory=INDEX_DIR):
+    digest = hashlib.sha256(json.dumps([encoder.name, texts]).encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(directory, f"{digest}.f16")
+    meta_path = os.path.join(directory, f"{digest}.json")
+    try:
+        with open(meta_path) as file:
+            meta = json.load(file)
+        return np.memmap(path, dtype=np.float16, mode="r", shape=(meta["rows"], meta["dimensions"]))
+    except (OSError, ValueError, KeyError):
+        pass
+
+    print(f"Embedding {len(texts)} symptom descriptions with {encoder.name}...")
+    vectors = np.concatenate([encoder.encode(texts[i:i + 256]) for i in range(0, len(texts), 256)])
+    os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    stored = np.memmap(temp_path, dtype=np.float16, mode="w+", shape=vectors.shape)
+    stored[:] = vectors
+    stored.flush()
+    del stored
+    os.replace(temp_path, path)
+    with open(meta_path, "w") as file:
+        json.dump({"model": encoder.name, "rows": vectors.shape[0], "dimensions": vectors.shape[1]}, file)
+    return np.memmap(path, dtype=np.float16, mode="r", shape=vectors.shape)
+
+
+# Semantic symptom matcher for paraphrases the synonym lists miss ("my skin keeps breaking
+# out", "I can't stop scratching"). The symptom descriptions are embedded once and cached
+# on disk; an utterance is split into phrases of up to MAX_NGRAM words, the phrases are
+# embedded (within the time budget, reusing cached phrase vectors) and compared with every
+# description at once by cosine similarity. The vocabulary is a few hundred rows, so one
+# matrix product is faster than any approximate nearest-neighbour index.
+class SemanticMatcher:
+    def __init__(self, encoder, disease_symptoms, dataset_symptoms=(), directory=INDEX_DIR,
+                 min_similarity=MIN_SIMILARITY, budget_ms=BUDGET_MS):
+        self.encoder = encoder
+        self.min_similarity = min_similarity
+        self.budget = budget_ms / 1000
+        entries = index_entries(disease_symptoms, dataset_symptoms)
+        self.vectors = load_index_vectors(encoder, [text for text, _ in entries], directory)
+        # float32 copy for the matrix products (the float16 file stays the shared cache)
+        self._matrix = np.asarray(self.vectors, dtype=np.float32)
+        self.symptoms = list(dict.fromkeys(symptom for _, symptom in entries))
+        symptom_index = {symptom: i for i, symptom in enumerate(self.symptoms)}
+        self._row_symptoms = np.array([symptom_index[symptom] for _, symptom in entries])
+        self.symptom_diseases = {}
+        for disease, symptoms in disease_symptoms.items():
+            for symptom in symptoms:
+                self.symptom_diseases.setdefault(symptom, []).append(disease)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Function to list the phrases of an utterance worth embedding, longest first
+    def phrases(self, text):
+        words = PHRASE_WORD_PATTERN.findall(text.lower())
+        phrases = []
+        for size in range(min(MAX_NGRAM, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                gram = words[start:start + size]
+                if not all(word in STOPWORDS for word in gram):
+                    phrases.append(" ".join(gram))
+        return list(dict.fromkeys(phrases))
+
+    # Function to embed phrases, from the cache where possible, until the deadline
+    def _embed(self, phrases, deadline):
+        vectors = {}
+        missing = []
+        with self._lock:
+            for phrase in phrases:
+                vector = self._cache.get(phrase)
+                if vector is None:
+                    missing.append(phrase)
+                else:
+                    self._cache.move_to_end(phrase)
+                    vectors[phrase] = vector
+        for start in range(0, len(missing), BATCH_SIZE):
+            if time.perf_counter() > deadline:
+                break
+            batch = missing[start:start + BATCH_SIZE]
+            for phrase, vector in zip(batch, self.encoder.encode(batch)):
+                vectors[phrase] = vector
+                with self._lock:
+                    self._cache[phrase] = vector
+                    if len(self._cache) > QUERY_CACHE_SIZE:
+                        self._cache.popitem(last=False)
+        return vectors
+
+    # Function to return {symptom: similarity} for the symptoms an utterance describes
+    def search(self, text, min_similarity=None):
+        min_similarity = self.min_similarity if min_similarity is None else min_similarity
+        vectors = self._embed(self.phrases(text), time.perf_counter() + self.budget)
+        if not vectors:
+            return {}
+        similarities = np.stack(list(vectors.values())) @ self._matrix.T
+        best = np.full(len(self.symptoms), -1.0, dtype=np.float32)
+        np.maximum.at(best, self._row_symptoms, similarities.max(axis=0))
+        return {self.symptoms[i]: round(float(best[i]), 3) for i in np.flatnonzero(best >= min_similarity)}
+
+    # Function to return {(disease, symptom): similarity} for the knowledge base symptoms an
+    # utterance describes (dataset-only symptoms are left out)
+    def find_scored_pairs(self, text, min_similarity=None):
+        return {
+            (disease, symptom): similarity
+            for symptom, similarity in self.search(text, min_similarity).items()
+            for disease in self.symptom_diseases.get(symptom, ())
+        }
+
+
+# Function to create the semantic matcher with the configured model, or None when
+# sentence-transformers is not installed
+def load_semantic_matcher(disease_symptoms, dataset_symptoms=(), encoder=None, directory=INDEX_DIR):
+    if encoder is None:
+        try:
+            encoder = SentenceEncoder()
+        except ImportError:
+            print("Semantic symptom matching needs the sentence-transformers package; it stays off.")
+            return None
+    return SemanticMatcher(encoder, disease_symptoms, dataset_symptoms, directory)
@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Seconds of inactivity after which an interview session is dropped
+SESSION_TTL = int(os.environ.get("SESSION_TTL_SECONDS", 30 * 60))
+
+# Most sessions kept in memory (the least recently used are dropped first)
+SESSION_MAXSIZE = int(os.environ.get("SESSION_MAXSIZE", 10000))
+
+
+# Server-side store of interview sessions with expiry.
+# Sessions are kept as compact JSON and expire `ttl` seconds after their last update. In
+# memory they are held in LRU order, so expired sessions are dropped from the front; with a
+# Redis client they live in Redis instead (with a TTL per key) and every worker process of
+# the web service sees the same sessions.
+class SessionStore:
+    def __init__(self, ttl=SESSION_TTL, maxsize=SESSION_MAXSIZE, redis_client=None, prefix="session"):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.redis = redis_client
+        self.prefix = prefix
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _redis_key(self, session_id):
+        return f"{self.prefix}:{session_id}"
+
+    # Function to drop expired sessions (the oldest are at the front)
+    def _expire(self, now):
+        while self._sessions:
+            session_id, (expires_at, _) = next(iter(self._sessions.items()))
+            if expires_at > now:
+                break
+            del self._sessions[session_id]
+
+    def _store(self, session_id, data):
+        if self.redis is not None:
+            self.redis.set(self._redis_key(session_id), data, ex=self.ttl)
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._sessions.pop(session_id, None)
+            self._sessions[session_id] = (now + self.ttl, data)
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+
+    # Function to store a new session; returns its ID
+    def create(self, session):
+        session_id = uuid.uuid4().hex
+        self._store(session_id, json.dumps(session, separators=(",", ":")))
+        return session_id
+
+    # Function to return a session, or None if it is unknown or expired
+    def get(self, session_id):
+        if self.redis is not None:
+            data = self.redis.get(self._redis_key(session_id))
+        else:
+            with self._lock:
+                self._expire(time.monotonic())
+                data = self._sessions.get(session_id, (None, None))[1]
+        return json.loads(data) if data is not None else None
+
+    # Function to change a session atomically: `change(session)` updates it in place and its
+    # return value is passed on. Returns (session, result), or (None, None) if the session is
+    # unknown or expired. As with Redis the change runs outside the lock (so a slow one does not
+    # hold up other sessions) and is applied only if the session was not changed meanwhile;
+    # otherwise it runs again on the new state, so it must not have side effects.
+    def update(self, session_id, change):
+        if self.redis is not None:
+            return self._update_redis(session_id, change)
+        while True:
+            with self._lock:
+                self._expire(time.monotonic())
+                entry = self._sessions.get(session_id)
+            if entry is None:
+                return None, None
+            session = json.loads(entry[1])
+            result = change(session)
+            data = json.dumps(session, separators=(",", ":"))
+            with self._lock:
+                current = self._sessions.get(session_id)
+                if current is None:
+                    return None, None
+                # Every store makes a new string, so the same object means an unchanged session
+                if current[1] is not entry[1]:
+                    continue
+                self._sessions.move_to_end(session_id)
+                self._sessions[session_id] = (time.monotonic() + self.ttl, data)
+            return session, result
+
+    def _update_redis(self, session_id, change):
+        from redis import WatchError
+
+        key = self._redis_key(session_id)
+        while True:
+            with self.redis.pipeline() as pipe:
+                try:
+                    # Optimistic transaction: retried if another worker changed the session
+                    pipe.watch(key)
+                    data = pipe.get(key)
+                    if data is None:
+                        return None, None
+                    session = json.loads(data)
+                    result = change(session)
+                    pipe.multi()
+                    pipe.set(key, json.dumps(session, separators=(",", ":")), ex=self.ttl)
+                    pipe.execute()
+                    return session, result
+                except WatchError:
+                    continue
+
+    # Function to end a session
+    def delete(self, session_id):
+        if self.redis is not None:
+            self.redis.delete(self._redis_key(session_id))
+            return
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        if self.redis is not None:
+            return sum(1 for _ in self.redis.scan_iter(f"{self.prefix}:*"))
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._sessions)
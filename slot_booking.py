@@ -0,0 +1,42 @@
+# Function to atomically claim a free slot of a doctor.
+# The availability check and the update happen in one conditional update on the server,
+# so when several patients race for the same slot exactly one of them gets True back;
+# everyone else gets False.
+def claim_slot(collection, doctor_name, day, time_slot):
+    result = collection.update_one(*claim_slot_update(doctor_name, day, time_slot))
+    return result.modified_count == 1
+
+
+# Function to give a claimed slot back (e.g. when the rest of the booking fails)
+def release_slot(collection, doctor_name, day, time_slot):
+    collection.update_one(*release_slot_update(doctor_name, day, time_slot))
+
+
+# Function to check whether a doctor has a given slot at all (booked or not)
+def slot_exists(collection, doctor_name, day, time_slot):
+    return collection.count_documents(slot_filter(doctor_name, day, time_slot), limit=1) > 0
+
+
+# The queries above as (filter, update) documents, shared with the async booking service
+# (which runs them with Motor)
+
+# Function to build the conditional update of claim_slot
+def claim_slot_update(doctor_name, day, time_slot):
+    return (
+        {
+            "doctor_name": doctor_name,
+            f"available_slots.{day}": {"$elemMatch": {"time": time_slot, "available": True}},
+        },
+        # `$` is the element matched by $elemMatch, i.e. the slot that was still free
+        {"$set": {f"available_slots.{day}.$.available": False}},
+    )
+
+
+# Function to build the update of release_slot
+def release_slot_update(doctor_name, day, time_slot):
+    return slot_filter(doctor_name, day, time_slot), {"$set": {f"available_slots.{day}.$.available": True}}
+
+
+# Function to build the filter matching a doctor that has a given slot
+def slot_filter(doctor_name, day, time_slot):
+    return {"doctor_name": doctor_name, f"available_slots.{day}.time": time_slot}
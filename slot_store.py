@@ -0,0 +1,266 @@
+import argparse
+import datetime as dt
+
+import pytz
+from pymongo import ASCENDING, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import APPOINTMENTS_DB, get_client
+
+# Time zone the doctors' "10:00 AM - 11:00 AM" slot strings are written in
+CLINIC_TIMEZONE = pytz.timezone("Asia/Kolkata")
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+FREE, BOOKED = "free", "booked"
+
+
+# Function to treat the naive datetimes MongoDB returns as UTC
+def as_utc(value):
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=dt.timezone.utc)
+
+
+# Function to build the ID of a slot: one slot per doctor and start time
+def slot_id(doctor_id, start_utc):
+    return f"{doctor_id}-{as_utc(start_utc):%Y%m%dT%H%MZ}"
+
+
+# Function to turn a legacy "10:00 AM - 11:00 AM" slot on a date into UTC start/end times
+def parse_time_slot(date, time_slot, timezone=CLINIC_TIMEZONE):
+    start_text, end_text = [part.strip() for part in time_slot.split(" - ")]
+    times = []
+    for text in (start_text, end_text):
+        local = dt.datetime.combine(date, dt.datetime.strptime(text, "%I:%M %p").time())
+        times.append(timezone.localize(local).astimezone(dt.timezone.utc))
+    return times[0], times[1]
+
+
+# Function to describe a slot the way the booking emails and legacy fields do:
+# ("Monday", "10:00 AM - 11:00 AM") in the clinic's time zone
+def local_day_and_time(slot, timezone=CLINIC_TIMEZONE):
+    start = as_utc(slot["start_utc"]).astimezone(timezone)
+    end = as_utc(slot["end_utc"]).astimezone(timezone)
+    return start.strftime("%A"), f"{start:%I:%M %p} - {end:%I:%M %p}"
+
+
+# Function to make a slot document JSON friendly for the API
+def slot_to_json(slot):
+    day, time_slot = local_day_and_time(slot)
+    return {
+        "slot_id": slot["_id"],
+        "day": day,
+        "time": time_slot,
+        "doctor_name": slot["doctor_name"],
+        "specialization": slot.get("specialization"),
+        "start_utc": as_utc(slot["start_utc"]).isoformat(),
+        "end_utc": as_utc(slot["end_utc"]).isoformat(),
+        "status": slot["status"],
+    }
+
+
+# Time-indexed slot store: one document per concrete slot
+# {doctor_id, doctor_name, specialization, start_utc, end_utc, status}.
+# The compound indexes put the equality fields first and start_utc last, so "free slots of
+# a doctor / of any cardiologist between two instants" is a single index range scan.
+# Past slots are handled by archive_past (booked ones are copied to the archive, free ones
+# dropped); a TTL index on `expire_at` removes anything left `retention` after it ended.
+class SlotStore:
+    def __init__(self, collection, archive_collection=None, retention=dt.timedelta(days=30)):
+        self.collection = collection
+        self.archive_collection = archive_collection
+        self.retention = retention
+
+    # Function to create the query and TTL indexes
+    def ensure_indexes(self):
+        self.collection.create_index([("doctor_id", ASCENDING), ("start_utc", ASCENDING)], unique=True)
+        self.collection.create_index([("status", ASCENDING), ("start_utc", ASCENDING)])
+        self.collection.create_index([("doctor_id", ASCENDING), ("status", ASCENDING), ("start_utc", ASCENDING)])
+        self.collection.create_index(
+            [("specialization", ASCENDING), ("status", ASCENDING), ("start_utc", ASCENDING)]
+        )
+        self.collection.create_index("expire_at", expireAfterSeconds=0)
+
+    # Function to build a slot document for a doctor (as stored in the appointments collection)
+    def make_slot(self, doctor, start_utc, end_utc, status=FREE, **fields):
+        doctor_id = str(doctor["_id"])
+        slot = {
+            "_id": slot_id(doctor_id, start_utc),
+            "doctor_id": doctor_id,
+            "doctor_name": doctor["doctor_name"],
+            "specialization": doctor.get("specialization"),
+            "start_utc": start_utc,
+            "end_utc": end_utc,
+            "status": status,
+            "expire_at": end_utc + self.retention,
+        }
+        slot.update(fields)
+        return slot
+
+    # Function to add slots that do not exist yet (existing slots and their bookings are
+    # left untouched, so this is safe to repeat); returns the number of new slots
+    def add_slots(self, slots):
+        operations = [UpdateOne({"_id": slot["_id"]}, {"$setOnInsert": slot}, upsert=True) for slot in slots]
+        if not operations:
+            return 0
+        return self.collection.bulk_write(operations, ordered=False).upserted_count
+
+    # Function to return one slot
+    def get(self, slot_id):
+        return self.collection.find_one({"_id": slot_id})
+
+    # Function to list slots starting in [start, end), optionally for one doctor or specialization
+    def find_slots(self, start, end, status=FREE, doctor_id=None, specialization=None, limit=0):
+        query = slots_filter(start, end, status, doctor_id, specialization)
+        return list(self.collection.find(query).sort("start_utc", ASCENDING).limit(limit))
+
+    # Function to atomically book a free slot; returns the booked slot, or None if it was
+    # already taken, has started (or does not exist)
+    def claim(self, slot_id, booking_id, now=None):
+        return self.collection.find_one_and_update(
+            *claim_update(slot_id, booking_id, now), return_document=ReturnDocument.AFTER
+        )
+
+    # Function to book a slot that was generated from an availability rule and is not stored
+    # yet; the slot's _id makes the insert fail for everyone but the first patient
+    def claim_new(self, slot, booking_id):
+        booked = booked_slot(slot, booking_id)
+        try:
+            self.collection.insert_one(booked)
+        except DuplicateKeyError:
+            # Already stored: it can still be a free (e.g. released) slot
+            return self.claim(slot["_id"], booking_id)
+        return booked
+
+    # Function to free a booked slot again (only if it still belongs to this booking)
+    def release(self, slot_id, booking_id):
+        result = self.collection.update_one(*release_update(slot_id, booking_id))
+        return result.modified_count == 1
+
+    # Function to store the Calendar event of a booked slot
+    def set_event(self, slot_id, event_id):
+        self.collection.update_one({"_id": slot_id}, {"$set": {"event_id": event_id}})
+
+    # Function to move booked slots that have ended into the archive and drop ended free
+    # slots; returns (archived, deleted)
+    def archive_past(self, now=None):
+        now = now or dt.datetime.now(dt.timezone.utc)
+        archived = 0
+        if self.archive_collection is not None:
+            booked = list(self.collection.find({"status": BOOKED, "end_utc": {"$lte": now}}))
+            if booked:
+                for slot in booked:
+                    slot.pop("expire_at", None)
+                self.archive_collection.bulk_write(
+                    [ReplaceOne({"_id": slot["_id"]}, slot, upsert=True) for slot in booked],
+                    ordered=False,
+                )
+                # Only the copied slots go; one released meanwhile is dropped with the free ones
+                archived = self.collection.delete_many(
+                    {"_id": {"$in": [slot["_id"] for slot in booked]}, "status": BOOKED}
+                ).deleted_count
+        deleted = self.collection.delete_many({"status": FREE, "end_utc": {"$lte": now}}).deleted_count
+        return archived, deleted
+
+
+# The slot store's queries as documents, shared with the async booking service (which runs
+# them with Motor)
+
+# Function to build the filter of find_slots (`status` may also be a list of statuses)
+def slots_filter(start, end, status=FREE, doctor_id=None, specialization=None):
+    query = {
+        "status": {"$in": status} if isinstance(status, list) else status,
+        "start_utc": {"$gte": start, "$lt": end},
+    }
+    if doctor_id is not None:
+        query["doctor_id"] = str(doctor_id)
+    if specialization is not None:
+        query["specialization"] = specialization
+    return query
+
+
+# Function to build the conditional (filter, update) of SlotStore.claim: only a free slot
+# that has not started yet can be booked
+def claim_update(slot_id, booking_id, now=None):
+    now = now or dt.datetime.now(dt.timezone.utc)
+    return (
+        {"_id": slot_id, "status": FREE, "start_utc": {"$gt": now}},
+        {"$set": {"status": BOOKED, "booking_id": booking_id}},
+    )
+
+
+# Function to build the stored document of a generated slot booked by SlotStore.claim_new
+def booked_slot(slot, booking_id):
+    return dict(slot, status=BOOKED, booking_id=booking_id)
+
+
+# Function to build the (filter, update) of SlotStore.release
+def release_update(slot_id, booking_id):
+    return (
+        {"_id": slot_id, "status": BOOKED, "booking_id": booking_id},
+        {"$set": {"status": FREE}, "$unset": {"booking_id": "", "event_id": ""}},
+    )
+
+
+# Function to return the date of the next `weekday` on or after `date`
+def next_weekday(date, weekday):
+    return date + dt.timedelta(days=(WEEKDAYS.index(weekday) - date.weekday()) % 7)
+
+
+# Function to turn one doctor's weekday-keyed slot arrays into concrete slots for the next
+# `weeks` weeks. A slot marked unavailable is booked for its next occurrence only, which is
+# what the flag meant; bookings that already carry real times (appointments.{day} entries
+# with start_utc) are migrated with their Calendar event.
+def slots_from_nested(store, doctor, start_date, weeks):
+    slots = {}
+    for day, day_slots in doctor.get("available_slots", {}).items():
+        first = next_weekday(start_date, day)
+        for slot in day_slots:
+            for week in range(weeks):
+                start_utc, end_utc = parse_time_slot(first + dt.timedelta(weeks=week), slot["time"])
+                status = BOOKED if week == 0 and not slot.get("available", True) else FREE
+                new = store.make_slot(doctor, start_utc, end_utc, status)
+                slots[new["_id"]] = new
+    for appointments in doctor.get("appointments", {}).values():
+        for appointment in appointments:
+            if appointment.get("available") or "start_utc" not in appointment:
+                continue
+            new = store.make_slot(
+                doctor, as_utc(appointment["start_utc"]), as_utc(appointment["end_utc"]), BOOKED,
+                event_id=appointment.get("event_id"),
+            )
+            slots[new["_id"]] = new
+    return list(slots.values())
+
+
+# Function to migrate every doctor in the appointments collection; returns the number of
+# new slots
+def migrate_nested_slots(appointments, store, start_date=None, weeks=4):
+    start_date = start_date or dt.datetime.now(CLINIC_TIMEZONE).date()
+    store.ensure_indexes()
+    created = 0
+    for doctor in appointments.find({}, {"doctor_name": 1, "specialization": 1, "available_slots": 1, "appointments": 1}):
+        created += store.add_slots(slots_from_nested(store, doctor, start_date, weeks))
+    return created
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the time-indexed slot store.")
+    parser.add_argument("command", choices=["migrate", "archive"],
+                        help="migrate: create slots from the weekday-keyed arrays; archive: move past slots away")
+    parser.add_argument("--mongo", metavar="URI", help="MongoDB URI (default: $MONGO_URI)")
+    parser.add_argument("--database", default=APPOINTMENTS_DB)
+    parser.add_argument("--weeks", type=int, default=4, help="weeks of slots to create when migrating")
+    args = parser.parse_args(argv)
+
+    db = get_client(args.mongo)[args.database]
+    store = SlotStore(db["slots"], db["slots_archive"])
+    if args.command == "migrate":
+        created = migrate_nested_slots(db["appointments"], store, weeks=args.weeks)
+        print(f"Created {created} slots.")
+    else:
+        archived, deleted = store.archive_past()
+        print(f"Archived {archived} booked slots, deleted {deleted} free slots.")
+
+
+if __name__ == "__main__":
+    main()
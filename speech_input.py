@@ -0,0 +1,144 @@
+import json
+import os
+import wave
+from abc import ABC, abstractmethod
+
+import speech_recognition as sr
+
+from metrics import count, span
+
+try:
+    import vosk
+except ImportError:  # Only the Google backend is available then
+    vosk = None
+
+VOSK_MODEL_PATH = os.environ.get(
+    "VOSK_MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "vosk")
+)
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 4000
+
+
+# Function to do nothing (default hook before listening)
+def _no_op():
+    pass
+
+
+# Recognizer backend interface.
+# `listen` records one answer from the microphone and returns its lowercase text, or ""
+# when nothing usable was heard. `before_listen` runs once the microphone is open (the
+# console flow waits for its own prompt there) and `accept_partial` lets the caller stop
+# early as soon as a partial hypothesis is good enough.
+# `transcribe_stream` and `transcribe_file` recognize audio that did not come from the local
+# microphone (a kiosk's audio socket, a recording): 16-bit mono PCM at SAMPLE_RATE.
+class SpeechRecognizer(ABC):
+    @abstractmethod
+    def listen(self, accept_partial=None, before_listen=_no_op):
+        pass
+
+    @abstractmethod
+    def transcribe_stream(self, chunks, accept_partial=None):
+        pass
+
+    @abstractmethod
+    def transcribe_file(self, path, accept_partial=None):
+        pass
+
+
+# Google Web Speech backend (one network round trip per answer, no partial results)
+class GoogleSpeechRecognizer(SpeechRecognizer):
+    def __init__(self):
+        self.recognizer = sr.Recognizer()
+
+    def listen(self, accept_partial=None, before_listen=_no_op):
+        with sr.Microphone() as source:
+            before_listen()
+            print("Listening...")
+            with span("stt_capture", backend="google"):
+                audio = self.recognizer.listen(source)
+        return self._recognize(audio)
+
+    # Function to transcribe a WAV file
+    def transcribe_file(self, path, accept_partial=None):
+        with sr.AudioFile(path) as source:
+            audio = self.recognizer.record(source)
+        return self._recognize(audio)
+
+    # Function to transcribe raw PCM chunks (the whole answer is sent in one request)
+    def transcribe_stream(self, chunks, accept_partial=None):
+        return self._recognize(sr.AudioData(b"".join(chunks), SAMPLE_RATE, 2))
+
+    def _recognize(self, audio):
+        try:
+            with span("stt", backend="google"):
+                return self.recognizer.recognize_google(audio).lower()
+        except sr.UnknownValueError:
+            print("Could not understand audio, please try again.")
+            count("stt_not_understood", backend="google")
+            return ""
+        except sr.RequestError:
+            print("Could not request results from Google Speech Recognition service.")
+            return ""
+
+
+# Offline Vosk backend. The model is loaded once and kept for every later call; audio is
+# streamed in small chunks so partial hypotheses are available while the patient speaks.
+class VoskSpeechRecognizer(SpeechRecognizer):
+    def __init__(self, model_path=VOSK_MODEL_PATH, sample_rate=SAMPLE_RATE, timeout=8):
+        if vosk is None:
+            raise RuntimeError("The vosk package is not installed.")
+        vosk.SetLogLevel(-1)
+        self.model = vosk.Model(model_path)
+        self.sample_rate = sample_rate
+        self.timeout = timeout
+
+    def listen(self, accept_partial=None, before_listen=_no_op):
+        with sr.Microphone(sample_rate=self.sample_rate, chunk_size=CHUNK_SIZE) as source:
+            before_listen()
+            print("Listening...")
+            chunk_count = int(self.timeout * self.sample_rate / CHUNK_SIZE)
+            chunks = (source.stream.read(CHUNK_SIZE) for _ in range(chunk_count))
+            # Audio is captured while it is recognized, so the span covers both
+            with span("stt", backend="vosk"):
+                return self.transcribe_stream(chunks, accept_partial)
+
+    # Function to transcribe a WAV file (16-bit mono PCM), e.g. a recorded test fixture
+    def transcribe_file(self, path, accept_partial=None):
+        with wave.open(path, "rb") as wav:
+            if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                raise ValueError(f"{path} must be 16-bit mono PCM audio.")
+            recognizer = vosk.KaldiRecognizer(self.model, wav.getframerate())
+            chunks = iter(lambda: wav.readframes(CHUNK_SIZE), b"")
+            return self._transcribe(recognizer, chunks, accept_partial)
+
+    # Function to transcribe raw PCM chunks, stopping at the first complete utterance or
+    # as soon as `accept_partial` accepts a partial hypothesis
+    def transcribe_stream(self, chunks, accept_partial=None):
+        recognizer = vosk.KaldiRecognizer(self.model, self.sample_rate)
+        return self._transcribe(recognizer, chunks, accept_partial)
+
+    def _transcribe(self, recognizer, chunks, accept_partial):
+        for chunk in chunks:
+            if recognizer.AcceptWaveform(chunk):
+                text = json.loads(recognizer.Result()).get("text", "")
+                if text:
+                    return text.lower()
+            elif accept_partial:
+                partial = json.loads(recognizer.PartialResult()).get("partial", "")
+                if partial and accept_partial(partial):
+                    return partial.lower()
+        return json.loads(recognizer.FinalResult()).get("text", "").lower()
+
+
+# Function to create the configured recognizer backend.
+# SPEECH_BACKEND=vosk|google picks one explicitly; by default the offline Vosk backend is
+# used whenever the package and a model are available.
+def create_speech_recognizer(backend=None):
+    backend = backend or os.environ.get("SPEECH_BACKEND")
+    if backend is None:
+        backend = "vosk" if vosk is not None and os.path.isdir(VOSK_MODEL_PATH) else "google"
+    if backend == "vosk":
+        return VoskSpeechRecognizer()
+    if backend == "google":
+        return GoogleSpeechRecognizer()
+    raise ValueError(f"Unknown speech backend: {backend}")
@@ -0,0 +1,123 @@
+import hashlib
+import itertools
+import os
+import queue
+import threading
+
+from metrics import span
+
+try:
+    import simpleaudio
+except ImportError:  # Cached prompts are then spoken live instead of played back
+    simpleaudio = None
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_cache")
+
+# Queue priorities: speech (and stopping) always goes before background pre-rendering
+SPEECH_PRIORITY, RENDER_PRIORITY = 0, 1
+
+
+# Function to return the cache file of a pre-rendered message
+def cache_path(message, cache_dir=CACHE_DIR):
+    digest = hashlib.sha1(message.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.wav")
+
+
+# Speech output worker.
+# pyttsx3 engines must stay on the thread that created them, so one worker thread owns
+# the engine and plays queued messages in order. `say` returns immediately; `wait` is the
+# barrier to call before listening so the microphone never records our own prompt.
+# Fixed prompts can be pre-rendered to WAV files and are then played from the cache.
+# If the engine cannot start (pyttsx3 or an audio driver missing) the output is marked as
+# failed: prompts are then only printed, and `wait` never blocks.
+class SpeechOutput:
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.failed = False
+        os.makedirs(cache_dir, exist_ok=True)
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="speech-output", daemon=True)
+        self._thread.start()
+
+    # Function to queue a message to be spoken
+    def say(self, message):
+        with self._idle:
+            if self.failed:
+                return
+            self._pending += 1
+        self._queue.put((SPEECH_PRIORITY, next(self._sequence), "speak", message))
+
+    # Function to synthesize messages into the audio cache while the worker is idle
+    def prerender(self, messages):
+        if simpleaudio is None:
+            return
+        for message in messages:
+            self._queue.put((RENDER_PRIORITY, next(self._sequence), "render", message))
+
+    # Function to block until every queued message has finished playing
+    def wait(self):
+        with self._idle:
+            self._idle.wait_for(lambda: self._pending == 0)
+
+    # Function to stop the worker once the queued speech has been played
+    def close(self):
+        self._queue.put((SPEECH_PRIORITY, next(self._sequence), "stop", None))
+        self._thread.join()
+
+    # Function to return the cache file for a message
+    def cache_path(self, message):
+        return cache_path(message, self.cache_dir)
+
+    def _run(self):
+        try:
+            # Imported here so a missing package fails like a missing driver
+            import pyttsx3
+
+            engine = pyttsx3.init()
+        except Exception as e:
+            print(f"Text-to-speech is unavailable, prompts are only printed: {e}")
+            with self._idle:
+                self.failed = True
+                self._pending = 0
+                self._idle.notify_all()
+            return
+        while True:
+            _, _, kind, message = self._queue.get()
+            if kind == "stop":
+                break
+            try:
+                if kind == "speak":
+                    self._speak(engine, message)
+                else:
+                    self._render(engine, message)
+            except Exception as e:
+                print(f"Speech output failed: {e}")
+            finally:
+                if kind == "speak":
+                    with self._idle:
+                        self._pending -= 1
+                        self._idle.notify_all()
+
+    def _speak(self, engine, message):
+        path = self.cache_path(message)
+        if simpleaudio and os.path.exists(path):
+            with span("tts", source="cache"):
+                simpleaudio.WaveObject.from_wave_file(path).play().wait_done()
+            return
+        with span("tts", source="live"):
+            engine.say(message)
+            engine.runAndWait()
+
+    def _render(self, engine, message):
+        path = self.cache_path(message)
+        if os.path.exists(path):
+            return
+        temp_path = f"{path}.part.wav"
+        with span("tts", source="prerender"):
+            engine.save_to_file(message, temp_path)
+            engine.runAndWait()
+        if os.path.exists(temp_path):
+            os.replace(temp_path, path)
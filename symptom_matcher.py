@@ -0,0 +1,317 @@
+import os
+import re
+from collections import deque
+
+# Words are matched on the same boundaries the old `\b...\b` patterns used
+WORD_PATTERN = re.compile(r"\w+")
+
+# Fuzzy matching settings, overridable through the environment. A symptom is reported with
+# the confidence of its best phrase match (1.0 for an exact match); matches below
+# MIN_CONFIDENCE are dropped, and those below REPORTED_CONFIDENCE still make the disease
+# relevant but are asked about instead of being taken as reported.
+MIN_CONFIDENCE = float(os.environ.get("SYMPTOM_MATCH_MIN_CONFIDENCE", 0.7))
+REPORTED_CONFIDENCE = float(os.environ.get("SYMPTOM_REPORTED_CONFIDENCE", 0.9))
+
+# Words shorter than this are only matched exactly ("and" must not become "hand")
+MIN_FUZZY_LENGTH = 4
+
+# Most edits between a heard word and a vocabulary word (two from 6 letters on)
+MAX_EDIT_DISTANCE = 2
+
+# Most cached candidate lists of heard words
+CANDIDATE_CACHE_SIZE = 10000
+
+VOWELS = frozenset("AEIOU")
+
+
+# Function to split text into lowercase word tokens
+def tokenize(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+# Function to compute the Metaphone key of a word: words that sound alike ("rash" and
+# "rush", "phlegm" and "flem") get the same key
+def metaphone(word):
+    word = "".join(char for char in word.upper() if "A" <= char <= "Z")
+    if word[:2] in ("AE", "GN", "KN", "PN", "WR"):
+        word = word[1:]
+    elif word[:1] == "X":
+        word = "S" + word[1:]
+    elif word[:2] == "WH":
+        word = "W" + word[2:]
+
+    key = []
+    for i, char in enumerate(word):
+        prev = word[i - 1] if i else ""
+        next1 = word[i + 1:i + 2]
+        next2 = word[i + 2:i + 3]
+        if char == prev and char != "C":
+            continue
+        if char in VOWELS:
+            if i == 0:
+                key.append(char)
+        elif char == "B":
+            if not (prev == "M" and i == len(word) - 1):
+                key.append("B")
+        elif char == "C":
+            if prev == "S" and next1 in ("E", "I", "Y"):
+                continue
+            if next1 == "I" and next2 == "A":
+                key.append("X")
+            elif next1 == "H":
+                key.append("K" if prev == "S" else "X")
+            elif next1 in ("E", "I", "Y"):
+                key.append("S")
+            else:
+                key.append("K")
+        elif char == "D":
+            key.append("J" if next1 == "G" and next2 in ("E", "I", "Y") else "T")
+        elif char == "G":
+            if next1 == "H" and next2 not in VOWELS:
+                continue
+            if next1 == "N" and word[i + 2:] in ("", "ED"):
+                continue
+            key.append("J" if next1 in ("E", "I", "Y") and prev != "G" else "K")
+        elif char == "H":
+            if prev not in ("C", "S", "P", "T", "G") and next1 in VOWELS:
+                key.append("H")
+        elif char == "K":
+            if prev != "C":
+                key.append("K")
+        elif char == "P":
+            key.append("F" if next1 == "H" else "P")
+        elif char == "Q":
+            key.append("K")
+        elif char == "S":
+            key.append("X" if next1 == "H" or (next1 == "I" and next2 in ("O", "A")) else "S")
+        elif char == "T":
+            if next1 == "I" and next2 in ("O", "A"):
+                key.append("X")
+            elif next1 == "H":
+                key.append("0")
+            elif not (next1 == "C" and next2 == "H"):
+                key.append("T")
+        elif char == "V":
+            key.append("F")
+        elif char in ("W", "Y"):
+            if next1 in VOWELS:
+                key.append(char)
+        elif char == "X":
+            key.append("KS")
+        elif char == "Z":
+            key.append("S")
+        else:
+            key.append(char)
+    return "".join(key)
+
+
+# Function to compute the edit distance (insertions, deletions, substitutions and swaps of
+# neighbouring letters) between two words, or limit + 1 once it exceeds `limit`
+def edit_distance(a, b, limit=MAX_EDIT_DISTANCE):
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+# Function to return the most edits allowed for a word of this length
+def allowed_edits(word):
+    if len(word) < MIN_FUZZY_LENGTH:
+        return 0
+    return 1 if len(word) < 6 else MAX_EDIT_DISTANCE
+
+
+# Function to list every string obtained by deleting up to `distance` letters from a word
+def deletes(word, distance):
+    variants = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+
+# Single-pass symptom matcher built once from the disease -> symptom -> synonyms table.
+# Every synonym (and the symptom name itself) becomes a phrase of word tokens in a
+# word-level Aho-Corasick automaton, so one scan of the transcript reports every
+# (disease, symptom) pair whose phrases occur, including overlapping phrases.
+#
+# Speech recognition errors ("sneezing" heard as "seizing", "rash" as "rush") are matched
+# fuzzily: a heard word that is not in the vocabulary is looked up in a SymSpell-style
+# index of letter deletions (candidates within MAX_EDIT_DISTANCE edits) and in a Metaphone
+# index (candidates that sound alike), both precomputed here, so no transcript word is
+# ever compared with the whole vocabulary. A phrase then matches with the product of its
+# words' confidences.
+#
+# With a semantic matcher attached (semantic_matcher.py, SEMANTIC_MATCHING=1), paraphrases
+# are matched too, with their cosine similarity as the confidence.
+class SymptomMatcher:
+    # SemanticMatcher attached after loading (never part of the compiled artifact)
+    semantic = None
+
+    def __init__(self, disease_symptoms):
+        self.diseases = list(disease_symptoms)
+        # Position of each (disease, symptom) pair so results keep the table order
+        self.order = {}
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+
+        for disease, symptoms in disease_symptoms.items():
+            for symptom, synonyms in symptoms.items():
+                key = (disease, symptom)
+                self.order[key] = len(self.order)
+                for phrase in [symptom, *synonyms]:
+                    self._add_phrase(tokenize(phrase), key)
+        self._build_failure_links()
+        self._build_fuzzy_indexes()
+
+    # Function to insert one phrase into the trie
+    def _add_phrase(self, words, key):
+        if not words:
+            return
+        state = 0
+        for word in words:
+            next_state = self.goto[state].get(word)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(set())
+                self.goto[state][word] = next_state
+            state = next_state
+        self.output[state].add(key)
+
+    # Function to compute failure links breadth-first and merge outputs along them
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(word, 0)
+                self.output[child] |= self.output[self.fail[child]]
+        # Outputs are only read from now on
+        self.output = [frozenset(keys) for keys in self.output]
+
+    # Function to index the vocabulary words by their deletions and by their Metaphone keys
+    def _build_fuzzy_indexes(self):
+        self.words = frozenset(word for edges in self.goto for word in edges)
+        self.deletion_index = {}
+        self.phonetic_index = {}
+        for word in sorted(self.words):
+            if len(word) < MIN_FUZZY_LENGTH:
+                continue
+            for variant in deletes(word, allowed_edits(word)):
+                self.deletion_index.setdefault(variant, []).append(word)
+            self.phonetic_index.setdefault(metaphone(word), []).append(word)
+        self._candidates = {}
+
+    # Function to return every (disease, symptom) pair mentioned in the text
+    def find_pairs(self, text):
+        hits = set()
+        state = 0
+        for word in tokenize(text):
+            while state and word not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(word, 0)
+            if self.output[state]:
+                hits |= self.output[state]
+        return sorted(hits, key=self.order.__getitem__)
+
+    # Function to return the vocabulary words a heard word may stand for, as
+    # ((word, confidence), ...). Similar spelling counts, sounding alike counts more.
+    def word_candidates(self, heard):
+        if heard in self.words:
+            return ((heard, 1.0),)
+        candidates = self._candidates.get(heard)
+        if candidates is not None:
+            return candidates
+        confidences = {}
+        if len(heard) >= MIN_FUZZY_LENGTH:
+            key = metaphone(heard)
+            sounds_alike = set(self.phonetic_index.get(key, ()))
+            nearby = {word for variant in deletes(heard, MAX_EDIT_DISTANCE)
+                      for word in self.deletion_index.get(variant, ())}
+            for word in nearby | sounds_alike:
+                distance = edit_distance(heard, word, max(len(heard), len(word)))
+                similarity = 1 - distance / max(len(heard), len(word))
+                if word in sounds_alike:
+                    confidences[word] = 0.5 + 0.5 * similarity
+                elif distance <= min(allowed_edits(heard), allowed_edits(word)):
+                    confidences[word] = similarity
+        candidates = tuple(sorted(confidences.items(), key=lambda item: -item[1]))
+        if len(self._candidates) >= CANDIDATE_CACHE_SIZE:
+            self._candidates.clear()
+        self._candidates[heard] = candidates
+        return candidates
+
+    # Function to return {(disease, symptom): confidence} for every pair whose phrases
+    # match the text with at least `min_confidence`
+    def find_scored_pairs(self, text, min_confidence=MIN_CONFIDENCE):
+        scores = dict.fromkeys(self.find_pairs(text), 1.0)
+        if min_confidence >= 1:
+            return scores
+        words = tokenize(text)
+        candidates = [self.word_candidates(word) for word in words]
+        if all(len(options) == 1 and options[0][1] == 1.0 for options in candidates if options):
+            # Every word was either exact or unknown: nothing fuzzy to find
+            return scores
+        for start in range(len(words)):
+            # Walk the phrase trie from each word, following every candidate reading
+            frontier = [(0, 1.0)]
+            for options in candidates[start:]:
+                frontier = [
+                    (self.goto[state][word], confidence * word_confidence)
+                    for state, confidence in frontier
+                    for word, word_confidence in options
+                    if word in self.goto[state] and confidence * word_confidence >= min_confidence
+                ]
+                if not frontier:
+                    break
+                for state, confidence in frontier:
+                    for key in self.output[state]:
+                        if confidence > scores.get(key, 0.0):
+                            scores[key] = confidence
+        return scores
+
+    # Function to group detected symptoms by disease with their confidences,
+    # {disease: {symptom: confidence}}, dropping diseases without hits
+    def match_scored(self, text, min_confidence=MIN_CONFIDENCE):
+        detected = {}
+        scores = self.find_scored_pairs(text, min_confidence)
+        if self.semantic is not None and min_confidence < 1:
+            for key, similarity in self.semantic.find_scored_pairs(text).items():
+                if key in self.order and similarity > scores.get(key, 0.0):
+                    scores[key] = similarity
+        for disease, symptom in sorted(scores, key=self.order.__getitem__):
+            detected.setdefault(disease, {})[symptom] = round(scores[(disease, symptom)], 3)
+        return detected
+
+    # Function to group detected symptoms by disease, dropping diseases without hits
+    def match(self, text, min_confidence=MIN_CONFIDENCE):
+        if min_confidence < 1:
+            return {disease: list(symptoms) for disease, symptoms in self.match_scored(text, min_confidence).items()}
+        detected = {}
+        for disease, symptom in self.find_pairs(text):
+            detected.setdefault(disease, []).append(symptom)
+        return detected
+
+
+# Function to list the symptoms of a scored match that count as reported by the patient;
+# less certain matches are asked about instead
+def reported_symptoms(detected, confidence=REPORTED_CONFIDENCE):
+    return {symptom for symptoms in detected.values() for symptom, score in symptoms.items() if score >= confidence}
@@ -0,0 +1,85 @@
+import datetime as dt
+import importlib.util
+import os
+import sys
+import threading
+
+import pytest
+
+# The modules live in the repository root (there is no package); every test uses the
+# in-memory MongoDB
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("MONGO_URI", "mongomock://")
+
+START = dt.datetime(2026, 10, 19, 9, 0, tzinfo=dt.timezone.utc)
+
+
+# Clock stand-in for job_queue.utc_now, moved on by the tests
+class Clock:
+    def __init__(self):
+        self.now = START
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += dt.timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    import job_queue
+
+    clock = Clock()
+    monkeypatch.setattr(job_queue, "utc_now", clock)
+    return clock
+
+
+# mongomock is not thread-safe: serialize its collection and cursor operations for the
+# tests that race threads against it (a real MongoDB does its own locking)
+def lock_mongomock():
+    import mongomock.collection
+
+    if getattr(mongomock.collection.Collection, "_test_locked", False):
+        return
+    lock = threading.RLock()
+
+    def locked(method):
+        def wrapper(*args, **kwargs):
+            with lock:
+                return method(*args, **kwargs)
+        return wrapper
+
+    for cls in (mongomock.collection.Collection, mongomock.collection.Cursor):
+        for name, method in list(vars(cls).items()):
+            if callable(method) and (not name.startswith("__") or name == "__next__") and name != "__init__":
+                setattr(cls, name, locked(method))
+    mongomock.collection.Collection._test_locked = True
+
+
+# Function to load one of the Flask apps on mongomock, with its job workers stopped (tests
+# run the jobs they need themselves)
+def load_app(filename, name):
+    lock_mongomock()
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.job_queue.stop()
+    return module
+
+
+# The booking app of 2)GoogleMeet_Schedule.py
+@pytest.fixture(scope="session")
+def booking_app():
+    module = load_app("2)GoogleMeet_Schedule.py", "booking_app")
+    yield module
+    module.mailer.close()
+
+
+# The booking app with slot resets and reminders of 3)Resetting_slot.py
+@pytest.fixture(scope="session")
+def reset_app():
+    module = load_app("3)Resetting_slot.py", "reset_app")
+    yield module
+    module.mailer.close()
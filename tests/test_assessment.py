@@ -0,0 +1,39 @@
+import pytest
+
+from assessment import assess_record
+from intake_session import evaluate_session, new_session
+from knowledge_base import load_knowledge_base
+
+PATIENT = {"name": "Ann", "age": "30", "sex": "female"}
+
+
+@pytest.fixture(scope="module")
+def knowledge_base():
+    return load_knowledge_base()
+
+
+# Function to give the batch verdict as (disease, symptom evaluation) pairs like the session's
+def batch_verdict(record, knowledge_base):
+    document = assess_record(dict(PATIENT, **record), knowledge_base)
+    return ([(item["disease"], item["symptom_evaluation"]) for item in document["confirmed_diagnoses"]],
+            [(item["disease"], item["symptom_evaluation"]) for item in document["unconfirmed_diagnoses"]])
+
+
+# Function to give the interview verdict for a description and the answers already given
+def session_verdict(description, answers, knowledge_base):
+    session = new_session(knowledge_base, PATIENT, description)
+    session["answers"].update(answers)
+    _, confirmed, not_confirmed, _ = evaluate_session(session, knowledge_base)
+    return confirmed, not_confirmed
+
+
+@pytest.mark.parametrize("answers", [{}, {"dischromic patches": False}])
+def test_batch_and_session_give_the_same_verdict(knowledge_base, answers):
+    description = "itching, skin rash, bumps, dark patches"
+    batch = batch_verdict({"symptoms": description, "answers": answers}, knowledge_base)
+    assert batch == session_verdict(description, answers, knowledge_base)
+
+
+def test_described_symptoms_confirm_a_disease_without_answers(knowledge_base):
+    confirmed, _ = batch_verdict({"symptoms": "itching, skin rash, bumps, dark patches"}, knowledge_base)
+    assert "fungal_infection" in [disease for disease, _ in confirmed]
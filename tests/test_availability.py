@@ -0,0 +1,27 @@
+import datetime as dt
+
+from availability import Availability
+from slot_store import SlotStore
+
+
+def rule(number, version=1, hours=("09:00", "12:00")):
+    return {"_id": f"doctor-{number}", "doctor_name": f"Dr. {number}", "timezone": "Asia/Kolkata",
+            "slot_minutes": 60, "weekly": {"Monday": [list(hours)]}, "version": version}
+
+
+def test_slot_cache_and_its_rules_stay_within_cache_size():
+    availability = Availability(None, SlotStore(None), cache_size=8)
+    monday = dt.date(2026, 10, 19)
+    for number in range(100):
+        assert len(availability.day_slots(rule(number), monday)) == 3
+    assert availability._day_slots.cache_info().currsize == 8
+
+
+def test_new_rule_version_is_not_served_from_the_cache():
+    availability = Availability(None, SlotStore(None))
+    monday = dt.date(2026, 10, 19)
+    assert len(availability.day_slots(rule(1), monday)) == 3
+    assert len(availability.day_slots(rule(1, version=2, hours=("09:00", "10:00")), monday)) == 1
+    # The same version is a cache hit, even for a new copy of the rule document
+    assert len(availability.day_slots(rule(1), monday)) == 3
+    assert availability._day_slots.cache_info().hits == 1
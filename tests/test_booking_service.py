@@ -0,0 +1,118 @@
+import asyncio
+import datetime as dt
+
+import pytest
+
+pytest.importorskip("quart")
+pytest.importorskip("mongomock_motor")
+
+import booking_service  # noqa: E402
+from database import APPOINTMENTS_DB, PATIENTS_DB, get_client  # noqa: E402
+from pymongo.errors import AutoReconnect  # noqa: E402
+
+DOCTOR = "Dr. Async"
+DAY = "Monday"
+TIME_SLOT = "10:00 AM - 11:00 AM"
+
+
+# AsyncCalendar stand-in: records inserted and deleted events; `fail` makes inserts raise
+# after the event was stored (as when the response is lost)
+class FakeCalendar:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.events = {}
+        self.deleted = []
+        self.bookings_at_insert = []
+
+    async def insert_event(self, event):
+        self.bookings_at_insert.append(await booking_service.bookings_collection.count_documents({"_id": event["id"]}))
+        self.events[event["id"]] = dict(event, conferenceData={"entryPoints": [{"uri": "https://meet.example/x"}]})
+        if self.fail:
+            raise TimeoutError("Calendar timed out")
+        return self.events[event["id"]]
+
+    async def delete_event(self, event_id):
+        self.deleted.append(event_id)
+        return self.events.pop(event_id, None) is not None
+
+
+class FakeMailer:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, to_email, template, context, key=None):
+        self.sent.append((to_email, template, key))
+        return True
+
+
+@pytest.fixture
+def service(monkeypatch):
+    client = get_client()
+    client[APPOINTMENTS_DB]["appointments"].delete_many({"doctor_name": DOCTOR})
+    client[APPOINTMENTS_DB]["bookings"].delete_many({})
+    client[APPOINTMENTS_DB]["appointments"].insert_one({
+        "doctor_name": DOCTOR, "doctor_email": "async@example.com", "specialization": "Neurologist",
+        "available_slots": {DAY: [{"time": TIME_SLOT, "available": True}]},
+    })
+    client[PATIENTS_DB]["patients"].delete_many({"_id": "async-assessment"})
+    client[PATIENTS_DB]["patients"].insert_one({
+        "_id": "async-assessment", "name": "Async Patient", "age": 30, "sex": "male",
+        "assessed_at": dt.datetime.now(dt.timezone.utc),
+        "confirmed_diagnoses": [{"disease": "Migraine", "symptom_evaluation": ["headache: yes"]}],
+    })
+    monkeypatch.setattr(booking_service, "mailer", FakeMailer())
+    return client
+
+
+def book():
+    async def post():
+        response = await booking_service.app.test_client().post("/book_appointment", json={
+            "doctor_name": DOCTOR, "day": DAY, "time_slot": TIME_SLOT, "patient_email": "p@example.com",
+            "patient_name": "Async Patient", "assessment_id": "async-assessment",
+        })
+        return response.status_code, await response.get_json()
+    return asyncio.run(post())
+
+
+def slot_available(client):
+    doctor = client[APPOINTMENTS_DB]["appointments"].find_one({"doctor_name": DOCTOR})
+    return doctor["available_slots"][DAY][0]["available"]
+
+
+def test_booking_is_recorded_before_its_event_is_created(service, monkeypatch):
+    calendar = FakeCalendar()
+    monkeypatch.setattr(booking_service, "calendar", calendar)
+    status, body = book()
+    assert status == 200
+    assert calendar.bookings_at_insert == [1]
+    booking = service[APPOINTMENTS_DB]["bookings"].find_one({"_id": body["booking_id"]})
+    assert booking["status"] == "scheduled"
+    assert "- Migraine\n  Symptom Evaluation:\n  headache: yes" in booking["patient_info"]
+    assert not slot_available(service)
+    assert len(booking_service.mailer.sent) == 2
+
+
+def test_failed_booking_insert_creates_no_event(service, monkeypatch):
+    calendar = FakeCalendar()
+    monkeypatch.setattr(booking_service, "calendar", calendar)
+
+    async def insert_fails(document):
+        raise AutoReconnect("connection reset")
+
+    monkeypatch.setattr(booking_service.bookings_collection, "insert_one", insert_fails)
+    status, _ = book()
+    assert status == 500
+    assert calendar.events == {}
+    assert slot_available(service)
+
+
+def test_failed_event_is_cancelled_and_the_slot_released(service, monkeypatch):
+    calendar = FakeCalendar(fail=True)
+    monkeypatch.setattr(booking_service, "calendar", calendar)
+    status, _ = book()
+    assert status == 502
+    assert calendar.events == {}
+    assert len(calendar.deleted) == 1
+    assert service[APPOINTMENTS_DB]["bookings"].find_one({"_id": calendar.deleted[0]})["status"] == "failed"
+    assert slot_available(service)
+    assert booking_service.mailer.sent == []
@@ -0,0 +1,105 @@
+import datetime as dt
+
+import pytest
+
+from calendar_sync import CalendarSync
+from database import get_client
+
+NOW = dt.datetime(2030, 1, 15, 12, 0, tzinfo=dt.timezone.utc)
+DAY = "Tuesday"
+
+
+# Calendar events resource stand-in: events.list answers every sync token with the changes
+# made since it was handed out
+class FakeEvents:
+    def __init__(self):
+        self.changes = []
+        self.tokens = []
+
+    def list(self, pageToken=None, syncToken=None, **params):
+        self.tokens.append(syncToken)
+        since = int(syncToken) if syncToken else 0
+        response = {"items": self.changes[since:], "nextSyncToken": str(len(self.changes))}
+        return Request(response)
+
+
+class Request:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+# Collection stand-in whose first bulk_write runs after a booking moved the doctor's
+# appointments (so the guarded update no longer matches)
+class RacingCollection:
+    def __init__(self, collection):
+        self.collection = collection
+        self.race = True
+
+    def find(self, *args, **kwargs):
+        return self.collection.find(*args, **kwargs)
+
+    def bulk_write(self, operations, ordered=True):
+        if self.race:
+            self.race = False
+            self.collection.update_one({"doctor_name": "Dr. Sync"}, {"$push": {f"appointments.{DAY}": {
+                "$each": [{"time_slot": "09:00 AM - 10:00 AM", "event_id": "new-event", "available": False,
+                           "end_utc": NOW + dt.timedelta(days=1)}],
+                "$position": 0,
+            }}})
+        return self.collection.bulk_write(operations, ordered=ordered)
+
+
+@pytest.fixture
+def collections():
+    db = get_client("mongomock://")["calendar_sync_test"]
+    db["appointments"].delete_many({})
+    db["calendar_sync_state"].delete_many({})
+    db["appointments"].insert_one({"doctor_name": "Dr. Sync", "appointments": {DAY: [
+        {"time_slot": "03:00 PM - 04:00 PM", "event_id": "event-1", "available": False,
+         "end_utc": NOW + dt.timedelta(hours=3)},
+    ]}})
+    return db["appointments"], db["calendar_sync_state"]
+
+
+def appointment(collection, event_id):
+    doctor = collection.find_one({"doctor_name": "Dr. Sync"})
+    return next(slot for slot in doctor["appointments"][DAY] if slot["event_id"] == event_id)
+
+
+def test_cancelled_meeting_releases_its_slot_and_advances_the_token(collections):
+    collection, state = collections
+    events = FakeEvents()
+    CalendarSync(collection, state, events).run(NOW)
+    assert state.find_one()["sync_token"] == "0"
+
+    events.changes.append({"id": "event-1", "status": "cancelled"})
+    assert CalendarSync(collection, state, events).run(NOW) == 1
+    assert appointment(collection, "event-1")["available"] is True
+    assert state.find_one()["sync_token"] == "1"
+
+
+def test_change_that_was_not_applied_is_listed_again(collections):
+    collection, state = collections
+    events = FakeEvents()
+    CalendarSync(collection, state, events).run(NOW)
+
+    # The meeting was moved to end sooner, and a booking changes the array during the sync
+    events.changes.append({"id": "event-1", "status": "confirmed",
+                           "end": {"dateTime": (NOW + dt.timedelta(hours=1)).isoformat()}})
+    racing = RacingCollection(collection)
+    CalendarSync(racing, state, events).run(NOW)
+    assert as_naive(appointment(collection, "event-1")["end_utc"]) == as_naive(NOW + dt.timedelta(hours=3))
+    assert state.find_one()["sync_token"] == "0"
+
+    # The next run asks from the same token and applies the change
+    CalendarSync(racing, state, events).run(NOW)
+    assert events.tokens[-1] == "0"
+    assert as_naive(appointment(collection, "event-1")["end_utc"]) == as_naive(NOW + dt.timedelta(hours=1))
+    assert state.find_one()["sync_token"] == "1"
+
+
+def as_naive(value):
+    return value.replace(tzinfo=None) if value.tzinfo else value
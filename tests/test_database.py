@@ -0,0 +1,137 @@
+import asyncio
+import queue
+import threading
+import time
+
+import pytest
+from pymongo import UpdateOne
+from pymongo.errors import AutoReconnect
+
+from database import BufferedWriter, get_client, get_async_client
+
+
+# Collection stand-in: a mongomock collection that records the size of each bulk write and
+# can fail the next ones
+class RecordingCollection:
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+        self.batches = []
+        self.fail_next = 0
+        self.written = threading.Event()
+
+    def bulk_write(self, operations, ordered=True):
+        self.batches.append(len(operations))
+        if self.fail_next:
+            self.fail_next -= 1
+            raise AutoReconnect("connection reset")
+        result = self.collection.bulk_write(operations, ordered=ordered)
+        self.written.set()
+        return result
+
+
+@pytest.fixture
+def collection(request):
+    collection = get_client("mongomock://")["writer_test"][request.node.name]
+    collection.delete_many({})
+    return RecordingCollection(collection)
+
+
+def test_batch_is_written_when_it_is_full(collection):
+    writer = BufferedWriter(collection, batch_size=3, flush_interval=60)
+    for number in range(3):
+        writer.write({"_id": number})
+    assert collection.written.wait(5)
+    assert collection.batches == [3]
+
+    # A smaller batch waits for the interval (or a flush)
+    collection.written.clear()
+    writer.write({"_id": 3})
+    assert not collection.written.wait(0.2)
+    assert writer.close()
+    assert collection.batches == [3, 1]
+
+
+def test_batch_is_written_after_the_flush_interval(collection):
+    writer = BufferedWriter(collection, batch_size=100, flush_interval=0.1)
+    started = time.monotonic()
+    writer.write({"_id": 1})
+    writer.write({"_id": 2})
+    assert collection.written.wait(5)
+    assert time.monotonic() - started >= 0.1
+    assert collection.batches == [2]
+    assert collection.collection.count_documents({}) == 2
+    writer.close()
+
+
+def test_close_writes_what_is_left(collection):
+    writer = BufferedWriter(collection, batch_size=100, flush_interval=60)
+    for number in range(5):
+        writer.write({"_id": number})
+    writer.write(UpdateOne({"_id": 0}, {"$set": {"seen": True}}))
+    assert collection.batches == []
+    assert writer.close()
+    assert collection.batches == [6]
+    assert writer.written == 6
+    assert collection.collection.find_one({"_id": 0})["seen"] is True
+    with pytest.raises(RuntimeError):
+        writer.write({"_id": 5})
+    # Closing twice is harmless
+    assert writer.close()
+
+
+def test_flush_reports_failed_writes_once(collection):
+    collection.collection.insert_one({"_id": 1})
+    writer = BufferedWriter(collection, batch_size=100, flush_interval=60)
+    for number in range(3):
+        writer.write({"_id": number})
+    # The duplicate fails alone, the other documents of the unordered batch are written
+    assert writer.flush() is False
+    assert (writer.written, writer.failed) == (2, 1)
+    assert writer.flush() is True
+
+    collection.fail_next = 1
+    writer.write({"_id": 10})
+    writer.write({"_id": 11})
+    assert writer.flush() is False
+    assert (writer.written, writer.failed) == (2, 3)
+    assert collection.collection.count_documents({"_id": {"$in": [10, 11]}}) == 0
+
+    writer.write({"_id": 12})
+    assert writer.close() is True
+    assert writer.written == 3
+
+
+def test_close_reports_a_failed_last_batch(collection):
+    collection.fail_next = 1
+    writer = BufferedWriter(collection, batch_size=100, flush_interval=60)
+    writer.write({"_id": 1})
+    assert writer.close() is False
+    assert writer.failed == 1
+
+
+def test_write_blocks_while_the_queue_is_full(collection):
+    writer = BufferedWriter(collection, batch_size=100, flush_interval=60, max_pending=2)
+    release = threading.Event()
+    bulk_write = collection.bulk_write
+    collection.bulk_write = lambda operations, ordered=True: release.wait() and bulk_write(operations, ordered)
+    writer.write({"_id": 1})
+    writer.write({"_id": 2})
+    threading.Thread(target=writer.flush, daemon=True).start()
+    time.sleep(0.1)  # the worker is stuck writing 1 and 2
+    writer.write({"_id": 3}, timeout=1)
+    writer.write({"_id": 4}, timeout=1)
+    with pytest.raises(queue.Full):
+        writer.write({"_id": 5}, timeout=0.1)
+    release.set()
+    assert writer.close()
+    assert collection.collection.count_documents({}) == 4
+
+
+def test_clients_are_shared_per_uri():
+    assert get_client("mongomock://") is get_client("mongomock://")
+    assert get_async_client("mongomock://") is get_async_client("mongomock://")
+    # The async client sees the data of the sync one
+    get_client("mongomock://")["writer_test"]["shared"].insert_one({"_id": "shared"})
+    shared = get_async_client("mongomock://")["writer_test"]["shared"]
+    assert asyncio.run(shared.find_one({"_id": "shared"})) == {"_id": "shared"}
@@ -0,0 +1,215 @@
+import datetime as dt
+import socket
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from conftest import START
+from database import get_client
+from job_queue import JobQueue
+
+
+# Function to return a UTC time as MongoDB gives it back (naive)
+def stored(seconds_after_start):
+    return (START + dt.timedelta(seconds=seconds_after_start)).replace(tzinfo=None)
+
+
+@pytest.fixture
+def jobs():
+    collection = get_client("mongomock://")["job_queue_test"]["jobs"]
+    collection.delete_many({})
+    return collection
+
+
+def test_job_of_a_dead_worker_is_leased_again_after_its_lease(clock, jobs):
+    done = []
+    queue = JobQueue(jobs, {"work": done.append}, lease_seconds=60)
+    queue.enqueue("work", {"n": 1}, "job-1")
+
+    # The first worker leases the job and dies before running it
+    assert queue.claim()["attempts"] == 1
+    clock.advance(59)
+    assert queue.claim() is None
+
+    clock.advance(2)
+    job = queue.claim()
+    assert job["_id"] == "job-1"
+    assert job["attempts"] == 2
+    assert queue.run(job) == "done"
+    assert done == [{"n": 1}]
+    assert queue.get("job-1")["status"] == "done"
+
+
+def test_failed_job_is_retried_with_backoff_until_max_attempts(clock, jobs):
+    calls = []
+
+    def flaky(payload):
+        calls.append(clock.now)
+        raise RuntimeError("service unavailable")
+
+    queue = JobQueue(jobs, {"flaky": flaky}, max_attempts=3)
+    queue.enqueue("flaky", {}, "job-1")
+
+    assert queue.run_pending() == 1
+    job = queue.get("job-1")
+    assert job["status"] == "pending"
+    assert job["error"] == "service unavailable"
+    assert job["run_after"] == stored(2)
+    assert "locked_until" not in job
+
+    # Not due before its backoff is over
+    clock.advance(1)
+    assert queue.run_pending() == 0
+    clock.advance(1)
+    assert queue.run_pending() == 1
+    assert queue.get("job-1")["run_after"] == stored(2 + 4)
+
+    clock.advance(4)
+    assert queue.run_pending() == 1
+    job = queue.get("job-1")
+    assert job["status"] == "failed"
+    assert job["attempts"] == 3
+    assert len(calls) == 3
+    clock.advance(3600)
+    assert queue.run_pending() == 0
+
+
+def test_job_that_succeeds_on_retry_is_done(clock, jobs):
+    attempts = []
+
+    def once_flaky(payload):
+        attempts.append(payload)
+        if len(attempts) == 1:
+            raise RuntimeError("timeout")
+        return "sent"
+
+    queue = JobQueue(jobs, {"send": once_flaky})
+    queue.enqueue("send", {"to": "a@example.com"}, "job-1")
+    queue.run_pending()
+    clock.advance(2)
+    queue.run_pending()
+    job = queue.get("job-1")
+    assert (job["status"], job["result"], job["attempts"]) == ("done", "sent", 2)
+
+
+def test_repeated_idempotency_key_is_enqueued_once(clock, jobs):
+    done = []
+    queue = JobQueue(jobs, {"work": done.append})
+    assert queue.enqueue("work", {"n": 1}, "booking-1-email") is True
+    assert queue.enqueue("work", {"n": 2}, "booking-1-email") is False
+    assert queue.run_pending() == 1
+    # A key that is done already is not run again either
+    assert queue.enqueue("work", {"n": 3}, "booking-1-email") is False
+    assert queue.run_pending() == 0
+    assert done == [{"n": 1}]
+    assert jobs.count_documents({}) == 1
+
+
+# Google Calendar stand-in: stores inserted events by ID, like the API rejects a second
+# insert of an ID with 409; `lose_responses` inserts drop the connection after storing
+class FakeCalendar:
+    def __init__(self, lose_responses=0):
+        self.events_by_id = {}
+        self.lose_responses = lose_responses
+
+    def events(self):
+        return self
+
+    def insert(self, calendarId, body, conferenceDataVersion, sendUpdates):
+        return Request(lambda: self._insert(body))
+
+    def get(self, calendarId, eventId):
+        return Request(lambda: self.events_by_id[eventId])
+
+    def _insert(self, body):
+        if body["id"] in self.events_by_id:
+            raise HttpError(httplib2.Response({"status": 409}), b"The requested identifier already exists.")
+        event = dict(body, htmlLink=f"https://calendar.example/{body['id']}",
+                     conferenceData={"entryPoints": [{"uri": f"https://meet.example/{body['id'][:10]}"}]})
+        self.events_by_id[body["id"]] = event
+        if self.lose_responses:
+            self.lose_responses -= 1
+            raise socket.timeout("The read operation timed out")
+        return event
+
+
+class Request:
+    def __init__(self, execute):
+        self.execute = execute
+
+
+# Mailer stand-in: records the emails it was given
+class FakeMailer:
+    def __init__(self):
+        self.sent = []
+
+    def deliver(self, to_email, subject, body, key=None):
+        self.sent.append((to_email, subject, key))
+        return True
+
+
+def test_retried_calendar_job_creates_one_event(clock, booking_app, monkeypatch):
+    calendar = FakeCalendar(lose_responses=1)
+    mailer = FakeMailer()
+    monkeypatch.setattr(booking_app, "calendar_manager", calendar)
+    monkeypatch.setattr(booking_app, "mailer", mailer)
+    booking_app.job_queue.collection.delete_many({})
+    booking_app.bookings_collection.delete_many({})
+    booking_app.bookings_collection.insert_one({
+        "_id": "b1", "doctor_name": "Dr. Jobs", "doctor_email": "doctor@example.com", "day": "Monday",
+        "time_slot": "10:00 AM - 11:00 AM", "slot_id": None, "patient_name": "Ann",
+        "patient_email": "ann@example.com", "patient_info": "Patient Name: Ann", "status": "pending",
+    })
+    booking_app.job_queue.enqueue("create_calendar_event", {"booking_id": "b1"}, "b1-calendar-event")
+
+    # The insert's response is lost: the job fails although the event exists
+    booking_app.job_queue.run_pending()
+    assert booking_app.job_queue.get("b1-calendar-event")["status"] == "pending"
+    assert booking_app.bookings_collection.find_one({"_id": "b1"})["status"] == "pending"
+
+    # The retry finds the event under the booking's ID instead of creating a second one
+    clock.advance(2)
+    booking_app.job_queue.run_pending()
+    assert booking_app.job_queue.get("b1-calendar-event")["status"] == "done"
+    assert list(calendar.events_by_id) == ["b1"]
+    assert calendar.events_by_id["b1"]["description"] == "Doctor appointment scheduled.\n\nPatient Name: Ann"
+    booking = booking_app.bookings_collection.find_one({"_id": "b1"})
+    assert (booking["status"], booking["meet_link"]) == ("scheduled", "https://meet.example/b1")
+    # ... and queues a job for each confirmation email
+    assert booking_app.job_queue.get("b1-doctor-email")["status"] == "done"
+    assert sorted(mailer.sent) == [
+        ("ann@example.com", "Appointment Confirmation with Dr. Jobs", "b1-patient-email"),
+        ("doctor@example.com", "New Appointment Scheduled with Ann", "b1-doctor-email"),
+    ]
+
+
+def test_slow_worker_does_not_overwrite_the_outcome_of_the_new_lease(clock, jobs):
+    queue = JobQueue(jobs, {"work": lambda payload: payload["n"]}, lease_seconds=60)
+    queue.enqueue("work", {"n": 1}, "job-1")
+
+    # The first worker stalls past its lease; a second worker leases and finishes the job
+    stalled = queue.claim()
+    clock.advance(61)
+    assert queue.run(queue.claim()) == "done"
+    finished = queue.get("job-1")
+
+    # The stalled worker's outcome is dropped
+    assert queue.run(stalled) == "lost"
+    assert queue.get("job-1") == finished
+
+
+def test_job_whose_worker_keeps_dying_fails_after_max_attempts(clock, jobs):
+    queue = JobQueue(jobs, {"work": lambda payload: None}, max_attempts=2, lease_seconds=60)
+    queue.enqueue("work", {}, "job-1")
+
+    # Every worker that leases the job dies with it
+    assert queue.claim()["attempts"] == 1
+    clock.advance(61)
+    assert queue.claim()["attempts"] == 2
+    clock.advance(61)
+    assert queue.claim() is None
+    job = queue.get("job-1")
+    assert (job["status"], job["attempts"]) == ("failed", 2)
+    assert "locked_until" not in job
+    assert queue.run_pending() == 0
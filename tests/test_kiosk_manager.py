@@ -0,0 +1,160 @@
+import json
+import socket
+import threading
+
+import pytest
+
+import kiosk_manager
+from database import get_client
+from knowledge_base import load_knowledge_base
+from patient_log import PatientLog
+
+HEADER = kiosk_manager.HEADER
+
+
+@pytest.fixture(scope="module")
+def knowledge_base():
+    return load_knowledge_base()
+
+
+# Patient answers by prompt; "Do you have ...?" questions get `symptom_answer`
+def answer(prompt, name="Ann", symptom_answer="yes"):
+    if prompt == "What is your name?":
+        return name
+    if prompt.startswith("How old"):
+        return "34"
+    if prompt.startswith("What is your Gender"):
+        return "female"
+    if prompt == "Please describe your symptoms.":
+        return "i have itching and a skin rash"
+    return symptom_answer
+
+
+# Recognizer stand-in: each audio chunk is the text heard so far, and the partial
+# hypothesis is accepted as Vosk would accept it
+class PartialRecognizer:
+    def __init__(self):
+        self.texts = []
+
+    def transcribe_stream(self, chunks, accept_partial=None):
+        text = ""
+        for chunk in chunks:
+            text = chunk.decode("utf-8")
+            if accept_partial and accept_partial(text):
+                break
+        self.texts.append(text)
+        return text
+
+
+# Channel stand-in: answers every yes/no question with the partials of "i know i have it, yes"
+class PartialsChannel:
+    name = "partials"
+
+    def __init__(self):
+        self.prompt = ""
+        self.result = None
+
+    def say(self, message):
+        self.prompt = message
+
+    def listen(self, recognizer, accept_partial=None):
+        text = answer(self.prompt)
+        if text != "yes":
+            return text
+        partials = ["i", "i know", "i know i have", "i know i have it yes"]
+        return recognizer.transcribe_stream((partial.encode("utf-8") for partial in partials), accept_partial)
+
+    def finish(self, result):
+        self.result = result
+
+
+def receive_frame(connection):
+    data = b""
+    while len(data) < HEADER.size:
+        chunk = connection.recv(HEADER.size - len(data))
+        if not chunk:
+            return None, b""
+        data += chunk
+    kind, length = HEADER.unpack(data)
+    payload = b""
+    while len(payload) < length:
+        payload += connection.recv(length - len(payload))
+    return kind, payload
+
+
+# Function to run one kiosk over a socket with typed answers; returns the result (or the
+# last prompt if it was turned away)
+def run_kiosk(port, name):
+    with socket.create_connection(("127.0.0.1", port)) as connection:
+        prompt = ""
+        while True:
+            kind, payload = receive_frame(connection)
+            if kind is None:
+                return prompt
+            if kind == kiosk_manager.PROMPT:
+                prompt = payload.decode("utf-8")
+            elif kind == kiosk_manager.LISTEN:
+                text = answer(prompt, name).encode("utf-8")
+                connection.sendall(HEADER.pack(kiosk_manager.TEXT, len(text)) + text)
+            elif kind == kiosk_manager.RESULT:
+                return json.loads(payload)
+
+
+@pytest.fixture
+def manager(knowledge_base, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # session traces
+    patient_log = PatientLog(str(tmp_path / "patient_log"))
+    collection = get_client("mongomock://")["kiosk_test"]["patients"]
+    collection.delete_many({})
+    yield kiosk_manager.KioskManager(knowledge_base, PartialRecognizer(), patient_log, collection, max_sessions=2)
+    patient_log.close()
+
+
+@pytest.fixture
+def server(manager):
+    server = kiosk_manager.KioskServer(("127.0.0.1", 0), manager)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_partial_i_know_is_not_taken_for_no(manager):
+    channel = PartialsChannel()
+    result = manager.run_session(channel)
+    assert result is not None
+    assert manager.recognizer.texts
+    # Every yes/no answer was heard to the end (a stop at "i know" would have recorded a no)
+    assert all(text == "i know i have it yes" for text in manager.recognizer.texts)
+    assert manager.patient_log.get(result["assessment_id"])["name"] == "Ann"
+
+
+def test_concurrent_kiosks_are_assessed_and_stored(manager, server):
+    results = [None, None]
+
+    def kiosk(index):
+        results[index] = run_kiosk(server.server_address[1], f"Patient {index}")
+
+    threads = [threading.Thread(target=kiosk, args=(index,)) for index in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert all(isinstance(result, dict) for result in results)
+    ids = {result["assessment_id"] for result in results}
+    assert len(ids) == 2
+    assert {document["_id"] for document in manager.patients_collection.find()} == ids
+    assert {manager.patient_log.get(assessment_id)["name"] for assessment_id in ids} == {"Patient 0", "Patient 1"}
+
+
+def test_kiosk_beyond_max_sessions_is_turned_away(manager, server):
+    # Hold both sessions at their first question
+    held = [socket.create_connection(("127.0.0.1", server.server_address[1])) for _ in range(2)]
+    try:
+        for connection in held:
+            while receive_frame(connection)[0] != kiosk_manager.LISTEN:
+                pass
+        assert run_kiosk(server.server_address[1], "Late") == "All assessment lines are busy. Please try again in a moment."
+    finally:
+        for connection in held:
+            connection.close()
@@ -0,0 +1,220 @@
+import datetime as dt
+import logging
+import smtplib
+import socket
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+
+from aiosmtpd.controller import Controller  # noqa: E402
+
+from database import get_client  # noqa: E402
+from mailer import Mailer, SMTPPool  # noqa: E402
+from slot_store import BOOKED  # noqa: E402
+
+logging.getLogger("mail.log").setLevel(logging.ERROR)
+
+
+# SMTP server stand-in: keeps the accepted messages, answers the next `fail_next` messages
+# with a temporary error and the next `refuse_next` with a permanent one
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.fail_next = 0
+        self.refuse_next = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.fail_next:
+            self.fail_next -= 1
+            return "451 Try again later"
+        if self.refuse_next:
+            self.refuse_next -= 1
+            return "550 Mailbox unavailable"
+        self.messages.append((envelope.rcpt_tos[0], envelope.content.decode("utf-8", "replace")))
+        return "250 Message accepted"
+
+
+def free_port():
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        return listener.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield controller
+    controller.stop()
+
+
+@pytest.fixture
+def sent_log():
+    collection = get_client("mongomock://")["mailer_test"]["sent_emails"]
+    collection.delete_many({})
+    return collection
+
+
+@pytest.fixture
+def dead_letters():
+    collection = get_client("mongomock://")["mailer_test"]["email_dead_letters"]
+    collection.delete_many({})
+    return collection
+
+
+def make_mailer(smtp_server, sent_log, dead_letters=None):
+    pool = SMTPPool(smtp_server.hostname, smtp_server.port, username="", password="", starttls=False, size=2)
+    return Mailer(pool, "clinic@example.com", dead_letters=dead_letters, rate=0, sent_log=sent_log)
+
+
+def test_deliver_sends_an_email_once_per_key(smtp_server, sent_log):
+    mailer = make_mailer(smtp_server, sent_log)
+    assert mailer.deliver("ann@example.com", "Hello", "Body", key="b1-patient-email") is True
+    assert mailer.deliver("ann@example.com", "Hello", "Body", key="b1-patient-email") is False
+    assert mailer.deliver("ann@example.com", "Hello", "Body") is True
+    mailer.close()
+
+    # The key is remembered across a restart
+    restarted = make_mailer(smtp_server, sent_log)
+    assert restarted.deliver("ann@example.com", "Hello", "Body", key="b1-patient-email") is False
+    assert len(smtp_server.handler.messages) == 2
+    assert restarted.pool.opened == 0
+
+
+def test_deliver_raises_and_records_nothing_when_the_server_refuses(smtp_server, sent_log):
+    mailer = make_mailer(smtp_server, sent_log)
+    smtp_server.handler.fail_next = 1
+    with pytest.raises(smtplib.SMTPDataError):
+        mailer.deliver("ann@example.com", "Hello", "Body", key="b1-patient-email")
+    assert sent_log.count_documents({}) == 0
+    assert mailer.deliver("ann@example.com", "Hello", "Body", key="b1-patient-email") is True
+    assert len(smtp_server.handler.messages) == 1
+    mailer.close()
+
+
+def test_deliver_dead_letters_a_permanently_refused_email(smtp_server, sent_log, dead_letters):
+    mailer = make_mailer(smtp_server, sent_log, dead_letters)
+    smtp_server.handler.refuse_next = 1
+    assert mailer.deliver("gone@example.com", "Hello", "Body", key="b1-patient-email") is False
+    letter = dead_letters.find_one()
+    assert (letter["to_email"], letter["key"]) == ("gone@example.com", "b1-patient-email")
+    assert "Mailbox unavailable" in letter["error"]
+    assert sent_log.count_documents({}) == 0
+
+    # It can be sent again once the address is fixed
+    assert mailer.retry_dead_letters() == 1
+    mailer.flush()
+    assert [to for to, _ in smtp_server.handler.messages] == ["gone@example.com"]
+    mailer.close()
+
+
+def test_queued_emails_skip_repeated_keys(smtp_server, sent_log):
+    mailer = make_mailer(smtp_server, sent_log)
+    context = {"doctor_name": "Dr. Mail", "patient_name": "Ann", "day": "Monday",
+               "time_slot": "10:00 AM - 11:00 AM", "meet_link": "https://meet.example/b1"}
+    assert mailer.send("ann@example.com", "appointment_reminder", context, "b1-reminder") is True
+    assert mailer.send("ann@example.com", "appointment_reminder", context, "b1-reminder") is False
+    mailer.flush()
+    assert mailer.send("ann@example.com", "appointment_reminder", context, "b1-reminder") is False
+    mailer.close()
+    assert len(smtp_server.handler.messages) == 1
+    assert "Reminder: Appointment with Dr. Mail on Monday" in smtp_server.handler.messages[0][1]
+
+
+@pytest.fixture
+def app_mailer(booking_app, smtp_server, sent_log, monkeypatch):
+    mailer = make_mailer(smtp_server, sent_log)
+    monkeypatch.setattr(booking_app, "mailer", mailer)
+    booking_app.job_queue.collection.delete_many({})
+    yield mailer
+    mailer.close()
+
+
+def enqueue_confirmation(app, key="b1-patient-email"):
+    app.job_queue.enqueue("send_email", {
+        "to_email": "ann@example.com",
+        "template": "patient_confirmation",
+        "context": {"doctor_name": "Dr. Mail", "patient_name": "Ann", "time_slot": "10:00 AM - 11:00 AM",
+                    "meet_link": "https://meet.example/b1"},
+        "key": key,
+    }, key)
+
+
+def test_email_job_is_done_only_after_the_server_accepted_it(clock, booking_app, app_mailer, smtp_server):
+    smtp_server.handler.fail_next = 1
+    enqueue_confirmation(booking_app)
+
+    booking_app.job_queue.run_pending()
+    job = booking_app.job_queue.get("b1-patient-email")
+    assert job["status"] == "pending"
+    assert "Try again later" in job["error"]
+    assert smtp_server.handler.messages == []
+
+    clock.advance(2)
+    booking_app.job_queue.run_pending()
+    assert booking_app.job_queue.get("b1-patient-email")["status"] == "done"
+    assert [to for to, _ in smtp_server.handler.messages] == ["ann@example.com"]
+    assert "Appointment Confirmation with Dr. Mail" in smtp_server.handler.messages[0][1]
+
+
+def test_refused_email_job_is_done_without_retrying(clock, booking_app, smtp_server, sent_log, dead_letters,
+                                                   monkeypatch):
+    mailer = make_mailer(smtp_server, sent_log, dead_letters)
+    monkeypatch.setattr(booking_app, "mailer", mailer)
+    booking_app.job_queue.collection.delete_many({})
+    smtp_server.handler.refuse_next = 1
+    enqueue_confirmation(booking_app)
+
+    booking_app.job_queue.run_pending()
+    job = booking_app.job_queue.get("b1-patient-email")
+    assert (job["status"], job["attempts"], job["result"]) == ("done", 1, {"sent": False})
+    assert dead_letters.count_documents({"key": "b1-patient-email"}) == 1
+    assert smtp_server.handler.messages == []
+    mailer.close()
+
+
+def test_email_job_that_runs_again_does_not_repeat_its_email(clock, booking_app, app_mailer, smtp_server):
+    enqueue_confirmation(booking_app)
+
+    # A worker sends the email and dies before marking the job done
+    job = booking_app.job_queue.claim()
+    booking_app.send_email_job(job["payload"])
+
+    clock.advance(booking_app.job_queue.lease_seconds + 1)
+    assert booking_app.job_queue.run_pending() == 1
+    job = booking_app.job_queue.get("b1-patient-email")
+    assert (job["status"], job["result"]) == ("done", {"sent": False})
+    assert len(smtp_server.handler.messages) == 1
+
+
+def test_booking_is_reminded_only_after_the_reminder_was_sent(clock, reset_app, smtp_server, sent_log, monkeypatch):
+    mailer = make_mailer(smtp_server, sent_log)
+    monkeypatch.setattr(reset_app, "mailer", mailer)
+    reset_app.job_queue.collection.delete_many({})
+    reset_app.bookings_collection.delete_many({})
+    reset_app.slot_store.collection.delete_many({})
+    start = dt.datetime.now(dt.timezone.utc).replace(microsecond=0) + dt.timedelta(hours=3)
+    doctor = {"_id": "doctor-1", "doctor_name": "Dr. Mail", "specialization": "Dermatologist"}
+    reset_app.slot_store.add_slots([reset_app.slot_store.make_slot(
+        doctor, start, start + dt.timedelta(minutes=30), status=BOOKED, booking_id="b1")])
+    reset_app.bookings_collection.insert_one({
+        "_id": "b1", "doctor_name": "Dr. Mail", "patient_name": "Ann", "patient_email": "ann@example.com",
+        "day": "Monday", "time_slot": "10:00 AM - 11:00 AM", "status": "scheduled",
+        "meet_link": "https://meet.example/b1",
+    })
+
+    smtp_server.handler.fail_next = 1
+    reset_app.send_appointment_reminders()
+    reset_app.job_queue.run_pending()
+    assert "reminder_sent_at" not in reset_app.bookings_collection.find_one({"_id": "b1"})
+    # The next run does not queue the reminder a second time
+    reset_app.send_appointment_reminders()
+    assert reset_app.job_queue.collection.count_documents({}) == 1
+
+    clock.advance(2)
+    reset_app.job_queue.run_pending()
+    assert "reminder_sent_at" in reset_app.bookings_collection.find_one({"_id": "b1"})
+    assert [to for to, _ in smtp_server.handler.messages] == ["ann@example.com"]
+    mailer.close()
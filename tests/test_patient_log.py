@@ -0,0 +1,72 @@
+import datetime as dt
+import json
+import os
+
+import pytest
+
+import patient_log
+from patient_log import PatientLog, dump_record
+
+ASSESSED_AT = dt.datetime(2026, 10, 19, 9, 0, tzinfo=dt.timezone.utc)
+
+
+def record(number):
+    return {"_id": f"a{number}", "patient_id": "p1", "name": "Ann", "assessed_at": ASSESSED_AT}
+
+
+# Function to read every file of the log directory
+def snapshot(directory):
+    files = {}
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), "rb") as log_file:
+            files[name] = log_file.read()
+    return files
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    # A writer logged two records and crashed while writing a third: the second record's
+    # index line is lost and the third record is torn
+    directory = str(tmp_path / "patient_log")
+    writer = PatientLog(directory, compress=False, fsync=False)
+    writer.append(record(1))
+    writer.close()
+    with open(os.path.join(directory, "patients-000001.jsonl"), "ab") as data_file:
+        data_file.write(dump_record(record(2)))
+        data_file.write(dump_record(record(3))[:10])
+    return directory
+
+
+def test_read_only_log_reads_without_changing_the_files(log_dir):
+    before = snapshot(log_dir)
+    reader = PatientLog(log_dir, read_only=True)
+    assert reader.get("a2")["assessed_at"] == ASSESSED_AT
+    assert [found["_id"] for found in reader.find("p1", "2026-10-19")] == ["a1", "a2"]
+    assert [found["_id"] for found in reader] == ["a1", "a2"]
+    with pytest.raises(RuntimeError):
+        reader.append(record(4))
+    reader.close()
+    assert snapshot(log_dir) == before
+
+    # The writer still repairs the log when it opens it
+    writer = PatientLog(log_dir, compress=False, fsync=False)
+    assert len(writer) == 2
+    writer.close()
+    with open(os.path.join(log_dir, "patients-000001.idx"), encoding="utf-8") as index_file:
+        assert [json.loads(line)["id"] for line in index_file] == ["a1", "a2"]
+
+
+def test_read_commands_leave_the_log_alone(log_dir, capsys):
+    before = snapshot(log_dir)
+    patient_log.main(["get", "a2", "--log-dir", log_dir])
+    patient_log.main(["dump", "--log-dir", log_dir])
+    assert [json.loads(line)["_id"] for line in capsys.readouterr().out.splitlines()] == ["a2", "a1", "a2"]
+    assert snapshot(log_dir) == before
+
+
+def test_read_only_log_of_a_missing_directory_is_empty(tmp_path):
+    reader = PatientLog(str(tmp_path / "missing"), read_only=True)
+    assert len(reader) == 0
+    assert reader.get("a1") is None
+    reader.close()
+    assert not os.path.exists(tmp_path / "missing")
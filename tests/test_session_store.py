@@ -0,0 +1,63 @@
+import threading
+
+from session_store import SessionStore
+
+
+def test_slow_change_does_not_block_other_sessions():
+    store = SessionStore()
+    slow_id = store.create({"step": 0})
+    other_id = store.create({"step": 0})
+    started, release = threading.Event(), threading.Event()
+
+    def slow(session):
+        started.set()
+        release.wait(5)
+        session["step"] += 1
+
+    thread = threading.Thread(target=store.update, args=(slow_id, slow))
+    thread.start()
+    assert started.wait(5)
+    session, _ = store.update(other_id, lambda session: session.update(step=1))
+    assert session == {"step": 1}
+    release.set()
+    thread.join(5)
+    assert store.get(slow_id) == {"step": 1}
+
+
+def test_change_made_meanwhile_is_not_lost():
+    store = SessionStore()
+    session_id = store.create({"answers": []})
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def slow(session):
+        runs.append(list(session["answers"]))
+        started.set()
+        release.wait(5)
+        session["answers"].append("slow")
+        return len(session["answers"])
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(store.update(session_id, slow)))
+    thread.start()
+    assert started.wait(5)
+    store.update(session_id, lambda session: session["answers"].append("fast"))
+    release.set()
+    thread.join(5)
+
+    # The slow change ran again on the session with the fast one applied
+    assert runs == [[], ["fast"]]
+    assert results == [({"answers": ["fast", "slow"]}, 2)]
+    assert store.get(session_id) == {"answers": ["fast", "slow"]}
+
+
+def test_update_of_an_unknown_or_deleted_session():
+    store = SessionStore()
+    assert store.update("missing", lambda session: None) == (None, None)
+    session_id = store.create({})
+
+    def delete_meanwhile(session):
+        store.delete(session_id)
+
+    assert store.update(session_id, delete_meanwhile) == (None, None)
+    assert store.get(session_id) is None
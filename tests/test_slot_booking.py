@@ -0,0 +1,93 @@
+import datetime as dt
+import threading
+
+import pytest
+
+from slot_booking import claim_slot
+
+DOCTOR = "Dr. Race"
+DAY = "Monday"
+TIME_SLOT = "10:00 AM - 11:00 AM"
+PATIENTS = 16
+
+
+@pytest.fixture
+def doctor(booking_app):
+    booking_app.collection.delete_many({"doctor_name": DOCTOR})
+    booking_app.bookings_collection.delete_many({})
+    booking_app.slot_store.collection.delete_many({})
+    booking_app.patient_collection.delete_many({"name": "Race Patient"})
+    doctor_id = booking_app.collection.insert_one({
+        "doctor_name": DOCTOR, "doctor_email": "race@example.com", "specialization": "Cardiologist",
+        "available_slots": {DAY: [{"time": TIME_SLOT, "available": True}]},
+    }).inserted_id
+    booking_app.patient_collection.insert_one({
+        "_id": "race-assessment", "name": "Race Patient", "age": 40, "sex": "female",
+        "assessed_at": dt.datetime.now(dt.timezone.utc),
+    })
+    return booking_app.collection.find_one({"_id": doctor_id})
+
+
+# Function to send the same booking from PATIENTS threads at once; returns the responses
+def race(app, body):
+    barrier = threading.Barrier(PATIENTS)
+    responses = [None] * PATIENTS
+
+    def patient(index):
+        client = app.test_client()
+        barrier.wait()
+        response = client.post("/book_appointment", json=dict(body, patient_email=f"p{index}@example.com"))
+        responses[index] = (response.status_code, response.get_json())
+
+    threads = [threading.Thread(target=patient, args=(index,)) for index in range(PATIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    return responses
+
+
+def assert_one_winner(responses):
+    winners = [body for status, body in responses if status == 202]
+    losers = [body for status, body in responses if status == 409]
+    assert len(winners) == 1
+    assert len(losers) == PATIENTS - 1
+    assert all(body["booked"] is False for body in losers)
+    return winners[0]
+
+
+def test_concurrent_bookings_of_one_slot_have_one_winner(booking_app, doctor):
+    winner = assert_one_winner(race(booking_app.app, {
+        "doctor_name": DOCTOR, "day": DAY, "time_slot": TIME_SLOT,
+        "patient_name": "Race Patient", "assessment_id": "race-assessment",
+    }))
+    assert booking_app.bookings_collection.count_documents({}) == 1
+    assert booking_app.bookings_collection.find_one()["_id"] == winner["booking_id"]
+    slot = booking_app.collection.find_one({"_id": doctor["_id"]})["available_slots"][DAY][0]
+    assert slot["available"] is False
+
+
+def test_concurrent_bookings_of_one_stored_slot_have_one_winner(booking_app, doctor):
+    start = dt.datetime.now(dt.timezone.utc).replace(microsecond=0) + dt.timedelta(days=1)
+    slot = booking_app.slot_store.make_slot(doctor, start, start + dt.timedelta(minutes=30))
+    booking_app.slot_store.add_slots([slot])
+    winner = assert_one_winner(race(booking_app.app, {
+        "slot_id": slot["_id"], "patient_name": "Race Patient", "assessment_id": "race-assessment",
+    }))
+    assert booking_app.slot_store.get(slot["_id"])["booking_id"] == winner["booking_id"]
+
+
+def test_claim_slot_has_one_winner(booking_app, doctor):
+    barrier = threading.Barrier(PATIENTS)
+    results = []
+
+    def patient():
+        barrier.wait()
+        results.append(claim_slot(booking_app.collection, DOCTOR, DAY, TIME_SLOT))
+
+    threads = [threading.Thread(target=patient) for _ in range(PATIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert sorted(results) == [False] * (PATIENTS - 1) + [True]
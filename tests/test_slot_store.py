@@ -0,0 +1,80 @@
+import datetime as dt
+
+import pytest
+
+from conftest import START
+from database import get_client
+from slot_store import BOOKED, SlotStore
+
+DOCTOR = {"_id": "doctor-1", "doctor_name": "Dr. Store", "specialization": "Cardiologist"}
+
+
+@pytest.fixture
+def store():
+    db = get_client("mongomock://")["slot_store_test"]
+    db["slots"].delete_many({})
+    db["slots_archive"].delete_many({})
+    return SlotStore(db["slots"], db["slots_archive"])
+
+
+def add_slot(store, hours_after_start, **fields):
+    start = START + dt.timedelta(hours=hours_after_start)
+    slot = store.make_slot(DOCTOR, start, start + dt.timedelta(minutes=30), **fields)
+    store.add_slots([slot])
+    return slot["_id"]
+
+
+def test_slot_that_has_started_cannot_be_claimed(store):
+    started = add_slot(store, 0)
+    upcoming = add_slot(store, 1)
+    now = START + dt.timedelta(minutes=10)
+    assert store.claim(started, "b1", now) is None
+    assert store.get(started)["status"] == "free"
+    assert store.claim(upcoming, "b2", now)["booking_id"] == "b2"
+
+
+def test_archive_moves_ended_bookings_and_drops_ended_free_slots(store):
+    ended_booked = add_slot(store, 0, status=BOOKED, booking_id="b1")
+    ended_free = [add_slot(store, 1), add_slot(store, 2)]
+    upcoming_booked = add_slot(store, 5, status=BOOKED, booking_id="b2")
+    upcoming_free = add_slot(store, 6)
+
+    assert store.archive_past(START + dt.timedelta(hours=4)) == (1, 2)
+    assert [slot["_id"] for slot in store.archive_collection.find()] == [ended_booked]
+    remaining = {slot["_id"] for slot in store.collection.find()}
+    assert remaining == {upcoming_booked, upcoming_free}
+    assert not remaining & set(ended_free)
+
+    # Without an archive only free slots are dropped
+    unarchived = SlotStore(store.collection)
+    add_slot(store, 0, status=BOOKED, booking_id="b1")
+    add_slot(store, 1)
+    assert unarchived.archive_past(START + dt.timedelta(hours=4)) == (0, 1)
+    assert store.get(ended_booked)["status"] == BOOKED
+
+
+# Collection stand-in where a free slot is booked right after the archive read the booked ones
+class BookingDuringArchive:
+    def __init__(self, collection, slot_id):
+        self.collection = collection
+        self.slot_id = slot_id
+
+    def find(self, *args, **kwargs):
+        found = list(self.collection.find(*args, **kwargs))
+        self.collection.update_one({"_id": self.slot_id}, {"$set": {"status": BOOKED, "booking_id": "late"}})
+        return found
+
+    def delete_many(self, query):
+        return self.collection.delete_many(query)
+
+
+def test_slot_booked_during_the_archive_is_not_deleted(store):
+    add_slot(store, 0, status=BOOKED, booking_id="b1")
+    late = add_slot(store, 1)
+    racing = SlotStore(BookingDuringArchive(store.collection, late), store.archive_collection)
+    assert racing.archive_past(START + dt.timedelta(hours=4)) == (1, 0)
+    assert store.get(late)["booking_id"] == "late"
+
+    # ... it is archived on the next run
+    assert store.archive_past(START + dt.timedelta(hours=4)) == (1, 0)
+    assert store.archive_collection.count_documents({}) == 2
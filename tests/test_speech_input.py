@@ -0,0 +1,132 @@
+import json
+import os
+import wave
+
+import pytest
+
+pytest.importorskip("speech_recognition")
+
+import speech_input  # noqa: E402
+from assessment import is_affirmative, is_clear_yes_or_no, is_negative  # noqa: E402
+
+FIXTURES_DIR = os.environ.get("SPEECH_FIXTURES_DIR", os.path.join(os.path.dirname(__file__), "fixtures", "speech"))
+
+
+# Stand-in for the vosk module: each KaldiRecognizer returns the next scripted partial
+# hypothesis per chunk and the full text at the end
+class FakeVosk:
+    def __init__(self, partials, final):
+        self.partials = partials
+        self.final = final
+        self.chunks = 0
+
+    def SetLogLevel(self, level):
+        pass
+
+    def Model(self, path):
+        return path
+
+    def KaldiRecognizer(self, model, sample_rate):
+        fake = self
+
+        class Recognizer:
+            def AcceptWaveform(self, chunk):
+                fake.chunks += 1
+                return False
+
+            def PartialResult(self):
+                index = min(fake.chunks, len(fake.partials)) - 1
+                return json.dumps({"partial": fake.partials[index]})
+
+            def FinalResult(self):
+                return json.dumps({"text": fake.final})
+
+        return Recognizer()
+
+
+def write_wav(path, seconds=1.0, channels=1, sample_rate=16000):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(b"\0\0" * channels * int(seconds * sample_rate))
+
+
+def vosk_recognizer(monkeypatch, partials, final):
+    fake = FakeVosk(partials, final)
+    monkeypatch.setattr(speech_input, "vosk", fake)
+    return speech_input.VoskSpeechRecognizer(model_path="model"), fake
+
+
+@pytest.mark.parametrize("partial", ["i know", "right now", "my nose", "not", "not sure", "i know i have it yes",
+                                     "yes but", "yes no", ""])
+def test_partial_that_is_not_only_yes_or_no_is_not_accepted(partial):
+    assert not is_clear_yes_or_no(partial)
+
+
+@pytest.mark.parametrize("partial", ["yes", "no", "Yes.", "nope", "not at all", "yeah yeah", "no, no", "never"])
+def test_partial_that_is_only_yes_or_no_is_accepted(partial):
+    assert is_clear_yes_or_no(partial)
+
+
+def test_partial_i_know_waits_for_the_whole_answer(monkeypatch, tmp_path):
+    recognizer, fake = vosk_recognizer(monkeypatch, ["i", "i know", "i know i have", "i know i have it yes"],
+                                       "i know i have it yes")
+    write_wav(tmp_path / "answer.wav", seconds=2)
+    text = recognizer.transcribe_file(str(tmp_path / "answer.wav"), is_clear_yes_or_no)
+    assert text == "i know i have it yes"
+    assert fake.chunks == 8  # all of the audio was heard
+    assert is_affirmative(text)
+
+
+def test_clear_partial_no_stops_listening_early(monkeypatch, tmp_path):
+    recognizer, fake = vosk_recognizer(monkeypatch, ["no"], "no")
+    write_wav(tmp_path / "answer.wav", seconds=2)
+    assert recognizer.transcribe_file(str(tmp_path / "answer.wav"), is_clear_yes_or_no) == "no"
+    assert fake.chunks == 1
+
+
+def test_stream_without_accept_partial_returns_final_text(monkeypatch):
+    recognizer, fake = vosk_recognizer(monkeypatch, ["no"], "nothing else")
+    assert recognizer.transcribe_stream(iter([b"\0" * 100] * 3)) == "nothing else"
+    assert fake.chunks == 3
+
+
+def test_backend_must_implement_every_recognizer_method():
+    class ListenOnly(speech_input.SpeechRecognizer):
+        def listen(self, accept_partial=None, before_listen=speech_input._no_op):
+            return "yes"
+
+    with pytest.raises(TypeError):
+        ListenOnly()
+    assert speech_input.VoskSpeechRecognizer.__abstractmethods__ == frozenset()
+    assert speech_input.GoogleSpeechRecognizer.__abstractmethods__ == frozenset()
+
+
+def test_stereo_wav_is_rejected(monkeypatch, tmp_path):
+    recognizer, _ = vosk_recognizer(monkeypatch, [""], "")
+    write_wav(tmp_path / "stereo.wav", channels=2)
+    with pytest.raises(ValueError):
+        recognizer.transcribe_file(str(tmp_path / "stereo.wav"))
+
+
+# Recorded answers: fixtures/speech/manifest.json lists {"file", "answer": "yes"|"no"} for
+# WAV recordings (16-bit mono); they run against the real model in VOSK_MODEL_PATH
+def recorded_fixtures():
+    try:
+        with open(os.path.join(FIXTURES_DIR, "manifest.json")) as file:
+            return json.load(file)
+    except OSError:
+        return []
+
+
+@pytest.mark.parametrize("fixture", recorded_fixtures(), ids=lambda fixture: fixture["file"])
+def test_recorded_answer(fixture):
+    pytest.importorskip("vosk")
+    if not os.path.isdir(speech_input.VOSK_MODEL_PATH):
+        pytest.skip(f"no Vosk model in {speech_input.VOSK_MODEL_PATH}")
+    recognizer = speech_input.VoskSpeechRecognizer()
+    text = recognizer.transcribe_file(os.path.join(FIXTURES_DIR, fixture["file"]), is_clear_yes_or_no)
+    # Resolved as the console interview resolves a full answer
+    answer = "yes" if is_affirmative(text) else "no" if is_negative(text) else None
+    assert answer == fixture["answer"], text
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("quart")
+
+import web_service  # noqa: E402
+
+
+def post(path, **kwargs):
+    async def send():
+        response = await web_service.app.test_client().post(path, **kwargs)
+        return response.status_code, await response.get_json()
+    return asyncio.run(send())
+
+
+@pytest.mark.parametrize("path", ["/sessions", "/sessions/some-session/utterance", "/process-symptoms"])
+@pytest.mark.parametrize("body", ["[1, 2]", '"itching"', "null", "3", "{not json"])
+def test_body_that_is_not_a_json_object_is_rejected(path, body):
+    status, reply = post(path, data=body, headers={"Content-Type": "application/json"})
+    assert status == 400
+    assert reply == {"message": "The request body must be a JSON object."}
+
+
+def test_session_starts_without_a_body():
+    status, reply = post("/sessions")
+    assert status == 201
+    assert reply["session_id"]
+
+
+def test_session_starts_from_a_json_object():
+    status, reply = post("/sessions", json={"name": "Ann", "age": 34, "sex": "female"})
+    assert status == 201
+    assert reply["session_id"]
+
+
+@pytest.mark.parametrize("body", [
+    {"symptoms": ["itching"]}, {"symptoms": 3}, {"name": {"first": "Ann"}}, {"sex": 1},
+    {"age": "thirty"}, {"age": 0}, {"age": True}, {"age": [34]}, {"age": 34.5},
+])
+def test_session_details_of_the_wrong_type_are_rejected(body):
+    status, reply = post("/sessions", json=body)
+    assert status == 400
+    assert reply["message"].startswith("The field ")
+
+
+def test_session_starts_with_a_description():
+    status, reply = post("/sessions", json={"name": "Ann", "age": "34", "sex": "female", "symptoms": "itching"})
+    assert status == 201
+    assert reply["question"]
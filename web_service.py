@@ -0,0 +1,238 @@
+import argparse
+import asyncio
+import os
+
+from quart import jsonify, render_template, request
+
+from assessment import build_patient_document
+from booking_service import app
+from database import PATIENTS_DB, get_client
+from intake_session import current_question, evaluate_session, evaluation_lines, new_session, submit
+from knowledge_base import load_knowledge_base
+from patient_log import open_worker_log
+from patient_store import ensure_patient_indexes
+from read_cache import connect_redis
+from session_store import SessionStore
+
+# One long-running web service for the whole patient journey: the async booking service
+# (booking_service.py) plus the health assessment as stateless HTTP endpoints, so many
+# patients are assessed at once from their browsers instead of one microphone-bound
+# console process per patient.
+#
+#   POST /sessions                      start an interview (optional name, age, sex, symptoms)
+#   POST /sessions/<id>/utterance       answer the pending question ({"text": "..."})
+#   GET  /sessions/<id>/question        the pending question
+#   GET  /sessions/<id>/result          the evaluation, stored once the interview is over
+#   POST /process-symptoms              the same interview for templates/Doctor_interaction.html
+#
+# Requests carry everything but the session ID; the session itself lives in an expiring
+# server-side store (in memory, or in Redis with SESSION_STORE_REDIS_URL so every worker
+# process shares it).
+#
+#   python web_service.py --bind 0.0.0.0:8000 --workers 4
+
+# Compiled symptom knowledge base, shared by every session of this process
+knowledge_base = load_knowledge_base()
+
+sessions = SessionStore(redis_client=connect_redis(os.environ.get("SESSION_STORE_REDIS_URL")))
+
+patients_collection = get_client()[PATIENTS_DB]["patients"]
+
+# Assessments are appended to this process's patient log and uploaded from there to MongoDB
+patient_log = None
+
+
+@app.before_serving
+async def open_patient_log():
+    global patient_log
+    patient_log = await asyncio.to_thread(open_worker_log)
+    try:
+        await asyncio.to_thread(ensure_patient_indexes, patients_collection)
+        # Upload assessments logged while MongoDB was unavailable
+        uploaded = await asyncio.to_thread(patient_log.sync, patients_collection)
+        if uploaded:
+            print(f"Uploaded {uploaded} assessments from the patient log.")
+    except Exception as e:
+        print(f"Could not prepare the patients collection: {e}")
+
+
+@app.after_serving
+async def close_patient_log():
+    await asyncio.to_thread(patient_log.close)
+
+
+@app.route('/intake')
+async def intake():
+    return await render_template('Doctor_interaction.html')
+
+
+# Function to build the answer to an interview request
+def session_reply(session_id, session, message=""):
+    question = current_question(session, knowledge_base)
+    return {
+        "session_id": session_id,
+        "message": " ".join(part for part in (message, question) if part),
+        "question": question,
+        "done": question is None,
+    }
+
+
+# Function to store the assessment of a finished session (once) and return its evaluation,
+# or None while questions are pending
+async def finish_session(session_id):
+    def claim(session):
+        if session["question"] is not None or "assessment" in session:
+            return None
+        patient_info, confirmed, not_confirmed, ranked = evaluate_session(session, knowledge_base)
+        document = build_patient_document(patient_info, confirmed, not_confirmed, ranked)
+        document["symptom_description"] = session["description"]
+        session["assessment"] = {
+            "assessment_id": document["_id"],
+            "confirmed": [disease for disease, _ in confirmed],
+            "not_confirmed": [disease for disease, _ in not_confirmed],
+            "ranked": ranked,
+        }
+        return document
+
+    session, document = await asyncio.to_thread(sessions.update, session_id, claim)
+    if session is None or "assessment" not in session:
+        return None
+    if document is not None:
+        # On disk in the patient log before the patient is told the ID; MongoDB may lag behind
+        await asyncio.to_thread(patient_log.append, document)
+        try:
+            await asyncio.to_thread(patient_log.sync, patients_collection)
+        except Exception as e:
+            print(f"MongoDB is unavailable, the assessment was kept in the patient log: {e}")
+
+    result = dict(session["assessment"])
+    lines = evaluation_lines(result["confirmed"], result["not_confirmed"], result["ranked"])
+    result["message"] = " ".join(lines)
+    result["booking_url"] = f"/?assessment_id={result['assessment_id']}"
+    return result
+
+
+# Function to read the JSON object a request carries (an empty body counts as {}); returns
+# None for a body that is not a JSON object (a list, a string, null or invalid JSON)
+async def json_object():
+    if not await request.get_data():
+        return {}
+    data = await request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+
+NOT_AN_OBJECT = {'message': 'The request body must be a JSON object.'}
+
+
+# Function to check the optional details a session is started with; returns the error
+# message for a field of the wrong type, or None if they are fine
+def session_details_error(data):
+    for field in ("name", "sex", "symptoms"):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f"The field {field} must be a string."
+    age = data.get("age")
+    if age is not None and (isinstance(age, bool) or not isinstance(age, (int, str))
+                            or not (str(age).isdigit() and 0 < int(age) < 120)):
+        return "The field age must be a number between 1 and 120."
+    return None
+
+
+@app.route('/sessions', methods=['POST'])
+async def start_session():
+    data = await json_object()
+    if data is None:
+        return jsonify(NOT_AN_OBJECT), 400
+    error = session_details_error(data)
+    if error:
+        return jsonify({'message': error}), 400
+    session = new_session(knowledge_base, data, data.get("symptoms"))
+    session_id = await asyncio.to_thread(sessions.create, session)
+    return jsonify(session_reply(session_id, session)), 201
+
+
+@app.route('/sessions/<session_id>/utterance', methods=['POST'])
+async def session_utterance(session_id):
+    data = await json_object()
+    if data is None:
+        return jsonify(NOT_AN_OBJECT), 400
+    text = data.get("text")
+    if not isinstance(text, str):
+        return jsonify({'message': 'Missing required field: text'}), 400
+    session, message = await asyncio.to_thread(
+        sessions.update, session_id, lambda session: submit(session, text, knowledge_base)
+    )
+    if session is None:
+        return jsonify({'message': 'Session not found or expired.'}), 404
+    return jsonify(session_reply(session_id, session, message))
+
+
+@app.route('/sessions/<session_id>/question', methods=['GET'])
+async def session_question(session_id):
+    session = await asyncio.to_thread(sessions.get, session_id)
+    if session is None:
+        return jsonify({'message': 'Session not found or expired.'}), 404
+    return jsonify(session_reply(session_id, session))
+
+
+@app.route('/sessions/<session_id>/result', methods=['GET'])
+async def session_result(session_id):
+    result = await finish_session(session_id)
+    if result is None:
+        session = await asyncio.to_thread(sessions.get, session_id)
+        if session is None:
+            return jsonify({'message': 'Session not found or expired.'}), 404
+        return jsonify(dict(session_reply(session_id, session), message='The interview is not finished yet.')), 409
+    return jsonify(dict(result, session_id=session_id))
+
+
+# Browser speech transcripts from templates/Doctor_interaction.html: the first one starts a
+# session with the symptom description, later ones (carrying the session ID) answer questions
+@app.route('/process-symptoms', methods=['POST'])
+async def process_symptoms():
+    data = await json_object()
+    if data is None:
+        return jsonify(NOT_AN_OBJECT), 400
+    text = data.get("symptoms")
+    if not isinstance(text, str) or not text.strip():
+        return jsonify({'message': 'I did not catch that. Can you please repeat?'}), 400
+
+    session_id = data.get("session_id")
+    if session_id:
+        session, message = await asyncio.to_thread(
+            sessions.update, session_id, lambda session: submit(session, text, knowledge_base)
+        )
+        if session is None:
+            return jsonify({'message': 'Your session has expired. Please describe your symptoms again.',
+                            'expired': True}), 404
+    else:
+        session, message = new_session(knowledge_base, description=text), ""
+        session_id = await asyncio.to_thread(sessions.create, session)
+
+    reply = session_reply(session_id, session, message)
+    if reply["done"]:
+        result = await finish_session(session_id)
+        reply.update(result)
+        reply["message"] = " ".join(part for part in (message, result["message"]) if part)
+    return jsonify(reply)
+
+
+# Production entry point: Hypercorn with `workers` processes (each runs its own event loop)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the web service (health assessment and booking).")
+    parser.add_argument("--bind", default=os.environ.get("WEB_SERVICE_BIND", "0.0.0.0:8000"))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)))
+    args = parser.parse_args(argv)
+
+    from hypercorn.config import Config
+    from hypercorn.run import run
+
+    config = Config()
+    config.bind = [args.bind]
+    config.workers = args.workers
+    config.application_path = "web_service:app"
+    config.accesslog = "-"
+    run(config)
+
+
+if __name__ == "__main__":
+    main()